@@ -6,6 +6,8 @@ sourcefiles = ['conlog/solver_bindings.pyx', 'conlog/solver_c_fast.c']
 
 def build(setup_kwargs):
     extensions = cythonize(sourcefiles) #  raw_extensions, include_path = [numpy.get_include()])
+    for extension in extensions:
+        extension.libraries.append('m')  # The dedup filter sizing in solver_c_fast.c
     setup_kwargs.update({
         'ext_modules': extensions,
     })
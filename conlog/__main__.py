@@ -1,10 +1,64 @@
 import argparse
+import atexit
+import sys
+from conlog.checkpoint import CheckpointError, solve_with_checkpoints
 from conlog.elegant   import interpret
 from conlog.evaluator import evaluate
 from conlog.frontends import convert_to_grid, GridError, FrontendError, make_grid_program, TokenStream, TextProgram
+from conlog.heat      import grid_labels, heat_report, render_heat
 from conlog.plot      import plot_graph
 from conlog.solver    import solve_graph_bfs
-from conlog.solver_c  import solve_graph_bfs_c
+from conlog.solver_c  import SOLUTION_BATCH, make_search_c
+from conlog.stats     import BudgetExceeded, ProgressHook, SearchBudget, SearchStats, SearchStatus
+from conlog.trace     import start_trace
+
+
+def parse_size(text):
+    """Byte count with an optional K/M/G/T suffix (powers of 1024), e.g. 4G."""
+    units = {'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+    text = text.strip().upper().removesuffix('B')
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'not a size: {text}')
+
+
+def print_unsolved(status, hint=''):
+    """Report a search that stopped without a solution; only an exhausted search proves unsat."""
+    if status == SearchStatus.EXHAUSTED:
+        print("\x1B[91munsatisfiable\x1B[39m")
+    else:
+        print(f"\x1B[93munknown\x1B[39m \x1B[2m({status.describe()}{hint})\x1B[22m")
+
+
+def show_progress(progress, limit):
+    """Redraw the one-line progress bar of a running search."""
+    line = f"{progress.iterations:,} iterations \u00b7 depth {progress.depth} \u00b7 {progress.frontier:,} queued"
+    if limit != float('inf'):
+        filled = min(20, 20 * progress.iterations // max(limit, 1))
+        line = f"[{'#' * filled}{'.' * (20 - filled)}] " + line
+    print(f"\r\x1B[2m{line}\x1B[22m\x1B[K", end='', flush=True)
+
+
+def clear_progress():
+    if sys.stdout.isatty():
+        print("\r\x1B[K", end='', flush=True)
+
+
+def print_stats(stats):
+    for line in stats.report().split('\n'):
+        print(f"\x1B[2m{line}\x1B[22m")
+
+
+def print_heat(stats, layout):
+    """Where the search spent its time; over the diagram when `layout` is a grid program."""
+    if layout is not None:
+        print(render_heat(layout, stats))
+        print()
+    for line in heat_report(stats, labels=grid_labels(layout) if layout is not None else None).split('\n'):
+        print(f"\x1B[2m{line}\x1B[22m")
 
 AUTO_SEMICOLON  = True
 
@@ -18,10 +72,34 @@ parser.add_argument('-l', '--limit',    metavar='N',        type=int,
 parser.add_argument('-i', '--interactive',                  action='store_true',    default=False, help='load graph then start interactive session')
 parser.add_argument('-a', '--all',      dest='find_all',    action='store_true',    default=False, help='find all solutions instead of just the first (ignored in interactive mode)')
 parser.add_argument('-p', '--plot',                         action='store_true',    default=False, help='load graph then plot and exit')
+parser.add_argument('--checkpoint',     metavar='CKPT',                             default=None,  help='periodically save the search to CKPT (implies strategy c)')
+parser.add_argument('--checkpoint-every', metavar='N',      type=int,               default=None,  help='iterations between checkpoints')
+parser.add_argument('--resume',         metavar='CKPT',                             default=None,  help='continue the search saved in CKPT (implies strategy c)')
+parser.add_argument('--spill-dir',      metavar='DIR',                              default=None,  help='keep the search frontier in an mmap\'d file in DIR (implies strategy c)')
+parser.add_argument('--spill-dedup',                        action='store_true',    default=False, help='with --spill-dir, drop duplicate states from each search layer')
+parser.add_argument('--dedup',                              action='store_true',    default=False, help='never revisit a search state (implies strategy c; finds the first solution, may skip later ones)')
+parser.add_argument('--dedup-mem',      metavar='SIZE',     type=parse_size,        default=None,  help='like --dedup, but approximately in a fixed SIZE (e.g. 4G); may prune unexplored states')
+parser.add_argument('--trust-engine',                       action='store_true',    default=False, help='with strategy c, skip re-checking each solution')
+parser.add_argument('--stats',                              action='store_true',    default=False, help='print search statistics when done')
+parser.add_argument('--heat',                               action='store_true',    default=False, help='print the nodes and edges searched most when done (over the diagram, for grid files)')
+parser.add_argument('--timeout',        metavar='SECONDS',  type=float,             default=None,  help='stop searching after SECONDS of wall-clock time')
+parser.add_argument('--max-memory',     metavar='SIZE',     type=parse_size,        default=None,  help='stop searching once the search allocated SIZE (e.g. 4G)')
+parser.add_argument('--profile',        metavar='TRACE',                            default=None,  help='write a Chrome trace of the parse, analysis and search phases to TRACE on exit')
 args = parser.parse_args()
 
-strategy = args.strategy
+if args.profile is not None:
+    atexit.register(start_trace().write, args.profile)
+
+strategy = 'c' if (args.checkpoint or args.resume or args.spill_dir or args.dedup or args.dedup_mem) else args.strategy
 limit = 1000000 if args.limit is None else args.limit
+layout = None  # The grid program being searched, for heat maps
+
+
+def make_budget():
+    """A fresh budget from --timeout and --max-memory, or None without them."""
+    if args.timeout is None and args.max_memory is None:
+        return None
+    return SearchBudget(args.timeout, args.max_memory)
 
 if (filename := args.inp) is not None:
 
@@ -60,6 +138,7 @@ if (filename := args.inp) is not None:
         if isinstance(program, GridError):
             program.show(grid)
             exit(1)
+        layout = program
 
     if args.plot:
         plot_graph(program.graph())
@@ -74,22 +153,65 @@ if (filename := args.inp) is not None:
             program = conversion
 
     else:
+        budget = make_budget()  # The deadline includes building the search
         graph = program.graph()
+        search = None
+        stats = SearchStats()
+
+        def status():
+            return search.status if search is not None else stats.status
+
+        def false_positives():
+            # Only INCOMPLETE searches have pruned on a guess, so only they have a search (strategy c)
+            return f"expected false-positive rate {search.false_positive_rate:.2g} when the search stopped"
+
+        def finish(code):
+            if args.stats:
+                print_stats(search.stats if search is not None else stats)
+            if args.heat:
+                print_heat(search.stats if search is not None else stats, layout)
+            exit(code)
+
         try:
-            if args.strategy == 'c':
-                interpreter = solve_graph_bfs_c(graph, limit=limit)
-            if args.strategy == 'g':
-                interpreter = solve_graph_bfs(graph, limit=limit)
-            if args.strategy == 'p':
-                interpreter = interpret(graph, limit=limit)
+            if strategy == 'c':
+                try:
+                    search = make_search_c(graph, limit=limit, spill_dir=args.spill_dir, dedup_layers=args.spill_dedup, dedup=args.dedup, dedup_mem=args.dedup_mem, verify=not args.trust_engine, budget=budget)
+                except BudgetExceeded as e:
+                    stats.status = e.status  # Out of time before the search began
+                    interpreter = iter(())
+                else:
+                    if (dedup_filter := search.dedup_filter()) is not None:
+                        capacity, num_hashes = dedup_filter
+                        print(f"\x1B[2mdedup filter: about {capacity:,} states before 1% false positives, {num_hashes} bits each\x1B[22m")
+                    if args.resume is not None:
+                        search.load(args.resume)
+                    batch_size = SOLUTION_BATCH if args.find_all else 1
+                    if (checkpoint := args.checkpoint or args.resume) is not None:
+                        interpreter = solve_with_checkpoints(search, checkpoint, args.checkpoint_every, batch_size)
+                    else:
+                        interpreter = search.solutions(batch_size)
+            if strategy == 'g':
+                interpreter = solve_graph_bfs(graph, limit=limit, stats=stats, budget=budget)
+            if strategy == 'p':
+                interpreter = interpret(graph, limit=limit, stats=stats, budget=budget)
             try:
                 solution = next(interpreter)
             except StopIteration:
-                print("\x1B[91munsatisfiable\x1B[39m")
-                exit(0)
+                hints = {
+                    SearchStatus.LIMIT_REACHED: '; raise it with -l',
+                    SearchStatus.TIMED_OUT: '; raise it with --timeout',
+                }
+                hint = hints.get(status(), '')
+                if status() == SearchStatus.INCOMPLETE:
+                    hint = f'; the dedup filter may have pruned unexplored states ({false_positives()}), --dedup does not'
+                print_unsolved(status(), hint)
+                finish(0)
+        except (CheckpointError, OSError) as e:
+            print(f"\x1B[91merror\x1B[39m: {e}")
+            exit(1)
         except KeyboardInterrupt:
             print('\rinterrupted')
-            exit(1)
+            finish(1)
 
         alternate = False
         while True:
@@ -118,19 +240,23 @@ if (filename := args.inp) is not None:
                 print()
 
             if not args.find_all:
-                exit(0)
+                finish(0)
 
             alternate = True
             try:
                 solution = next(interpreter)
             except StopIteration:
+                if status() == SearchStatus.INCOMPLETE:
+                    print(f"\x1B[2m({status().describe()}; there may be more solutions, {false_positives()})\x1B[22m")
+                elif status() != SearchStatus.EXHAUSTED:
+                    print(f"\x1B[2m({status().describe()}; there may be more solutions)\x1B[22m")
                 break
             except KeyboardInterrupt:
                 print('\rinterrupted')
                 break
             print("\x1B[2mor\x1B[22m", end=' ')
 
-        exit(0)
+        finish(0)
 
 else:
     program = TextProgram()
@@ -158,6 +284,16 @@ def prompt():
 
 stream = TokenStream("", prompt)
 
+# The last C search and the fingerprint of the program it was made for. If it
+# stopped at the search limit, raising the limit and running `go` again
+# resumes it from its frontier; editing the program invalidates it.
+live_search = None
+live_fingerprint = None
+
+# Counters of the last search with strategy g or p; None after one with strategy c,
+# whose counters live_search keeps
+search_stats = None
+
 while True:
     seq = stream.readline()
     if isinstance(seq, FrontendError):
@@ -208,23 +344,48 @@ while True:
             uninit_names = ', '.join(f"\x1B[95m{name}\x1B[39m" for name in uninit)
             print(uninit_names, "uninitialized and assumed free")
 
+        budget = make_budget()
         graph = program.graph()
+        progress = ProgressHook(lambda p: show_progress(p, limit), every_ms=100) if sys.stdout.isatty() else None
         try:
             if strategy == 'c':
-                interpreter = solve_graph_bfs_c(graph, limit=limit)
+                fingerprint = program.fingerprint()
+                resumable = (SearchStatus.LIMIT_REACHED, SearchStatus.TIMED_OUT)
+                if live_search is not None and live_fingerprint == fingerprint and live_search.status in resumable:
+                    print(f"resuming search at iteration \x1B[93m{live_search.iterations}\x1B[39m")
+                    live_search.set_limit(limit)
+                    live_search.set_budget(budget)
+                else:
+                    try:
+                        live_search = make_search_c(graph, limit=limit, budget=budget)
+                    except BudgetExceeded as e:
+                        live_search, search_stats = None, SearchStats(status=e.status)
+                        print_unsolved(e.status)
+                        continue
+                    live_fingerprint = fingerprint
+                search_stats = None
+                live_search.set_progress(progress)
+                interpreter = live_search.solutions(SOLUTION_BATCH if find_all else 1)
             if strategy == 'g':
-                interpreter = solve_graph_bfs(graph, limit=limit)
+                search_stats = SearchStats()
+                interpreter = solve_graph_bfs(graph, limit=limit, stats=search_stats, progress=progress, budget=budget)
             if strategy == 'p':
-                interpreter = interpret(graph, limit=limit)
+                search_stats = SearchStats()
+                interpreter = interpret(graph, limit=limit, stats=search_stats, progress=progress, budget=budget)
             try:
                 solution = next(interpreter)
             except StopIteration:
-                print("\x1B[91munsatisfiable\x1B[39m")
+                clear_progress()
+                status = live_search.status if strategy == 'c' else search_stats.status
+                resume_hints = {SearchStatus.LIMIT_REACHED: '; raise the limit and go again to resume', SearchStatus.TIMED_OUT: '; go again to resume'}
+                print_unsolved(status, resume_hints.get(status, '') if strategy == 'c' else '')
                 continue
         except KeyboardInterrupt:
+            clear_progress()
             print('\rinterrupted')
             continue
 
+        clear_progress()
         print("\x1B[92msatisfiable\x1B[39m")
         alternate = False
         while True:
@@ -265,10 +426,16 @@ while True:
             try:
                 solution = next(interpreter)
             except StopIteration:
-                break 
+                clear_progress()
+                status = live_search.status if strategy == 'c' else search_stats.status
+                if status != SearchStatus.EXHAUSTED:
+                    print(f"\x1B[2m({status.describe()}; there may be more solutions)\x1B[22m")
+                break
             except KeyboardInterrupt:
+                clear_progress()
                 print('\rinterrupted')
                 break
+            clear_progress()
             print("\x1B[2mor\x1B[22m", end=' ')
 
         continue
@@ -282,7 +449,10 @@ while True:
         print("limit <num>         set the search limit to <num>")
         print("go|search|solve     solve the current graph")
         print("go|... all          find all solutions")
+        print("                    (after hitting the limit, raise it and go again to resume)")
         print("reset|clear         reset the current graph")
+        print("stats               print statistics of the last search")
+        print("heat                show where the last search spent its time")
         print("<name>              print the definition of <name>")
         print("vars                print the definitions of all variables")
         print("nodes               print the definitions of all nodes")
@@ -294,8 +464,29 @@ while True:
         plot_graph(program.graph())
         continue
 
+    if is_command and seq[0].value == 'stats':
+        if search_stats is not None:
+            print_stats(search_stats)
+        elif live_search is not None:
+            print_stats(live_search.stats)
+        else:
+            print("no search yet")
+        continue
+
+    if is_command and seq[0].value == 'heat':
+        if search_stats is not None:
+            print_heat(search_stats, layout)
+        elif live_search is not None:
+            print_heat(live_search.stats, layout)
+        else:
+            print("no search yet")
+        continue
+
     if is_command and seq[0].value in ('clear', 'reset'):
         program = TextProgram()
+        layout = None
+        live_search = None
+        search_stats = None
         continue
 
     if is_command:
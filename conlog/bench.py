@@ -0,0 +1,286 @@
+"""Benchmarks of the search strategies.
+
+`python -m conlog.bench` runs every strategy on every program in examples/
+(see `example_workloads`) and on a few sizes of each family of generated
+programs (see `conlog.generate`), each until its first solution, and records
+the wall time, states expanded, peak RSS and length of the solution path of
+each run into a JSON results file. For each family, it also fits how the
+time and states grow with the size (see `scaling`). Given the results file
+of an earlier run as `--baseline`, it lists the runs that got slower,
+searched more or used more memory, and the families that scale worse, by
+more than `--threshold`, and exits with status 1 if there are any.
+
+Each run happens in a forked child, so that its peak RSS is its own; a
+`SearchBudget` keeps the slow examples to `--timeout` seconds each.
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import sys
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Callable
+
+import networkx as nx
+
+from conlog.elegant import interpret
+from conlog.frontends import FrontendError, GridError, TextProgram, TokenStream, convert_to_grid, make_grid_program
+from conlog.generate import generated_workloads
+from conlog.solver import solve_graph_bfs
+from conlog.solver_c import make_search_c
+from conlog.stats import BudgetExceeded, SearchBudget, SearchStats, SearchStatus
+
+try:
+    import resource
+except ImportError:  # Not on Windows; runs there have no peak RSS
+    resource = None
+
+STRATEGIES = ('c', 'g', 'p')
+METRICS = ('wall_time', 'states_expanded', 'peak_rss')
+
+
+@dataclass
+class Workload:
+    name: str
+    graph: Callable[[], nx.Graph]  # Builds the graph to search, in the run's own process
+    family: str | None = None  # For generated programs, which `scaling` fits by size
+    size: int | None = None
+
+
+def load_graph(path: str) -> nx.Graph:
+    """The graph of the grid (.cla, .clg) or text (.clt, .cl) program at `path`."""
+    with open(path) as f:
+        filetext = f.read()
+    if path.endswith(('.clt', '.cl')):
+        stream = TokenStream(filetext, None)
+        program = TextProgram()
+        while (seq := stream.readline()) is not None:
+            if isinstance(seq, FrontendError):
+                raise ValueError(f"{path}: {seq.message}")
+            if len(seq) > 0 and isinstance(result := program.add_statement(seq, allow_reinit=True), FrontendError):
+                raise ValueError(f"{path}: {result.message}")
+    else:
+        grid = convert_to_grid(filetext)
+        program = make_grid_program(grid) if not isinstance(grid, GridError) else grid
+        if isinstance(program, GridError):
+            raise ValueError(f"{path}: {program.message}")
+    return program.graph()
+
+
+def example_workloads(directory: str = 'examples') -> list[Workload]:
+    """A workload per Conlog program in `directory`, by file name."""
+    names = sorted(name for name in os.listdir(directory) if name.endswith(('.cla', '.clg', '.clt', '.cl')))
+    return [Workload(name, lambda path=os.path.join(directory, name): load_graph(path)) for name in names]
+
+
+def family_workloads() -> list[Workload]:
+    """A workload per program of `conlog.generate.generated_workloads`."""
+    return [Workload(name, program.graph, family, size) for family, name, size, program in generated_workloads()]
+
+
+def peak_rss() -> int | None:
+    """Peak resident set size of this process so far, in bytes."""
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024  # Bytes on macOS, KiB elsewhere
+
+
+def run(workload: Workload, strategy: str, limit: int, timeout: float | None) -> dict:
+    """Search `workload` with `strategy` until its first solution, in this process."""
+    result = {
+        'workload': workload.name, 'family': workload.family, 'size': workload.size, 'strategy': strategy,
+        'wall_time': None, 'states_expanded': None, 'peak_rss': None, 'solution_length': None, 'status': None, 'error': None,
+    }
+    try:
+        graph = workload.graph()
+        start = perf_counter()
+        budget = SearchBudget(timeout)  # The deadline includes building the search, as in the CLI
+        stats = SearchStats()
+        if strategy == 'c':
+            try:
+                search = make_search_c(graph, limit=limit, budget=budget)
+            except BudgetExceeded as e:
+                stats.status, solution = e.status, None
+            else:
+                solution = next(search.solutions(1), None)
+                stats = search.stats
+        elif strategy == 'g':
+            solution = next(solve_graph_bfs(graph, limit=limit, stats=stats, budget=budget), None)
+        else:
+            solution = next(interpret(graph, limit=limit, stats=stats, budget=budget), None)
+        result['wall_time'] = perf_counter() - start
+        result['states_expanded'] = stats.states_expanded
+        result['solution_length'] = len(solution.path) if solution is not None else None
+        result['status'] = stats.status.name
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    result['peak_rss'] = peak_rss()
+    return result
+
+
+def _run_child(connection, workload, strategy, limit, timeout) -> None:
+    connection.send(run(workload, strategy, limit, timeout))
+    connection.close()
+
+
+def run_isolated(workload: Workload, strategy: str, limit: int, timeout: float | None) -> dict:
+    """Like `run`, in a forked child; in this process where fork is unavailable."""
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return run(workload, strategy, limit, timeout)
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+    child = context.Process(target=_run_child, args=(sender, workload, strategy, limit, timeout))
+    child.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:  # The child died without reporting, e.g. killed for its memory
+        result = {'workload': workload.name, 'family': workload.family, 'size': workload.size, 'strategy': strategy,
+                  'wall_time': None, 'states_expanded': None, 'peak_rss': None, 'solution_length': None, 'status': None,
+                  'error': f"child process died (exit code {child.exitcode})"}
+    child.join()
+    if result['error'] is None and child.exitcode not in (0, None):
+        result['error'] = f"child process died (exit code {child.exitcode})"
+    return result
+
+
+def run_all(
+    workloads: list[Workload],
+    strategies: str = 'cgp',
+    limit: int = 1000000,
+    timeout: float | None = 10.0,
+    isolate: bool = True,
+    report: Callable[[dict], None] | None = None,
+) -> list[dict]:
+    """Run every strategy on every workload; `report` is called with each result as it comes."""
+    results = []
+    for workload in workloads:
+        for strategy in strategies:
+            result = (run_isolated if isolate else run)(workload, strategy, limit, timeout)
+            if report is not None:
+                report(result)
+            results.append(result)
+    return results
+
+
+def scaling(results: list[dict], min_time: float = 0.05) -> dict[tuple[str, str, str], float]:
+    """The exponent k of size^k that best fits (by least squares, on a log
+    scale) how the wall time and states expanded of each family of workloads
+    grow with their size, by (family, strategy, metric). Only solved runs
+    count, and for wall times only those of at least `min_time` seconds;
+    a family needs two such sizes.
+    """
+    points = {}
+    for result in results:
+        if result.get('family') is None or result['solution_length'] is None:
+            continue
+        for metric in ('wall_time', 'states_expanded'):
+            if result[metric] and (metric != 'wall_time' or result[metric] >= min_time):
+                points.setdefault((result['family'], result['strategy'], metric), []).append(
+                    (math.log(result['size']), math.log(result[metric])))
+    exponents = {}
+    for key, xy in points.items():
+        if len({x for x, _ in xy}) < 2:
+            continue
+        mean_x, mean_y = sum(x for x, _ in xy) / len(xy), sum(y for _, y in xy) / len(xy)
+        exponents[key] = sum((x - mean_x) * (y - mean_y) for x, y in xy) / sum((x - mean_x) ** 2 for x, _ in xy)
+    return exponents
+
+
+def compare(results: list[dict], baseline: list[dict], threshold: float = 0.2, min_time: float = 0.05) -> list[str]:
+    """The regressions of `results` against the `baseline` runs, one line each.
+
+    A run regresses when it now fails, no longer finds its solution or finds
+    one of another length, or when one of its `METRICS` grew by more than
+    `threshold` (a fraction). Wall times must also grow by at least
+    `min_time` seconds, which keeps the noise of the quick runs out, and
+    states expanded are only compared between runs that were not cut short
+    by the timeout, as those depend on the speed of the machine. A family
+    regresses when one of its `scaling` exponents grew by more than
+    `threshold` (e.g. from size^1.0 to size^1.3).
+    """
+    before = {(old['workload'], old['strategy']): old for old in baseline}
+    regressions = []
+    for new in results:
+        old = before.get((new['workload'], new['strategy']))
+        if old is None:
+            continue
+        name = f"{new['workload']} ({new['strategy']})"
+        if new['error'] is not None:
+            if old['error'] is None:
+                regressions.append(f"{name}: now fails: {new['error']}")
+            continue
+        if old['solution_length'] is not None and new['solution_length'] != old['solution_length']:
+            found = 'no solution' if new['solution_length'] is None else f"a solution of length {new['solution_length']}"
+            regressions.append(f"{name}: {found} ({new['status'].lower()}), was length {old['solution_length']}")
+        for metric in METRICS:
+            new_value, old_value = new[metric], old[metric]
+            if not new_value or not old_value or new_value <= old_value * (1 + threshold):
+                continue
+            if metric == 'wall_time' and new_value - old_value < min_time:
+                continue
+            if metric == 'states_expanded' and SearchStatus.TIMED_OUT.name in (new['status'], old['status']):
+                continue
+            regressions.append(f"{name}: {metric} {old_value:,.6g} -> {new_value:,.6g} (+{100 * (new_value / old_value - 1):.0f}%)")
+    old_exponents = scaling(baseline, min_time)
+    for (family, strategy, metric), exponent in scaling(results, min_time).items():
+        old_exponent = old_exponents.get((family, strategy, metric))
+        if old_exponent is not None and exponent > old_exponent + threshold:
+            regressions.append(f"{family} ({strategy}): {metric} scales as size^{old_exponent:.2f} -> size^{exponent:.2f}")
+    return regressions
+
+
+def show_result(result: dict) -> None:
+    name = f"{result['workload']:<36} {result['strategy']}"
+    if result['error'] is not None:
+        print(f"{name}  \x1B[91merror\x1B[39m: {result['error']}")
+        return
+    length = '-' if result['solution_length'] is None else result['solution_length']
+    rss = '-' if result['peak_rss'] is None else f"{result['peak_rss'] / 2**20:,.1f}M"
+    status = 'solved' if result['solution_length'] is not None else SearchStatus[result['status']].describe()
+    print(f"{name} {result['wall_time']:>9.3f}s {result['states_expanded']:>12,} states {rss:>9} rss  length {length:<5} \x1B[2m{status}\x1B[22m", flush=True)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m conlog.bench', description='benchmark the search strategies')
+    parser.add_argument('-o', '--out',        metavar='FILE',                     default='bench.json', help='write the results to FILE (default: bench.json)')
+    parser.add_argument('-b', '--baseline',   metavar='FILE',                     default=None,         help='compare the results against those in FILE, and exit with status 1 on a regression')
+    parser.add_argument('-t', '--threshold',  metavar='FRACTION', type=float,     default=0.2,          help='how much a metric may grow before it counts as a regression (default: 0.2)')
+    parser.add_argument('-s', '--strategies', metavar='STRATEGIES',               default='cgp',        help='strategies to run (default: cgp)')
+    parser.add_argument('-l', '--limit',      metavar='N',        type=int,       default=1000000,      help='search limit of each run')
+    parser.add_argument('--timeout',          metavar='SECONDS',  type=float,     default=10.0,         help='stop each run after SECONDS (default: 10)')
+    parser.add_argument('--examples',         metavar='DIR',                      default='examples',   help='directory of the example programs')
+    parser.add_argument('--no-generated',     dest='generated', action='store_false', default=True, help='only run the example programs')
+    parser.add_argument('-k', '--only',       metavar='TEXT',                     default=None,         help='only run the workloads whose name contains TEXT')
+    args = parser.parse_args(argv)
+    if any(strategy not in STRATEGIES for strategy in args.strategies):
+        parser.error(f"strategies are some of {''.join(STRATEGIES)}")
+
+    workloads = example_workloads(args.examples) + (family_workloads() if args.generated else [])
+    if args.only is not None:
+        workloads = [workload for workload in workloads if args.only in workload.name]
+
+    results = run_all(workloads, args.strategies, args.limit, args.timeout, report=show_result)
+    with open(args.out, 'w') as f:
+        json.dump({'limit': args.limit, 'timeout': args.timeout, 'runs': results}, f, indent=1)
+    for (family, strategy, metric), exponent in sorted(scaling(results).items()):
+        print(f"{family:<36} {strategy} {metric:<16} scales as size^{exponent:.2f}")
+
+    if args.baseline is None:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)['runs']
+    regressions = compare(results, baseline, args.threshold)
+    for line in regressions:
+        print(f"\x1B[91mregression\x1B[39m {line}")
+    if not regressions:
+        print(f"\x1B[92mno regressions\x1B[39m against {args.baseline}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
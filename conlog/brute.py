@@ -6,19 +6,13 @@ from typing import Iterator, cast
 import networkx as nx
 
 from conlog.datatypes import (
-    Addition,
-    ConditionalDecrement,
-    ConditionalIncrement,
     Initial,
-    IntegerPrint,
     Node,
     Solution,
-    Subtraction,
     Terminal,
-    UnicodePrint,
 )
 from conlog.directed import make_uturnless
-from conlog.evaluator import evaluate
+from conlog.evaluator import compile_path, evaluate, run_reverse
 
 
 def find_initial_edges(g: nx.DiGraph) -> Iterator[tuple[Node, Node]]:
@@ -44,46 +38,7 @@ def compute_initial_values(path: list[Node]) -> dict[str, int]:
     for v in initial.free:
         assignment[v] = 0
 
-    for node in reversed(path):
-        match node.op:
-            case Initial():
-                pass
-            case None:
-                pass
-            case IntegerPrint():
-                pass
-            case UnicodePrint():
-                pass
-            case Addition(lhs=lhs, rhs=rhs):
-                if isinstance(rhs, int):
-                    assignment[lhs] -= rhs
-                else:
-                    assignment[lhs] -= assignment[rhs]
-            case Subtraction(lhs=lhs, rhs=rhs):
-                if isinstance(rhs, int):
-                    assignment[lhs] += rhs
-                else:
-                    assignment[lhs] += assignment[rhs]
-            case ConditionalDecrement(lhs=lhs, rhs=rhs):
-                if isinstance(rhs, int):
-                    cond = rhs > 0
-                else:
-                    cond = assignment[rhs] > 0
-
-                if cond:
-                    assignment[lhs] -= 1
-            case ConditionalIncrement(lhs=lhs, rhs=rhs):
-                if isinstance(rhs, int):
-                    cond = rhs > 0
-                else:
-                    cond = assignment[rhs] > 0
-
-                if cond:
-                    assignment[lhs] += 1
-            case Terminal():
-                pass
-            case _:
-                raise ValueError(f"Unknown operation: {node.op}")
+    run_reverse(compile_path(path), assignment)
 
     return assignment
 
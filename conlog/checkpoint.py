@@ -0,0 +1,144 @@
+"""Checkpointing for the BFS search workspaces (strategy c).
+
+A checkpoint file is a short header written here, followed by the search
+state streamed by the engine itself (`save_search_workspace_lowlevel` in C,
+`save_search_workspace_python` in the fallback):
+
+    [magic version digest wide_bytes] [wide search] [engine body]
+
+The digest identifies the program, so a checkpoint is only ever restored
+into a workspace built from the same graph. The `wide_bytes` bytes after the
+header hold the search past the int64 range (see `solver_c.WideSearch.dump`),
+and are empty until there is one.
+"""
+
+import hashlib
+import os
+import signal
+import struct
+
+import networkx as nx
+
+from conlog.datatypes import Node
+from conlog.stats import ProgressHook, SearchStatus
+
+CHECKPOINT_MAGIC = b"CONLOGCK"
+CHECKPOINT_VERSION = 7
+CHECKPOINT_EVERY = 10_000_000
+SIGTERM_POLL_MS = 100  # How often a running search checks for SIGTERM
+
+_header = struct.Struct("=8sI32sQ")
+
+
+class CheckpointError(Exception):
+    pass
+
+
+def program_digest(nodes: list[Node], var_names: list[str], graph: nx.Graph) -> bytes:
+    """Hash the node order, operations, edges and variable order of a workspace."""
+
+    index = {node: i for i, node in enumerate(nodes)}
+
+    h = hashlib.sha256()
+    h.update(repr(var_names).encode())
+    for node in nodes:
+        neighbors = sorted(index[other] for other in graph.neighbors(node))
+        h.update(repr((node.name, node.op, neighbors)).encode())
+    return h.digest()
+
+
+def write_checkpoint_header(f, digest: bytes, wide: bytes = b"") -> None:
+    f.write(_header.pack(CHECKPOINT_MAGIC, CHECKPOINT_VERSION, digest, len(wide)))
+    f.write(wide)
+
+
+def read_checkpoint_header(path: str, digest: bytes) -> tuple[int, bytes]:
+    """Check the header of `path`; return the offset of the engine body, and the wide search."""
+
+    with open(path, "rb") as f:
+        raw = f.read(_header.size)
+        if len(raw) < _header.size:
+            raise CheckpointError(f"{path}: truncated checkpoint")
+        magic, version, file_digest, wide_bytes = _header.unpack(raw)
+        wide = f.read(wide_bytes) if magic == CHECKPOINT_MAGIC and version == CHECKPOINT_VERSION else b""
+
+    if magic != CHECKPOINT_MAGIC:
+        raise CheckpointError(f"{path}: not a conlog checkpoint")
+    if version != CHECKPOINT_VERSION:
+        raise CheckpointError(f"{path}: unsupported checkpoint version {version}")
+    if file_digest != digest:
+        raise CheckpointError(f"{path}: checkpoint was made for a different program")
+    if len(wide) < wide_bytes:
+        raise CheckpointError(f"{path}: truncated checkpoint")
+
+    return _header.size + wide_bytes, wide
+
+
+def temporary_path(path: str) -> str:
+    # Checkpoints are written beside the target and renamed over it, so being
+    # preempted mid-write never destroys the previous checkpoint
+    return path + ".tmp"
+
+
+def commit_checkpoint(path: str) -> None:
+    os.replace(temporary_path(path), path)
+
+
+def solve_with_checkpoints(search, path: str, every: int | None = None, batch_size: int = 1):
+    """Yield the solutions of `search`, saving it to `path` periodically.
+
+    The search runs in chunks of `every` iterations; a checkpoint is written
+    after each chunk, and whenever the search stops before running out of
+    states: at the limit, out of time or memory, or cancelled by its
+    progress hook. On SIGTERM the running chunk is cancelled (through the
+    progress hook, within `SIGTERM_POLL_MS`), a last checkpoint is written
+    and `SystemExit` is raised. `batch_size` is passed on to
+    `search.solutions`.
+    """
+
+    every = CHECKPOINT_EVERY if every is None else every
+
+    terminated = False
+
+    def on_sigterm(signum, frame):
+        nonlocal terminated
+        terminated = True
+
+    previous_progress = search.progress
+
+    def on_progress(progress):
+        if previous_progress is not None and previous_progress.due(progress.iterations):
+            if previous_progress.report(progress.iterations, progress.depth, progress.frontier):
+                return True
+        return terminated
+
+    every_ms = SIGTERM_POLL_MS
+    if previous_progress is not None and previous_progress.every_ms:
+        every_ms = min(every_ms, previous_progress.every_ms)
+
+    previous_handler = signal.signal(signal.SIGTERM, on_sigterm)
+    search.set_progress(ProgressHook(on_progress, previous_progress.every if previous_progress else None, every_ms))
+    limit = search.limit
+    try:
+        while True:
+            chunk_limit = search.iterations + every
+            if limit is not None and limit < chunk_limit:
+                chunk_limit = limit
+            search.set_limit(chunk_limit)
+
+            yield from search.solutions(batch_size)
+
+            status = search.status
+            if status in (SearchStatus.EXHAUSTED, SearchStatus.INCOMPLETE):
+                break  # Out of states: there is nothing to resume
+
+            # Also saved at the real limit, so the search can resume with a higher one
+            search.save(path)
+            if terminated:
+                raise SystemExit(f"terminated; search saved to {path}")
+            if status != SearchStatus.LIMIT_REACHED or chunk_limit == limit:
+                break
+    finally:
+        search.set_limit(limit)
+        search.set_progress(previous_progress)
+        signal.signal(signal.SIGTERM, previous_handler)
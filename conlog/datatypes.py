@@ -1,12 +1,62 @@
+import weakref
 from collections import defaultdict
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields
 from typing import Iterable
 
 import networkx as nx
 
 
-@dataclass(frozen=True, order=True)
-class Operation:
+class _Interned(type):
+    """Metaclass: equal instances are created once and then shared, so
+    equality is almost always an identity check."""
+
+    def __init__(cls, name, bases, namespace) -> None:
+        super().__init__(name, bases, namespace)
+        cls._instances = weakref.WeakValueDictionary()
+
+    def __call__(cls, *args, **kwargs):
+        instance = super().__call__(*args, **kwargs)
+        return cls._instances.setdefault(instance._key(), instance)
+
+
+def _cached_hash(self) -> int:
+    return self._hash
+
+
+def _interned_eq(self, other) -> bool:
+    if self is other:
+        return True
+    if other.__class__ is not self.__class__:
+        return NotImplemented
+    return self._hash == other._hash and self._key() == other._key()
+
+
+def interned(cls):
+    """Frozen, ordered dataclass whose hash is computed once and whose
+    instances are interned (see `_Interned`). Subclasses declare their
+    fields in `__slots__`."""
+
+    cls = dataclass(frozen=True, order=True)(cls)
+    cls._field_names = tuple(f.name for f in fields(cls))
+    cls.__hash__ = _cached_hash
+    cls.__eq__ = _interned_eq
+    return cls
+
+
+class _Value(metaclass=_Interned):
+    __slots__ = ("_hash", "__weakref__")
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "_hash", hash(self._key()))
+
+    def _key(self) -> tuple:
+        return (self.__class__, *(getattr(self, name) for name in self._field_names))
+
+
+@interned
+class Operation(_Value):
+    __slots__ = ()
+
     def update(self, assignment: dict[str, int], stdout: list[str | int]) -> None:
         """Update the variable assignments and stdout in-place
         by visiting this operation."""
@@ -14,8 +64,10 @@ class Operation:
         pass
 
 
-@dataclass(frozen=True, order=True)
+@interned
 class Initial(Operation):
+    __slots__ = ("free", "fixed")
+
     free: tuple[str, ...]
     fixed: tuple[tuple[str, int], ...]
 
@@ -25,14 +77,18 @@ class Initial(Operation):
         return ", ".join(vars)
 
 
-@dataclass(frozen=True, order=True)
+@interned
 class Terminal(Operation):
+    __slots__ = ()
+
     def __str__(self) -> str:
         return "Terminal"
 
 
-@dataclass(frozen=True, order=True)
+@interned
 class Addition(Operation):
+    __slots__ = ("lhs", "rhs")
+
     lhs: str
     rhs: str | int
 
@@ -46,8 +102,10 @@ class Addition(Operation):
             assignment[self.lhs] += assignment[self.rhs]
 
 
-@dataclass(frozen=True, order=True)
+@interned
 class IntegerPrint(Operation):
+    __slots__ = ("var",)
+
     var: str | int
 
     def __str__(self) -> str:
@@ -60,8 +118,10 @@ class IntegerPrint(Operation):
             stdout.append(assignment[self.var])
 
 
-@dataclass(frozen=True, order=True)
+@interned
 class UnicodePrint(Operation):
+    __slots__ = ("var",)
+
     var: str | int
 
     def __str__(self) -> str:
@@ -74,8 +134,10 @@ class UnicodePrint(Operation):
             stdout.append(chr(assignment[self.var]))
 
 
-@dataclass(frozen=True, order=True)
+@interned
 class Subtraction(Operation):
+    __slots__ = ("lhs", "rhs")
+
     lhs: str
     rhs: str | int
 
@@ -89,8 +151,10 @@ class Subtraction(Operation):
             assignment[self.lhs] -= assignment[self.rhs]
 
 
-@dataclass(frozen=True, order=True)
+@interned
 class ConditionalIncrement(Operation):
+    __slots__ = ("lhs", "rhs")
+
     lhs: str
     rhs: str | int
 
@@ -105,8 +169,10 @@ class ConditionalIncrement(Operation):
             assignment[self.lhs] += 1
 
 
-@dataclass(frozen=True, order=True)
+@interned
 class ConditionalDecrement(Operation):
+    __slots__ = ("lhs", "rhs")
+
     lhs: str
     rhs: str | int
 
@@ -121,8 +187,10 @@ class ConditionalDecrement(Operation):
             assignment[self.lhs] -= 1
 
 
-@dataclass(frozen=True, order=True)
-class Node:
+@interned
+class Node(_Value):
+    __slots__ = ("name", "op")
+
     name: str
     op: Operation | None
 
@@ -137,6 +205,55 @@ class Solution:
     stdout: list[str | int]
 
 
+class PackedSolution:
+    """A solution backed by a packed record from the C search, in the
+    layout [arr_size values0 ... values{N-1} node_id0 ... node_id{arr_size-1}].
+
+    Same fields as `Solution`, but `path`, `assignment` and `stdout` are only
+    built on first access. `source` provides `nodes`, `var_names` and
+    `record_stdout(record)`.
+    """
+
+    __slots__ = ("record", "source", "_path", "_assignment", "_stdout")
+
+    def __init__(self, record, source) -> None:
+        self.record = record
+        self.source = source
+        self._path = None
+        self._assignment = None
+        self._stdout = None
+
+    @property
+    def values(self):
+        return self.record[1 : 1 + len(self.source.var_names)]
+
+    @property
+    def node_ids(self):
+        return self.record[1 + len(self.source.var_names) :]
+
+    @property
+    def path(self) -> list[Node]:
+        if self._path is None:
+            nodes = self.source.nodes
+            self._path = [nodes[i] for i in self.node_ids]
+        return self._path
+
+    @property
+    def assignment(self) -> dict[str, int]:
+        if self._assignment is None:
+            self._assignment = dict(zip(self.source.var_names, self.values))
+        return self._assignment
+
+    @property
+    def stdout(self) -> list[str | int]:
+        if self._stdout is None:
+            self._stdout = self.source.record_stdout(self.record)
+        return self._stdout
+
+    def __repr__(self) -> str:
+        return f"PackedSolution(path={self.path!r}, assignment={self.assignment!r}, stdout={self.stdout!r})"
+
+
 def make_graph(edges: Iterable[tuple[Node, Node]]) -> nx.Graph:
     g = nx.Graph()
     g.add_edges_from(edges)
@@ -1,6 +1,8 @@
 import logging
+import sys
 from collections import deque
 from dataclasses import dataclass
+from time import perf_counter
 from typing import Iterator, cast
 
 import networkx as nx
@@ -27,10 +29,46 @@ from conlog.monotonicity import (
     find_initial,
     find_initial_node,
 )
+from conlog.stats import BUDGET_CHECK_INTERVAL, ProgressHook, SearchBudget, SearchStats, SearchStatus, count_step, timed_search
+from conlog.trace import pause_layers, resume_layers, trace_layer, trace_span, traced
 
 logger = logging.getLogger(__name__)
 
 
+def _monotone_operations(g: nx.Graph) -> list[tuple[str, str | int, int]]:
+    """The (lhs, rhs, sign) of each operation, which adds sign * rhs to lhs.
+
+    Conditional operations add or subtract 1, or nothing, so they count as
+    adding or subtracting the constant 1.
+    """
+
+    operations = []
+    for node in g.nodes:
+        match node.op:
+            case Addition(lhs=lhs, rhs=rhs):
+                operations.append((lhs, rhs, 1))
+            case Subtraction(lhs=lhs, rhs=rhs):
+                operations.append((lhs, rhs, -1))
+            case ConditionalIncrement(lhs=lhs):
+                operations.append((lhs, 1, 1))
+            case ConditionalDecrement(lhs=lhs):
+                operations.append((lhs, 1, -1))
+            case _:
+                pass
+    return operations
+
+
+def _operand_direction(
+    rhs: str | int, nonnegative: set[str], nonpositive: set[str]
+) -> int:
+    """1 if adding `rhs` never decreases, -1 if it never increases, else 0."""
+    if isinstance(rhs, int) and rhs >= 0 or (isinstance(rhs, str) and rhs in nonnegative):
+        return 1
+    if isinstance(rhs, int) and rhs <= 0 or (isinstance(rhs, str) and rhs in nonpositive):
+        return -1
+    return 0
+
+
 def determine_monotone_variables(
     g: nx.Graph,
     initial: Initial,
@@ -47,44 +85,14 @@ def determine_monotone_variables(
 
     non_monotonic = set()
 
-    for node in g.nodes:
-        match node.op:
-            case Addition(lhs=lhs, rhs=rhs):
-                if (
-                    isinstance(rhs, int)
-                    and rhs >= 0
-                    or (isinstance(rhs, str) and rhs in nonnegative)
-                ):
-                    increments.add(lhs)
-                elif (
-                    isinstance(rhs, int)
-                    and rhs <= 0
-                    or (isinstance(rhs, str) and rhs in nonpositive)
-                ):
-                    decrements.add(lhs)
-                else:
-                    non_monotonic.add(lhs)
-            case Subtraction(lhs=lhs, rhs=rhs):
-                if (
-                    isinstance(rhs, int)
-                    and rhs >= 0
-                    or (isinstance(rhs, str) and rhs in nonnegative)
-                ):
-                    decrements.add(lhs)
-                elif (
-                    isinstance(rhs, int)
-                    and rhs <= 0
-                    or (isinstance(rhs, str) and rhs in nonpositive)
-                ):
-                    increments.add(lhs)
-                else:
-                    non_monotonic.add(lhs)
-            case ConditionalIncrement(lhs=lhs):
+    for lhs, rhs, sign in _monotone_operations(g):
+        match sign * _operand_direction(rhs, nonnegative, nonpositive):
+            case 1:
                 increments.add(lhs)
-            case ConditionalDecrement(lhs=lhs):
+            case -1:
                 decrements.add(lhs)
             case _:
-                pass
+                non_monotonic.add(lhs)
 
     return (
         all_variables - decrements - non_monotonic,
@@ -234,7 +242,28 @@ def bounds_violated(
     return False
 
 
-def interpret(g: nx.Graph, limit: int | None = None) -> Iterator[Solution]:
+def interpret(
+    g: nx.Graph,
+    limit: int | None = None,
+    stats: SearchStats | None = None,
+    progress: ProgressHook | None = None,
+    budget: SearchBudget | None = None,
+) -> Iterator[Solution]:
+    """Yield the solutions of `g`; `stats`, if given, is filled in as the
+    search goes. No-backtracking is built into the search graph, so no
+    steps are counted as pruned by it."""
+    stats = SearchStats() if stats is None else stats
+    return timed_search(_interpret(g, limit, stats, progress, budget), stats)
+
+
+def _interpret(
+    g: nx.Graph,
+    limit: int | None,
+    stats: SearchStats,
+    progress: ProgressHook | None,
+    budget: SearchBudget | None,
+) -> Iterator[Solution]:
+    start = perf_counter()
     initial = find_initial(g)
 
     node_depth = nx.single_source_shortest_path_length(g, find_initial_node(g))
@@ -248,11 +277,23 @@ def interpret(g: nx.Graph, limit: int | None = None) -> Iterator[Solution]:
     queue = deque()
     for edge in find_initial_edges(dg):
         queue.append([edge])
+    stats.preprocessing_time += perf_counter() - start
 
     count = 0
+    layer = 0  # Histories are popped in order of length
     while queue:
+        # Checked before the pruned states too, which skip the rest of the loop
+        if budget is not None and (exceeded := budget.exceeded(stats.bytes_allocated)) is not None:
+            stats.status = exceeded
+            return
+
         history = queue.popleft()
+        if len(history) - 1 > layer:
+            layer = len(history) - 1
+            trace_layer(layer, count, len(queue) + 1)
         u, v = history[-1]
+        stats.states_expanded += 1
+        stats.node_expansions[v.name] = stats.node_expansions.get(v.name, 0) + 1
 
         path = make_candidate_solution(history)
 
@@ -261,10 +302,15 @@ def interpret(g: nx.Graph, limit: int | None = None) -> Iterator[Solution]:
             case Terminal():
                 path = make_candidate_solution(history)
                 assignment = compute_initial_values(path)
-                solution = evaluate(path, assignment)
+                start = perf_counter()
+                with trace_span("verify"):
+                    solution = evaluate(path, assignment)
+                stats.verification_time += perf_counter() - start
 
                 if solution is not None:
+                    pause_layers()
                     yield solution
+                    resume_layers()
 
                 # We need not consider nodes after the terminal
                 continue
@@ -287,6 +333,7 @@ def interpret(g: nx.Graph, limit: int | None = None) -> Iterator[Solution]:
             monotone_dec,
             initial,
         ):
+            stats.pruned_by_bounds += 1
             continue
 
         # Explore neighbors, favoring nodes moving closer to the Terminal
@@ -297,54 +344,303 @@ def interpret(g: nx.Graph, limit: int | None = None) -> Iterator[Solution]:
             new_history = list(history)
             new_history.append(node)
             queue.append(new_history)
+            stats.bytes_allocated += sys.getsizeof(new_history)
+            count_step(stats, node[0].name, node[1].name)
+        stats.queue_high_water = max(stats.queue_high_water, len(queue))
 
         # Enforce search limits
         count += 1
         if limit is not None and count > limit:
             break
 
+        if progress is not None and progress.due(count):
+            if progress.report(count, len(history) - 1, len(queue)):
+                stats.status = SearchStatus.CANCELLED
+                return
+
+    stats.status = SearchStatus.LIMIT_REACHED if queue else SearchStatus.EXHAUSTED
+
+
+def _monotone_bounds(
+    var: str, increasing: bool, decreasing: bool, fixed: dict[str, int]
+) -> list[int | float]:
+    bounds: list[int | float] = [float("-inf"), float("inf")]
+    if increasing:
+        bounds[1] = min(bounds[1], 0)
+        if var in fixed:
+            bounds[0] = max(bounds[0], fixed[var])
+    if decreasing:
+        bounds[0] = max(bounds[0], 0)
+        if var in fixed:
+            bounds[1] = min(bounds[1], fixed[var])
+    return bounds
+
 
 def get_bounds_from_monotonicity(
     g: nx.Graph, increasing: set[str], decreasing: set[str]
 ) -> dict[str, tuple[int | float, int | float]]:
     initial = find_initial(g)
-    free, fixed = set(initial.free), dict(initial.fixed)
+    fixed = dict(initial.fixed)
 
     # Given some variables are monotonic, bound them.
     boundable_vars = increasing | decreasing
-    bounds = {var: [float("-inf"), float("inf")] for var in boundable_vars}
-    for var in boundable_vars:
-        if var in increasing:
-            bounds[var][1] = min(bounds[var][1], 0)
-            if var in fixed:
-                bounds[var][0] = max(bounds[var][0], fixed[var])
-        if var in decreasing:
-            bounds[var][0] = max(bounds[var][0], 0)
-            if var in fixed:
-                bounds[var][1] = min(bounds[var][1], fixed[var])
-
-    return bounds
+    return {
+        var: _monotone_bounds(var, var in increasing, var in decreasing, fixed)
+        for var in boundable_vars
+    }
 
 
+@traced
 def determine_variable_bounds_multipass(
-    g: nx.Graph,
+    g: nx.Graph, budget: SearchBudget | None = None
 ) -> dict[str, tuple[int | float, int | float]]:
+    """Bound the monotone variables, repeating `determine_monotone_variables`.
+
+    Each pass feeds the variables found nonnegative / nonpositive into the
+    next, for at most one pass per variable. A pass only revisits the
+    operations whose operand changed sign in the pass before, and the
+    passes stop once nothing changes. Past the deadline of `budget`, raises
+    `BudgetExceeded`.
+    """
     initial = find_initial(g)
     free, fixed = set(initial.free), dict(initial.fixed)
+    variables = free | set(fixed)
+
+    operations = _monotone_operations(g)
+    by_operand: dict[str, list[int]] = {}
+    for i, (_, rhs, _) in enumerate(operations):
+        if isinstance(rhs, str):
+            by_operand.setdefault(rhs, []).append(i)
+
+    # How many operations increment, decrement, or change each variable either way
+    nonnegative: set[str] = set()
+    nonpositive: set[str] = set()
+    directions = [sign * _operand_direction(rhs, nonnegative, nonpositive) for _, rhs, sign in operations]
+    counts = {var: {1: 0, -1: 0, 0: 0} for var in variables}
+    for (lhs, _, _), direction in zip(operations, directions):
+        if lhs in counts:
+            counts[lhs][direction] += 1
 
-    # N passes to allow propagation of nonnegativity/nonpositivity to all variables
     bounds = dict()
-    nonpositive = set()
-    nonnegative = set()
-    for _ in range(len(free) + len(fixed)):
-        increasing, decreasing = determine_monotone_variables(
-            g, initial, nonnegative=nonnegative, nonpositive=nonpositive
-        )
-
-        bounds = get_bounds_from_monotonicity(g, increasing, decreasing)
+    dirty = set(variables)
+    for remaining in reversed(range(len(variables))):
+        if budget is not None:
+            budget.check()
+        changed = set()
+        for var in dirty:
+            increasing = counts[var][-1] == 0 and counts[var][0] == 0
+            decreasing = counts[var][1] == 0 and counts[var][0] == 0
+            if increasing or decreasing:
+                bounds[var] = _monotone_bounds(var, increasing, decreasing, fixed)
+            else:
+                bounds.pop(var, None)
+
+            # Now, see if it is nonnegative / nonpositive
+            is_nonnegative = var in bounds and bounds[var][0] >= 0
+            is_nonpositive = var in bounds and bounds[var][1] <= 0
+            if is_nonnegative != (var in nonnegative) or is_nonpositive != (var in nonpositive):
+                changed.add(var)
+            nonnegative.discard(var)
+            nonpositive.discard(var)
+            if is_nonnegative:
+                nonnegative.add(var)
+            if is_nonpositive:
+                nonpositive.add(var)
+
+        if not (changed and remaining):
+            break
 
-        # Now, see if any are nonnegative / nonpositive vars
-        nonnegative = {var for var, bounds in bounds.items() if bounds[0] >= 0}
-        nonpositive = {var for var, bounds in bounds.items() if bounds[1] <= 0}
+        dirty = set()
+        for var in changed:
+            for i in by_operand.get(var, ()):
+                lhs, rhs, sign = operations[i]
+                direction = sign * _operand_direction(rhs, nonnegative, nonpositive)
+                if direction != directions[i] and lhs in counts:
+                    counts[lhs][directions[i]] -= 1
+                    counts[lhs][direction] += 1
+                    dirty.add(lhs)
+                directions[i] = direction
 
     return bounds
+
+
+def _op_directions(
+    op, bounds: dict[str, tuple[int | float, int | float]]
+) -> tuple[set[str], set[str]]:
+    """The variables `op` may increase and may decrease, run forwards."""
+
+    def sign(rhs: str | int) -> tuple[bool, bool]:
+        # Whether rhs may be positive, and whether it may be negative
+        if isinstance(rhs, int):
+            return rhs > 0, rhs < 0
+        lower, upper = bounds.get(rhs, (float("-inf"), float("inf")))
+        return upper > 0, lower < 0
+
+    match op:
+        case Addition(lhs=lhs, rhs=rhs):
+            positive, negative = sign(rhs)
+        case Subtraction(lhs=lhs, rhs=rhs):
+            negative, positive = sign(rhs)
+        case ConditionalIncrement(lhs=lhs, rhs=rhs):
+            positive, negative = sign(rhs)[0], False
+        case ConditionalDecrement(lhs=lhs, rhs=rhs):
+            positive, negative = False, sign(rhs)[0]
+        case _:
+            return set(), set()
+
+    return ({lhs} if positive else set()), ({lhs} if negative else set())
+
+
+@traced
+def determine_edge_bounds(
+    g: nx.Graph, bounds: dict[str, tuple[int | float, int | float]], budget: SearchBudget | None = None
+) -> dict[tuple[Node, Node], dict[str, tuple[int | float, int | float]]]:
+    """Bounds for the backwards search, per step, tighter than `bounds`.
+
+    A state of the backwards search that moved from u to v can still only
+    undo the operations it can reach without turning around or passing the
+    Terminal. Those tell which way each fixed variable may still move before
+    the search reaches the Initial: a fixed variable that the rest of the
+    path can only increase (run forwards) is at least its fixed value now,
+    one it can only decrease is at most its fixed value, and one it never
+    touches is exactly its fixed value. This is the `AtLeast`/`AtMost`
+    reasoning of `bounds_violated`, read backwards over concrete values.
+
+    Only the steps (u, v) where this tightens `bounds` are returned; steps
+    that can no longer reach the Initial get empty bounds. The steps of one
+    strongly connected component share one bounds dict. Past the deadline
+    of `budget`, raises `BudgetExceeded`.
+    """
+
+    initial = find_initial(g)
+    fixed = dict(initial.fixed)
+    fixed_index = {var: i for i, var in enumerate(fixed)}
+    variables = list(fixed) + list(initial.free)
+
+    nodes = list(g.nodes)
+    node_index = {node: i for i, node in enumerate(nodes)}
+    adjacency = [[node_index[other] for other in g.adj[node]] for node in nodes]
+
+    # Which fixed variables (bitmasks) the operation of each node may
+    # increase and decrease
+    node_inc, node_dec = [], []
+    for node in nodes:
+        inc, dec = _op_directions(node.op, bounds)
+        node_inc.append(sum(1 << fixed_index[var] for var in inc if var in fixed_index))
+        node_dec.append(sum(1 << fixed_index[var] for var in dec if var in fixed_index))
+
+    # The steps of the backwards search: step offsets[u] + k moves from u to
+    # its k-th neighbor v, and continues to (v, w), w != u
+    offsets = [0]
+    for neighbors in adjacency:
+        offsets.append(offsets[-1] + len(neighbors))
+    step_source = [u for u, neighbors in enumerate(adjacency) for _ in neighbors]
+    step_target = [v for neighbors in adjacency for v in neighbors]
+
+    def successors(step: int) -> Iterator[int]:
+        u, v = step_source[step], step_target[step]
+        if isinstance(nodes[v].op, Terminal):
+            return  # The search stops at the Terminal
+        for k, w in enumerate(adjacency[v]):
+            if w != u:
+                yield offsets[v] + k
+
+    # What each step can still reach: operations undone and the Initial.
+    # Steps in one strongly connected component reach the same things, and
+    # Tarjan's algorithm finishes a component after every one it reaches
+    num_steps = len(step_target)
+    order = [-1] * num_steps
+    low = [0] * num_steps
+    component = [-1] * num_steps
+    increases: list[int] = []
+    decreases: list[int] = []
+    reaches_initial: list[bool] = []
+    stack: list[int] = []
+    counter = 0
+    for root in range(num_steps):
+        if order[root] != -1:
+            continue
+        order[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        work = [(root, successors(root))]
+        while work:
+            step, pending = work[-1]
+            for successor in pending:
+                if order[successor] == -1:
+                    order[successor] = low[successor] = counter
+                    counter += 1
+                    if budget is not None and counter % BUDGET_CHECK_INTERVAL == 0:
+                        budget.check()
+                    stack.append(successor)
+                    work.append((successor, successors(successor)))
+                    break
+                if component[successor] == -1:
+                    low[step] = min(low[step], order[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[step])
+                if low[step] != order[step]:
+                    continue
+
+                # `step` roots a component: pop it and summarize it
+                members = []
+                while not members or members[-1] != step:
+                    members.append(stack.pop())
+                    component[members[-1]] = len(increases)
+                inc, dec, found = 0, 0, False
+                for member in members:
+                    v = step_target[member]
+                    inc |= node_inc[v]
+                    dec |= node_dec[v]
+                    found = found or isinstance(nodes[v].op, Initial)
+                    for successor in successors(member):
+                        c = component[successor]
+                        if c != len(increases):
+                            inc |= increases[c]
+                            dec |= decreases[c]
+                            found = found or reaches_initial[c]
+                increases.append(inc)
+                decreases.append(dec)
+                reaches_initial.append(found)
+
+    # A component tightens the lower bound of a fixed variable it never
+    # decreases, and the upper bound of one it never increases, where the
+    # fixed value is tighter than `bounds`; one that may move every variable
+    # both ways tightens nothing. Steps share their component's bounds
+    unbounded = (float("-inf"), float("inf"))
+    fixed_bounds = [tuple(bounds.get(var, unbounded)) for var in fixed]
+    lower_mask = sum(1 << i for i, value in enumerate(fixed.values()) if fixed_bounds[i][0] < value)
+    upper_mask = sum(1 << i for i, value in enumerate(fixed.values()) if fixed_bounds[i][1] > value)
+    fixed_vars = list(fixed.items())
+    unreachable = {var: (float("inf"), float("-inf")) for var in variables}
+
+    component_bounds: list[dict | None] = []
+    for c in range(len(increases)):
+        if budget is not None and c % BUDGET_CHECK_INTERVAL == 0:
+            budget.check()
+        if not reaches_initial[c]:
+            component_bounds.append(unreachable)
+            continue
+        tighter_lower = lower_mask & ~decreases[c]
+        tighter_upper = upper_mask & ~increases[c]
+        tighter = tighter_lower | tighter_upper
+        step_bounds = {}
+        while tighter:
+            bit = tighter & -tighter
+            tighter ^= bit
+            i = bit.bit_length() - 1
+            var, value = fixed_vars[i]
+            lower, upper = fixed_bounds[i]
+            step_bounds[var] = (value if tighter_lower & bit else lower, value if tighter_upper & bit else upper)
+        component_bounds.append(step_bounds or None)
+
+    edge_bounds = {}
+    for step in range(num_steps):
+        step_bounds = component_bounds[component[step]]
+        if step_bounds is not None:
+            edge_bounds[(nodes[step_source[step]], nodes[step_target[step]])] = step_bounds
+
+    return edge_bounds
@@ -1,4 +1,6 @@
-from typing import cast
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, cast
 
 from conlog.datatypes import (
     Addition,
@@ -7,6 +9,7 @@ from conlog.datatypes import (
     Initial,
     IntegerPrint,
     Node,
+    Operation,
     Solution,
     Subtraction,
     Terminal,
@@ -14,25 +17,131 @@ from conlog.datatypes import (
 )
 
 
+# Opcodes of the compiled evaluator
+NOP, INITIAL, TERMINAL, ADD, SUB, COND_INC, COND_DEC, INT_PRINT, UNI_PRINT = range(9)
+
+OPCODES: dict[type, int] = {
+    type(None): NOP,
+    Initial: INITIAL,
+    Terminal: TERMINAL,
+    Addition: ADD,
+    Subtraction: SUB,
+    ConditionalIncrement: COND_INC,
+    ConditionalDecrement: COND_DEC,
+    IntegerPrint: INT_PRINT,
+    UnicodePrint: UNI_PRINT,
+}
+
+
+@dataclass(frozen=True)
+class CompiledPath:
+    """A path (or any list of nodes) as parallel arrays, one entry per node.
+
+    `lhs` is the updated variable, `rhs` the operand (the printed value for
+    prints): a constant if `rhs_is_constant`, else a variable name.
+    """
+
+    opcodes: list[int]
+    lhs: list[str | None]
+    rhs: list[str | int | None]
+    rhs_is_constant: list[bool]
+
+
+@lru_cache(maxsize=None)
+def compile_op(op: Operation | None) -> tuple[int, str | None, str | int | None, bool]:
+    match op:
+        case Addition(lhs=lhs, rhs=rhs) | Subtraction(lhs=lhs, rhs=rhs) | ConditionalIncrement(
+            lhs=lhs, rhs=rhs
+        ) | ConditionalDecrement(lhs=lhs, rhs=rhs):
+            return OPCODES[type(op)], lhs, rhs, isinstance(rhs, int)
+        case IntegerPrint(var=var) | UnicodePrint(var=var):
+            return OPCODES[type(op)], None, var, isinstance(var, int)
+        case None | Initial() | Terminal():
+            return OPCODES[type(op)], None, None, True
+        case _:
+            raise ValueError(f"Unknown operation: {op}")
+
+
+def compile_path(path: list[Node]) -> CompiledPath:
+    compiled = CompiledPath([], [], [], [])
+    for node in path:
+        opcode, lhs, rhs, rhs_is_constant = compile_op(node.op)
+        compiled.opcodes.append(opcode)
+        compiled.lhs.append(lhs)
+        compiled.rhs.append(rhs)
+        compiled.rhs_is_constant.append(rhs_is_constant)
+    return compiled
+
+
+def _add(values, lhs, rhs, prints):
+    values[lhs] += rhs
+
+
+def _sub(values, lhs, rhs, prints):
+    values[lhs] -= rhs
+
+
+def _cond_inc(values, lhs, rhs, prints):
+    if rhs > 0:
+        values[lhs] += 1
+
+
+def _cond_dec(values, lhs, rhs, prints):
+    if rhs > 0:
+        values[lhs] -= 1
+
+
+def _int_print(values, lhs, rhs, prints):
+    prints.append(rhs)
+
+
+def _uni_print(values, lhs, rhs, prints):
+    prints.append(chr(rhs))
+
+
+def _nop(values, lhs, rhs, prints):
+    pass
+
+
+Step = Callable[[dict, str | None, int, list], None]
+
+# Dispatch tables, indexed by opcode. Reverse undoes the forward step; a
+# conditional is undone when its condition holds after the step.
+FORWARD: list[Step] = [_nop, _nop, _nop, _add, _sub, _cond_inc, _cond_dec, _int_print, _uni_print]
+REVERSE: list[Step] = [_nop, _nop, _nop, _sub, _add, _cond_dec, _cond_inc, _nop, _nop]
+
+
+def step(table: list[Step], op: Operation | None, values: dict, prints: list) -> None:
+    """Apply one node's operation through `table` (FORWARD or REVERSE)."""
+    opcode, lhs, rhs, rhs_is_constant = compile_op(op)
+    table[opcode](values, lhs, rhs if rhs_is_constant else values[rhs], prints)
+
+
+def run_forward(compiled: CompiledPath, values: dict, prints: list, start: int = 1) -> None:
+    """Evaluate from `start` up to the first Terminal, in place."""
+    for i in range(start, len(compiled.opcodes)):
+        opcode = compiled.opcodes[i]
+        if opcode == TERMINAL:
+            return
+        rhs = compiled.rhs[i]
+        FORWARD[opcode](values, compiled.lhs[i], rhs if compiled.rhs_is_constant[i] else values[rhs], prints)
+
+
+def run_reverse(compiled: CompiledPath, values: dict) -> None:
+    """Undo every node from last to first, in place."""
+    prints: list = []
+    for i in reversed(range(len(compiled.opcodes))):
+        rhs = compiled.rhs[i]
+        REVERSE[compiled.opcodes[i]](values, compiled.lhs[i], rhs if compiled.rhs_is_constant[i] else values[rhs], prints)
+
+
 def partial_evaluate(
     path: list[Node], assignment: dict[str, int]
 ) -> tuple[dict[str, int], list[str | int]]:
     var_values = dict(assignment)
-    prints = []
-
-    found_terminal = False
-
-    for node in path[1:]:
-        match node.op:
-            case Terminal():
-                return var_values, prints
-            case None:
-                pass
-            case op:
-                op.update(var_values, prints)
+    prints: list[str | int] = []
 
-        if found_terminal:
-            break
+    run_forward(compile_path(path), var_values, prints)
 
     return var_values, prints
 
@@ -10,6 +10,7 @@ from conlog.datatypes import (
     UnicodePrint,
     Node,
 )
+from conlog.trace import traced
 
 DISALLOW_SELF_MUTATION = True
 
@@ -58,9 +59,16 @@ class Program:
                     print(' --', ', '.join(f"\x1B[94m{a}\x1B[39m" for a in adjuncts), end='')
                 print()
 
+    def fingerprint(self):
+        """
+        Hashable snapshot of the program; any edit produces a different fingerprint.
+        """
+        return (frozenset(self.variables.items()), frozenset(self.nodes.items()), frozenset(self.edges))
+
     def uninitialized(self) -> list[str]:
         return sorted(name for (name, constraint) in self.variables.items() if constraint is None)
 
+    @traced
     def graph(self):
         """
         Assumes initial and final nodes exist and that all variables are initialized.
@@ -489,6 +497,7 @@ class GridError:
             print()
 
 
+@traced
 def convert_to_grid(text):
     """
     Returns GridError or a grid.
@@ -525,6 +534,7 @@ def convert_to_grid(text):
     return [line.ljust(width, ' ') for line in lines]
 
 
+@traced
 def scan_regions(grid):
     """
     Returns GridError or (next region number, dict of regions, cells).
@@ -582,6 +592,7 @@ def scan_regions(grid):
     return (region_count, regions, cells)
 
 
+@traced
 def scan_junctions(grid, cells, init_junction_num):
     """
     Modifies cells, return (next junction number, dict of junctions).
@@ -641,6 +652,7 @@ def flood_path(grid, cells, neighbors, path_num, row, column):
             flood_path(grid, cells, neighbors, path_num, row, adj)
 
 
+@traced
 def scan_paths(grid, cells, init_path_num):
     """
     Modifies cells, returns (next path number, dict of paths)
@@ -664,6 +676,8 @@ class GridProgram(Program):
         super().__init__()
         self.initial = None
         self.final   = None
+        self.grid    = None     # the diagram, see make_grid_program
+        self.owners  = None     # per cell of the grid: node name, edge (sorted node names), or None
 
     def add_node(self, region_id, row, column, text):
         node_name = f"node.{region_id}"
@@ -785,6 +799,7 @@ class GridProgram(Program):
         self.variables[name] = value
 
 
+@traced
 def make_grid_program(grid):
     """
     Returns instance of GridError or GridProgram.
@@ -802,6 +817,14 @@ def make_grid_program(grid):
 
     program = GridProgram()
 
+    def node_name(cell_id):
+        name = f"node.{cell_id}" if cell_id in regions else f"anon.{cell_id}"
+        if name == program.initial:
+            return 'initial'
+        if name == program.final:
+            return 'final'
+        return name
+
     for (region_id, region) in regions.items():
         row, column, length = region
         is_constraint = (grid[row][column] == '[')
@@ -813,9 +836,16 @@ def make_grid_program(grid):
         if isinstance(status, GridError):
             return status
 
+    owners = dict()
+    for (region_id, region) in regions.items():
+        row, column, length = region
+        if grid[row][column] != '[':
+            owners[region_id] = node_name(region_id)
+
     for (junction_id, junction) in junctions.items():
         row, column = junction
         program.nodes[f"anon.{junction_id}"] = None
+        owners[junction_id] = f"anon.{junction_id}"
 
     for (path_id, path) in paths.items():
         if len(path) < 2:
@@ -824,17 +854,10 @@ def make_grid_program(grid):
             return GridError(f"malformed path ({path_id})", None, None)
 
         fst, snd = tuple(path)
-        fst_name = f"node.{fst}" if fst in regions else f"anon.{fst}"
-        snd_name = f"node.{snd}" if snd in regions else f"anon.{snd}"
-        if fst_name == program.initial:
-            fst_name = 'initial'
-        if fst_name == program.final:
-            fst_name = 'final'
-        if snd_name == program.initial:
-            snd_name = 'initial'
-        if snd_name == program.final:
-            snd_name = 'final'
-        canonical = tuple(sorted((fst_name, snd_name)))
+        canonical = tuple(sorted((node_name(fst), node_name(snd))))
         program.edges.add(canonical)
+        owners[path_id] = canonical
 
+    program.grid   = grid
+    program.owners = [[owners.get(cell) for cell in row] for row in cells]
     return program
@@ -0,0 +1,294 @@
+"""Parametrized Conlog programs, for measuring how the strategies scale.
+
+Each generator builds a `TextProgram`, so that `program.graph()` gives the
+graph to search directly, and `program_text` the same program as a .clt
+file. The families grow along different axes of the search:
+
+    diode_chain      nodes and path length, with one variable per diode if asked
+    multiplication   path length, with the inputs (the gadgets of examples/multiplication.cla)
+    lcm_machine      variables, loops and path length (the gadgets of examples/next_lcm_machine.cla)
+    junction_grid    nodes and cycles, in a random planar grid of junctions
+    hub              branching, at two hubs of high degree
+
+`generated_workloads` lists a few sizes of each for `conlog.bench`, and
+`python -m conlog.generate FAMILY ARGS...` writes one out, e.g.
+
+    python -m conlog.generate junction_grid 12 12 --seed 3 > grid.clt
+"""
+
+import argparse
+import inspect
+import random
+import sys
+
+from conlog.frontends import Program, TextProgram
+
+
+def define(program: Program, name: str, lhs, op: str, rhs=None) -> str:
+    """Give node `name` the operation `lhs op rhs` (for prints, `op=lhs`)."""
+    program.nodes[name] = (lhs, op, rhs)
+    for operand in (lhs, rhs):
+        if isinstance(operand, str) and operand not in program.variables:
+            program.variables[operand] = None
+    return name
+
+
+def chain(program: Program, *names: str) -> None:
+    """Connect `names` in a path, declaring any new ones as junctions."""
+    for name in names:
+        program.nodes.setdefault(name, None)
+    for u, v in zip(names, names[1:]):
+        program.edges.add(tuple(sorted((u, v))))
+
+
+def diode(program: Program, prefix: str, start: str, end: str, e: str = 'e', d: str = 'd') -> None:
+    """A diode from `start` to `end`; traversed the other way, it leaves `d` positive."""
+    chain(
+        program,
+        start,
+        define(program, f"{prefix}a", e, '-=', 1),
+        define(program, f"{prefix}b", d, '++?', e),
+        define(program, f"{prefix}c", e, '+=', 1),
+        end,
+    )
+
+
+def gate(program: Program, prefix: str, start: str, end: str) -> None:
+    """A way between `start` and `end` that leaves every variable as it was
+    (the da/db gadget of examples/next_lcm_machine.cla)."""
+    chain(
+        program,
+        start,
+        define(program, f"{prefix}a", 'da', '-=', 1),
+        define(program, f"{prefix}b", 'db', '++?', 'da'),
+        define(program, f"{prefix}c", 'da', '+=', 1),
+        end,
+    )
+
+
+def diode_chain(n: int, distinct: bool = False) -> TextProgram:
+    """`n` diodes in a row from initial to final, sharing one pair of
+    variables, or each with its own if `distinct`."""
+    program = TextProgram()
+    junctions = ['initial', *(f"j{i}" for i in range(1, n)), 'final']
+    for i in range(n):
+        e, d = (f"e{i}", f"d{i}") if distinct else ('e', 'd')
+        diode(program, f"diode{i}", junctions[i], junctions[i + 1], e, d)
+        program.variables[e] = program.variables[d] = 0
+    return program
+
+
+def multiplication(a: int = 8, b: int = 7) -> TextProgram:
+    """Computes c = a × b, by subtracting a from c b times and then draining a."""
+    program = TextProgram()
+    chain(program, 'initial', 'loop', define(program, 'sub', 'c', '-=', 'a'), define(program, 'count', 'b', '-=', 1), 'next')
+    diode(program, 'back', 'next', 'loop', 'e0', 'd0')
+    diode(program, 'out', 'next', 'drain', 'e1', 'd1')
+    chain(program, 'drain', 'done', 'final')
+    chain(program, 'drain', define(program, 'dec', 'a', '-=', 1), 'done')
+    program.variables.update(a=a, b=b, c='free', d0=0, e0=0, d1=0, e1=0)
+    return program
+
+
+def lcm_machine(divisors: tuple[int, ...] = (3, 4, 6, 7, 12), at_least: int = 41) -> TextProgram:
+    """Computes x, the least common multiple of `divisors` no less than `at_least`.
+
+    x is saved in `dummy`; then for each divisor k, some multiple of k is
+    taken from x, x must be zero (checked through `db`) and, but for the
+    last divisor, is restored from `dummy`. Finally `at_least` and then ones
+    are taken from `dummy`.
+    """
+    program = TextProgram()
+    chain(program, 'initial', define(program, 'save', 'dummy', '+=', 'x'), 'stage0')
+    for i, k in enumerate(divisors):
+        chain(program, f"stage{i}", define(program, f"take{i}", 'x', '-=', k), f"taken{i}")
+        gate(program, f"again{i}_", f"stage{i}", f"taken{i}")
+        check = [
+            define(program, f"pos{i}", 'db', '++?', 'x'),
+            define(program, f"neg{i}", 'neg_x', '-=', 'x'),
+            define(program, f"negpos{i}", 'db', '++?', 'neg_x'),
+            define(program, f"unneg{i}", 'neg_x', '+=', 'x'),
+        ]
+        if i < len(divisors) - 1:  # x stays zero after the last
+            check.append(define(program, f"restore{i}", 'x', '+=', 'dummy'))
+        chain(program, f"taken{i}", *check, f"stage{i + 1}")
+    n = len(divisors)
+    chain(program, f"stage{n}", define(program, 'floor', 'dummy', '-=', at_least), 'count')
+    chain(program, 'count', define(program, 'drain', 'dummy', '-=', 1), 'counted')
+    gate(program, 'more', 'count', 'counted')
+    chain(program, 'counted', define(program, 'close', 'da', '-=', 1), 'final')
+    program.variables.update(x='free', dummy=0, neg_x=0, da=1, db=0)
+    return program
+
+
+def junction_grid(rows: int, columns: int, seed: int = 0, density: float = 0.3, variables: int = 2) -> TextProgram:
+    """A `rows` × `columns` grid from initial (top left) to final (bottom
+    right). A random spanning tree of the grid, plus each other edge with
+    probability `density`, connects the cells; a third of them are
+    junctions, and the rest add or take one from one of `variables`
+    variables. The initial values undo the path through the tree, so there
+    is always a solution.
+    """
+    rng = random.Random(seed)
+    program = TextProgram()
+    names = [f"v{i}" for i in range(variables)]
+
+    def cell(r, c):
+        return 'initial' if (r, c) == (0, 0) else 'final' if (r, c) == (rows - 1, columns - 1) else f"g{r}_{c}"
+
+    delta = {}  # Cell -> (variable, change)
+    for r in range(rows):
+        for c in range(columns):
+            if cell(r, c) in ('initial', 'final') or rng.random() < 1 / 3:
+                program.nodes.setdefault(cell(r, c), None)
+                continue
+            var, change = rng.choice(names), rng.choice((1, -1))
+            define(program, cell(r, c), var, '+=' if change > 0 else '-=', 1)
+            delta[r, c] = (var, change)
+
+    # Random spanning tree by depth-first search, then extra edges
+    parent = {(0, 0): None}
+    stack = [(0, 0)]
+    while stack:
+        r, c = stack[-1]
+        steps = [(r + dr, c + dc) for dr, dc in ((0, 1), (1, 0), (0, -1), (-1, 0))]
+        steps = [(nr, nc) for nr, nc in steps if 0 <= nr < rows and 0 <= nc < columns and (nr, nc) not in parent]
+        if not steps:
+            stack.pop()
+            continue
+        step = rng.choice(steps)
+        parent[step] = (r, c)
+        chain(program, cell(r, c), cell(*step))
+        stack.append(step)
+    for r in range(rows):
+        for c in range(columns):
+            for nr, nc in ((r, c + 1), (r + 1, c)):
+                if nr < rows and nc < columns and rng.random() < density:
+                    chain(program, cell(r, c), cell(nr, nc))
+
+    total = dict.fromkeys(names, 0)
+    at = (rows - 1, columns - 1)
+    while at is not None:
+        if at in delta:
+            var, change = delta[at]
+            total[var] += change
+        at = parent[at]
+    for var in names:
+        program.variables[var] = -total[var]
+    return program
+
+
+def hub(degree: int, target: int | None = None) -> TextProgram:
+    """Two hubs joined by `degree` spokes, the i-th taking i from x; x
+    starts at `target` (by default degree + 1, which takes three spokes)."""
+    program = TextProgram()
+    chain(program, 'initial', 'left')
+    chain(program, 'right', 'final')
+    for i in range(1, degree + 1):
+        chain(program, 'left', define(program, f"spoke{i}", 'x', '-=', i), 'right')
+    program.variables['x'] = degree + 1 if target is None else target
+    return program
+
+
+def program_text(program: Program) -> str:
+    """`program` as the statements of a .clt file: its edges as paths, one
+    per line, from initial first, with each node's operation written where it
+    first appears, and then its variables."""
+    order = {'initial': -1} | {name: i for i, name in enumerate(program.nodes) if name != 'initial'}
+    adjacent = {name: [] for name in program.nodes}
+    for u, v in program.edges:
+        adjacent[u].append(v)
+        adjacent[v].append(u)
+    for neighbors in adjacent.values():
+        neighbors.sort(key=order.__getitem__, reverse=True)  # Popped in order
+    written, used = set(), set()
+
+    def node(name):
+        operation = program.nodes[name]
+        if operation is None or name in written:
+            return name
+        written.add(name)
+        lhs, op, rhs = operation
+        if op in ('intpr', 'unipr'):
+            return f"{name}[{op}={lhs}]"
+        return f"{name}[{lhs}{op}{rhs}]"
+
+    lines = []
+    for start in sorted(adjacent, key=order.__getitem__):
+        while adjacent[start]:
+            path = [start]
+            while adjacent[path[-1]]:
+                step = adjacent[path[-1]].pop()
+                edge = tuple(sorted((path[-1], step)))
+                if edge not in used:
+                    used.add(edge)
+                    path.append(step)
+            if len(path) > 1:
+                lines.append('--'.join(map(node, path)) + ';')
+    for name in sorted(set(program.nodes) - written):
+        if program.nodes[name] is not None:
+            lines.append(node(name) + ';')  # Without edges
+    for name, value in program.variables.items():
+        if value is not None:
+            lines.append(f"{name}={'?' if value == 'free' else value};")
+    return '\n'.join(lines) + '\n'
+
+
+FAMILIES = {
+    'diode_chain': diode_chain,
+    'multiplication': multiplication,
+    'lcm_machine': lcm_machine,
+    'junction_grid': junction_grid,
+    'hub': hub,
+}
+
+
+def generated_workloads() -> list[tuple[str, str, int, TextProgram]]:
+    """(family, name, size, program) for a ladder of sizes of each family;
+    `conlog.bench` fits how each strategy scales with the size."""
+    workloads = []
+    for n in (10, 100, 1000):
+        workloads.append(('diode_chain', f"diode_chain({n})", n, diode_chain(n)))
+    for n in (10, 30, 100):
+        workloads.append(('diode_chain_distinct', f"diode_chain({n}, distinct=True)", n, diode_chain(n, distinct=True)))
+    for b in (10, 40, 160):
+        workloads.append(('multiplication', f"multiplication(5, {b})", b, multiplication(5, b)))
+    for divisors in ((3, 4), (3, 4, 6), (3, 4, 6, 8), (3, 4, 6, 8, 12)):
+        workloads.append(('lcm_machine', f"lcm_machine({divisors}, 20)", len(divisors), lcm_machine(divisors, 20)))
+    for n in (4, 6, 8):
+        workloads.append(('junction_grid', f"junction_grid({n}, {n})", n * n, junction_grid(n, n)))
+    for n in (4, 8, 16, 32):
+        workloads.append(('hub', f"hub({n})", n, hub(n)))
+    return workloads
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m conlog.generate', description='write a generated Conlog program as .clt text')
+    parser.add_argument('family', choices=sorted(FAMILIES), help='kind of program')
+    parser.add_argument('args', nargs='*', type=int, help='positional arguments of the generator, e.g. the size (for lcm_machine, the divisors and then at_least)')
+    parser.add_argument('--seed', type=int, default=None, help='random seed (junction_grid)')
+    parser.add_argument('-o', '--out', metavar='FILE', default=None, help='write to FILE instead of standard output')
+    args = parser.parse_args(argv)
+
+    generate = FAMILIES[args.family]
+    if args.family == 'lcm_machine' and args.args:
+        program = generate(tuple(args.args[:-1]), args.args[-1]) if len(args.args) > 1 else generate(tuple(args.args))
+    else:
+        kwargs = {'seed': args.seed} if args.seed is not None else {}
+        try:
+            inspect.signature(generate).bind(*args.args, **kwargs)
+        except TypeError as e:
+            parser.error(f"{args.family}: {e}")
+        program = generate(*args.args, **kwargs)
+
+    text = program_text(program)
+    if args.out is None:
+        sys.stdout.write(text)
+    else:
+        with open(args.out, 'w') as f:
+            f.write(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Hot spots of a search, for program authors.
+
+`heat_report` lists the nodes a search expanded most and the edges it
+stepped along most (see `SearchStats.node_expansions` and `edge_steps`).
+For grid programs, `render_heat` colors the diagram itself by the same
+counts, and writes the count of each node beside its row, so that the
+loops worth cutting short (with a diode, say) stand out.
+"""
+
+import math
+
+from conlog.frontends import GridProgram
+from conlog.stats import SearchStats
+
+HEAT_COLORS = (24, 31, 37, 71, 142, 178, 208, 196)  # 256-color palette, cold to hot
+
+
+def heat_color(count: int, hottest: int) -> int:
+    """The color of `count`, on a log scale up to `hottest`."""
+    if hottest <= 1:
+        return HEAT_COLORS[-1]
+    level = math.log1p(count) / math.log1p(hottest)
+    return HEAT_COLORS[min(len(HEAT_COLORS) - 1, int(level * len(HEAT_COLORS)))]
+
+
+def owner_count(stats: SearchStats, owner) -> int:
+    if isinstance(owner, tuple):
+        return stats.edge_steps.get(owner, 0)
+    return stats.node_expansions.get(owner, 0)
+
+
+def grid_labels(program: GridProgram) -> dict[str, str]:
+    """The text of each labelled node of the diagram, by node name."""
+    labels = {}
+    for row, owners in zip(program.grid, program.owners):
+        for column, owner in enumerate(owners):
+            if isinstance(owner, str) and owner not in labels and not owner.startswith('anon.'):
+                end = column
+                while end < len(owners) and owners[end] == owner:
+                    end += 1
+                labels[owner] = row[column + 1:end - 1].strip()
+    return labels
+
+
+def render_heat(program: GridProgram, stats: SearchStats) -> str:
+    """The diagram of `program`, each node and path colored by its count,
+    with the count of each labelled node at the end of its row."""
+    hottest = max([*stats.node_expansions.values(), *stats.edge_steps.values(), 0])
+    labels = grid_labels(program)
+    lines = []
+    for row, owners in zip(program.grid, program.owners):
+        runs, notes = [], []  # Runs of (style, text)
+        for column, (char, owner) in enumerate(zip(row, owners)):
+            count = 0 if owner is None else owner_count(stats, owner)
+            style = f"38;5;{heat_color(count, hottest)}" if count else "2"
+            if runs and runs[-1][0] == style:
+                runs[-1][1] += char
+            else:
+                runs.append([style, char])
+            if count and owner in labels and (column == 0 or owners[column - 1] != owner):
+                notes.append(f"{labels[owner]} \x1B[{style}m{count:,}\x1B[0m")
+        line = ''.join(f"\x1B[{style}m{text}\x1B[0m" for style, text in runs)
+        if notes:
+            line += "    " + "  ".join(notes)
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def heat_report(stats: SearchStats, top: int = 10, labels: dict[str, str] | None = None) -> str:
+    """The `top` nodes and edges by count, with their share of the total;
+    nodes are shown by their `labels` where given."""
+    labels = dict() if labels is None else labels
+
+    def show(name):
+        return labels.get(name, name)
+
+    lines = []
+    for title, counts in (("nodes", stats.node_expansions), ("edges", stats.edge_steps)):
+        total = sum(counts.values())
+        hottest = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:top]
+        if not hottest:
+            continue
+        lines.append(f"hottest {title}")
+        for key, count in hottest:
+            name = ' -- '.join(map(show, key)) if isinstance(key, tuple) else show(key)
+            lines.append(f"  {name:<32} {count:>14,}  {100 * count / total:5.1f}%")
+    return '\n'.join(lines)
@@ -10,6 +10,7 @@ from conlog.datatypes import (
     Node,
     Subtraction,
 )
+from conlog.trace import traced
 
 
 @dataclass(frozen=True)
@@ -47,6 +48,7 @@ def find_initial(g: nx.Graph) -> Initial:
     return find_initial_node(g).op  # type: ignore
 
 
+@traced
 def compute_monotone_variables(g: nx.Graph) -> tuple[set[str], set[str]]:
     """Identify whether each variable is monotone increasing, monotone decreasing, or neither."""
 
@@ -141,18 +143,29 @@ def compute_monotone_variables(g: nx.Graph) -> tuple[set[str], set[str]]:
                 else:
                     decrease_var(lhs)
 
+    # Whether each node reaches + or -, found for all variables at once by
+    # propagating over the strongly connected components in reverse order
+    condensed = nx.condensation(monotone_graph)
+    mapping = condensed.graph["mapping"]
+    reaches_pos: dict[int, bool] = {}
+    reaches_neg: dict[int, bool] = {}
+    for component in reversed(list(nx.topological_sort(condensed))):
+        successors = list(condensed.successors(component))
+        reaches_pos[component] = component == mapping[PositiveTerminal] or any(
+            reaches_pos[c] for c in successors
+        )
+        reaches_neg[component] = component == mapping[NegativeTerminal] or any(
+            reaches_neg[c] for c in successors
+        )
+
     monotone_increasing = set()
     monotone_decreasing = set()
 
     for var in vars:
-        dfs = nx.dfs_tree(monotone_graph, vars[var])
-
-        reaches_pos = PositiveTerminal in dfs.nodes
-        reaches_neg = NegativeTerminal in dfs.nodes
-
-        if not reaches_neg:
+        component = mapping[vars[var]]
+        if not reaches_neg[component]:
             monotone_increasing.add(var)
-        if not reaches_pos:
+        if not reaches_pos[component]:
             monotone_decreasing.add(var)
 
     return monotone_increasing, monotone_decreasing
@@ -1,17 +1,18 @@
 from __future__ import annotations
 from conlog.datatypes import (
-    Addition,
-    ConditionalDecrement,
-    ConditionalIncrement,
     Initial,
     Node,
-    Subtraction,
     Terminal,
 )
 from conlog.elegant import determine_variable_bounds_multipass
-from conlog.evaluator import evaluate
+from conlog.evaluator import FORWARD, REVERSE, evaluate, step
+from conlog.stats import ProgressHook, SearchBudget, SearchStats, SearchStatus, count_step, timed_search
+from conlog.trace import pause_layers, resume_layers, trace_layer, trace_span
+from collections import deque
 from dataclasses import dataclass
+from time import perf_counter
 import networkx as nx
+import sys
 
 @dataclass(frozen=True)
 class SearchState():
@@ -23,28 +24,13 @@ class SearchState():
 
 def compute_new_values_from_node(node, values, reverse=True):
     new_values = dict(values)
-
-    if isinstance(node.op, (Addition, Subtraction, ConditionalIncrement, ConditionalDecrement)):
-        if isinstance(node.op.rhs, int):
-            rhs = node.op.rhs
-        else:
-            rhs = new_values[node.op.rhs]
-
-        rvalue = (-1 if reverse else 1)
-        if isinstance(node.op, (Subtraction, ConditionalDecrement)):
-            rvalue *= -1
-        if isinstance(node.op, (Addition, Subtraction)):
-            rvalue *= rhs
-        if isinstance(node.op, (ConditionalIncrement, ConditionalDecrement)) and rhs <= 0:
-            rvalue = 0  # Do nothing if condition not satisfied
-
-        new_values[node.op.lhs] += rvalue
-
+    step(REVERSE if reverse else FORWARD, node.op, new_values, [])
     return new_values
 
 
-def compute_successor_states(current_state: SearchState, bounds : dict | None = None) -> list[SearchState]:
+def compute_successor_states(current_state: SearchState, bounds : dict | None = None, stats: SearchStats | None = None) -> list[SearchState]:
     bounds = dict() if bounds is None else bounds
+    stats = SearchStats() if stats is None else stats
 
     if isinstance(current_state.node.op, Terminal) and current_state.last_node is not None:
         return []  # Terminals terminate the search.
@@ -53,9 +39,11 @@ def compute_successor_states(current_state: SearchState, bounds : dict | None =
     successor_values = compute_new_values_from_node(current_state.node, current_state.values, reverse=True)
     if any(successor_values[var] < bounds[var][0] for var in bounds) or \
          any(successor_values[var] > bounds[var][1] for var in bounds):
+        stats.pruned_by_bounds += 1
         return []  # Search optimization: bounds violation
     for successor_node in current_state.graph.neighbors(current_state.node):
         if successor_node == current_state.last_node:
+            stats.pruned_by_backtracking += 1
             continue  # No backtracking allowed
         successor_states.append(SearchState(
             node=successor_node,
@@ -67,43 +55,144 @@ def compute_successor_states(current_state: SearchState, bounds : dict | None =
     return successor_states
 
 
-def solve_graph_bfs(graph: nx.Graph, limit = None):
+def solve_graph_bfs(
+    graph: nx.Graph,
+    limit = None,
+    stats: SearchStats | None = None,
+    progress: ProgressHook | None = None,
+    budget: SearchBudget | None = None,
+):
+    """Yield the solutions of `graph`; `stats`, if given, is filled in as the search goes."""
+    stats = SearchStats() if stats is None else stats
+    return timed_search(_solve_graph_bfs(graph, limit, stats, progress, budget), stats)
+
+
+def _solve_graph_bfs(graph: nx.Graph, limit, stats: SearchStats, progress: ProgressHook | None, budget: SearchBudget | None):
     if limit is None:
         limit = 65536
-
-    bounds = determine_variable_bounds_multipass(graph)
-
-    # Get key nodes and variables
-    initial_node = next(node for node in graph.nodes if isinstance(node.op, Initial))
-    terminal_node = next(node for node in graph.nodes if isinstance(node.op, Terminal))
-    free, fixed = initial_node.op.free, dict(initial_node.op.fixed)
-    var_names = list(free) + list(fixed)
-
-    # Run a BFS search
-    queue = [[SearchState(
-        node=terminal_node,
-        last_node=None,
-        values={n: 0 for n in var_names},
-        graph=graph,
-    ), None]]
-    it = 0
-    while len(queue) > 0 and it < limit:
-        it += 1
-        current_state, history = queue.pop(0)
-        if current_state.node == initial_node and all(current_state.values[n] == fixed[n] for n in fixed):
-            history_traverser = history
-            final_path = [current_state]
-            while history_traverser is not None:
-                head, history_traverser = history_traverser
-                final_path.append(head)
-
-            # One last check: try evaluator on search result.
-            solution = evaluate([cs.node for cs in final_path], current_state.values)
-
-            if solution is None:
-                raise Exception('BFS solver thought an invalid solution was valid')
-
-            yield solution
-
-        for successor_state in compute_successor_states(current_state, bounds=bounds):
-            queue.append([successor_state, [current_state, history]])
+    yield from BreadthFirstSearch(graph, stats).run(limit, progress, budget)
+
+
+class BreadthFirstSearch:
+    """The search of `solve_graph_bfs`, kept resumable: its queue lives on
+    between calls of `run`, each of which carries on where the last stopped.
+    Strategy c keeps one to search on past the int64 range (see
+    `solver_c.WideSearch`).
+
+    Each seed is a (values, path) pair: the values of a state of the
+    backwards search, by variable name, and the nodes from that state back
+    to the Terminal. The values may be any Python ints. Without seeds the
+    search starts from the Terminal.
+    """
+
+    def __init__(self, graph: nx.Graph, stats: SearchStats, seeds = None, trace_layers: bool = True) -> None:
+        self.graph = graph
+        self.stats = stats
+        self.trace_layers = trace_layers  # Off when the search runs between the layers of another
+        self.bounds = None  # Determined by the first run, under its budget
+
+        # Get key nodes and variables
+        self.initial_node = next(node for node in graph.nodes if isinstance(node.op, Initial))
+        self.terminal_node = next(node for node in graph.nodes if isinstance(node.op, Terminal))
+        self.fixed = dict(self.initial_node.op.fixed)
+        self.var_names = list(self.initial_node.op.free) + list(self.fixed)
+
+        self.queue = deque()  # [state, history, depth]; history holds the path back as nested [state, history] pairs
+        self.iterations = 0
+        self.layer = 0  # Depth of the states being popped
+        if seeds is None:
+            seeds = [({n: 0 for n in self.var_names}, [self.terminal_node])]
+        self.add_seeds(seeds)
+
+    def add_seeds(self, seeds) -> None:
+        """Queue more states to search from; they should be no shallower than those queued."""
+        for values, path in seeds:
+            history = None
+            for node in reversed(path[1:]):
+                history = [SearchState(node=node, last_node=None, values={}, graph=self.graph), history]
+            self.queue.append([SearchState(
+                node=path[0],
+                last_node=path[1] if len(path) > 1 else None,
+                values=values,
+                graph=self.graph,
+            ), history, len(path) - 1])
+
+    def paths(self):
+        """The (values, path) of each queued state, as seeds for another search."""
+        for state, history, _ in self.queue:
+            path = [state.node]
+            while history is not None:
+                head, history = history
+                path.append(head.node)
+            yield state.values, path
+
+    def run(self, limit, progress: ProgressHook | None = None, budget: SearchBudget | None = None, depth = None):
+        """Yield the solutions found until `limit` iterations in all, or the
+        queue runs out; given `depth`, also stop before popping a deeper
+        state, leaving the status RUNNING."""
+        stats = self.stats
+        if self.bounds is None:
+            start = perf_counter()
+            self.bounds = determine_variable_bounds_multipass(self.graph, budget)
+            stats.preprocessing_time += perf_counter() - start
+
+        # Run a BFS search
+        queue = self.queue
+        while len(queue) > 0 and self.iterations < limit:
+            current_state, history, current_depth = queue[0]
+            if depth is not None and current_depth > depth:
+                stats.status = SearchStatus.RUNNING
+                return
+            if self.trace_layers and current_depth > self.layer:
+                self.layer = current_depth
+                trace_layer(current_depth, self.iterations, len(queue))
+            queue.popleft()
+            self.iterations += 1
+            stats.states_expanded += 1
+            stats.node_expansions[current_state.node.name] = stats.node_expansions.get(current_state.node.name, 0) + 1
+
+            solution = None
+            if current_state.node == self.initial_node and all(current_state.values[n] == self.fixed[n] for n in self.fixed):
+                history_traverser = history
+                final_path = [current_state]
+                while history_traverser is not None:
+                    head, history_traverser = history_traverser
+                    final_path.append(head)
+
+                # One last check: try evaluator on search result.
+                start = perf_counter()
+                with trace_span("verify"):
+                    solution = evaluate([cs.node for cs in final_path], current_state.values)
+                stats.verification_time += perf_counter() - start
+
+                if solution is None:
+                    raise Exception('BFS solver thought an invalid solution was valid')
+
+            # Queued before the solution is yielded, so stopping there loses nothing
+            successor_states = compute_successor_states(current_state, bounds=self.bounds, stats=stats)
+            if successor_states:
+                stats.bytes_allocated += sys.getsizeof(successor_states[0].values)  # Shared by the successors
+            for successor_state in successor_states:
+                entry = [successor_state, [current_state, history], current_depth + 1]
+                stats.bytes_allocated += sys.getsizeof(successor_state) + 2 * sys.getsizeof(entry)
+                queue.append(entry)
+                count_step(stats, current_state.node.name, successor_state.node.name)
+            stats.queue_high_water = max(stats.queue_high_water, len(queue))
+
+            if solution is not None:
+                if self.trace_layers:
+                    pause_layers()
+                yield solution
+                if self.trace_layers:
+                    resume_layers()
+
+            if progress is not None and progress.due(self.iterations):
+                if progress.report(self.iterations, current_depth, len(queue)):
+                    stats.status = SearchStatus.CANCELLED
+                    return
+
+            if budget is not None and (exceeded := budget.exceeded(stats.bytes_allocated)) is not None:
+                stats.status = exceeded
+                return
+
+        stats.status = SearchStatus.LIMIT_REACHED if queue else SearchStatus.EXHAUSTED
@@ -3,31 +3,27 @@ from numpy cimport uint64_t, int64_t, uint8_t
 # from cython.cimports.libc.stdlib cimport malloc, free
 cimport cython
 
-from enum import Enum, auto
 import numpy as np
-from conlog.datatypes import Initial, Terminal
-from conlog.elegant import determine_variable_bounds_multipass
-from conlog.evaluator import evaluate
-
-
-
-def func(t):
-    return 0
-
-
-class NodeTypePython(Enum):
-    Initial = 1
-    Terminal = 2
-    Addition = 3
-    IntegerPrint = 4
-    UnicodePrint = 5
-    Subtraction = 6
-    ConditionalIncrement = 7
-    ConditionalDecrement = 8
-    NoneType = 9
+from dataclasses import replace
+from time import perf_counter
+from conlog.checkpoint import (
+    CheckpointError,
+    commit_checkpoint,
+    program_digest,
+    read_checkpoint_header,
+    temporary_path,
+    write_checkpoint_header,
+)
+from conlog.datatypes import PackedSolution
+from conlog.solver_c import SOLUTION_BATCH, WideSearch, count_solutions, solution_records, step_edges, workspace_arrays
+from conlog.stats import ProgressHook, SearchStats, SearchStatus, edge_histogram, node_histogram
+from conlog.trace import current_trace, pause_layers, resume_layers, trace_layer, trace_span
 
 
 cdef extern from "solver_c_fast.c":
+    ctypedef int (*ProgressCallback)(void *, uint64_t, uint64_t, uint64_t)
+    ctypedef void (*LayerCallback)(void *, uint64_t, uint64_t, uint64_t)
+
     void * init_search_workspace_lowlevel(
         uint64_t num_fixed_values,
         uint64_t num_free_values,
@@ -39,125 +35,474 @@ cdef extern from "solver_c_fast.c":
         uint8_t * node_rhs_is_constant_arr,
         int64_t * node_rhs_arr,
 
-        uint8_t* adjacency_matrix,
+        uint64_t * neighbor_offsets,
+        uint64_t * neighbors,
         uint64_t limit,
         int64_t * lower_bounds,
         int64_t * upper_bounds,
+        uint64_t * edge_bound_offsets,
+        uint64_t * edge_bound_vars,
+        int64_t * edge_bound_lower,
+        int64_t * edge_bound_upper,
     )
 
-    int64_t * get_next_solution_lowlevel(void * the_workspace_ptr)
+    uint64_t get_next_solutions_lowlevel(void * the_workspace_ptr, int64_t * buffer, uint64_t buffer_len, uint64_t max_solutions, uint64_t * needed)
 
+    void set_search_limit_lowlevel(void * the_workspace_ptr, uint64_t limit)
 
-def solve_graph_bfs_c(graph, limit):
-    # Some Python preprocessing
-
-    initial_node = next(node for node in graph.nodes if isinstance(node.op, Initial))
-    terminal_node = next(node for node in graph.nodes if isinstance(node.op, Terminal))
-    free_vars, fixed_vars = initial_node.op.free, dict(initial_node.op.fixed)
-
-    # VERY IMPORTANT THAT ALL FIXED COME FIRST!
-    var_names = list(fixed_vars) + list(free_vars)
-
-    num_fixed_values = len(fixed_vars)
-    num_free_values = len(free_vars)
-    num_values = num_fixed_values + num_free_values
-    fixed_values = list(fixed_vars.values())
-
-    nodes = list(graph.nodes)
-    nodes = sorted(nodes, key=str)
-
-    num_nodes = len(nodes)
-    node_type_arr = [getattr(NodeTypePython, type(node.op).__name__).value for node in nodes]
-
-    node_lhs_arr = [var_names.index(node.op.lhs) if node.op and hasattr(node.op, 'lhs') else 0 for node in nodes]
-    node_rhs_is_constant_arr = [int(isinstance(node.op.rhs, int)) if (node.op and hasattr(node.op, 'lhs')) else 0 for node in nodes]
-    node_rhs_arr = [(node.op.rhs if isinstance(node.op.rhs, int) else var_names.index(node.op.rhs))  if (node.op and hasattr(node.op, 'lhs')) else 0 for node in nodes]
-
-    adjacency_matrix = [int(graph.has_edge(nodes[i], nodes[j])) for i in range(len(nodes)) for j in range(len(nodes))]
-
-    # Get lowest signed int64:
-    LOWEST, HIGHEST = -2**63, 2**63 - 1
-
-    bounds = {k: [LOWEST, HIGHEST] for k in var_names}
-    bounds.update(determine_variable_bounds_multipass(graph))
-
-    lower_bounds = [int(bounds[var][0]) if bounds[var][0] > float('-inf') else LOWEST for var in var_names]
-    upper_bounds = [int(bounds[var][1]) if bounds[var][1] < float('inf') else HIGHEST for var in var_names]
-
-    assert var_names[0] == list(fixed_vars)[0]
-
-    cdef void * the_workspace = NULL
-
-    fixed_values = np.ascontiguousarray(np.array(fixed_values, dtype=np.int64))
-    node_type_arr = np.ascontiguousarray(np.array(node_type_arr, dtype=np.uint8))
-    node_lhs_arr = np.ascontiguousarray(np.array(node_lhs_arr, dtype=np.int64))
-    node_rhs_is_constant_arr = np.ascontiguousarray(np.array(node_rhs_is_constant_arr, dtype=np.uint8))
-    node_rhs_arr = np.ascontiguousarray(np.array(node_rhs_arr, dtype=np.int64))
-    adjacency_matrix = np.ascontiguousarray(np.array(adjacency_matrix, dtype=np.uint8))
-    lower_bounds = np.ascontiguousarray(np.array(lower_bounds, dtype=np.int64))
-    upper_bounds = np.ascontiguousarray(np.array(upper_bounds, dtype=np.int64))
-
-    # Make memoryviews (mvs)
-    cdef int64_t[::1] fixed_values_mv = fixed_values
-    cdef uint8_t[::1] node_type_arr_mv = node_type_arr
-    cdef int64_t[::1] node_lhs_arr_mv = node_lhs_arr
-    cdef uint8_t[::1] node_rhs_is_constant_arr_mv = node_rhs_is_constant_arr
-    cdef int64_t[::1] node_rhs_arr_mv = node_rhs_arr
-    cdef uint8_t[::1] adjacency_matrix_mv = adjacency_matrix
-    cdef int64_t[::1] lower_bounds_mv = lower_bounds
-    cdef int64_t[::1] upper_bounds_mv = upper_bounds
-
-    cdef uint64_t num_fixed_values_ctype = np.uint64(num_fixed_values)
-    cdef uint64_t num_free_values_ctype = np.uint64(num_free_values)
-    cdef uint64_t num_nodes_ctype = np.uint64(num_nodes)
-    cdef uint64_t limit_ctype = np.uint64(limit)
-
-    the_workspace = init_search_workspace_lowlevel(
-        num_fixed_values_ctype,
-        num_free_values_ctype,
-        &fixed_values_mv[0],
-        num_nodes_ctype,
-        &node_type_arr_mv[0],
-        &node_lhs_arr_mv[0],
-        &node_rhs_is_constant_arr_mv[0],
-        &node_rhs_arr_mv[0],
-        &adjacency_matrix_mv[0],
-        limit_ctype,
-        &lower_bounds_mv[0],
-        &upper_bounds_mv[0],
-    )
+    uint64_t get_search_iterations_lowlevel(void * the_workspace_ptr)
+
+    int64_t get_search_depth_lowlevel(void * the_workspace_ptr)
+
+    int enable_spill_lowlevel(void * the_workspace_ptr, const char * spill_dir, uint8_t dedup_layers)
+
+    int enable_dedup_lowlevel(void * the_workspace_ptr)
+
+    int enable_approximate_dedup_lowlevel(void * the_workspace_ptr, uint64_t mem_bytes)
+
+    double get_false_positive_rate_lowlevel(void * the_workspace_ptr)
+
+    void get_dedup_filter_lowlevel(void * the_workspace_ptr, double rate, uint64_t * capacity, uint64_t * num_hashes)
+
+    uint64_t get_overflowed_states_lowlevel(void * the_workspace_ptr)
+
+    uint64_t get_overflowed_state_lowlevel(void * the_workspace_ptr, uint64_t i, int64_t * values, int64_t * path, uint64_t path_len)
+
+    void get_search_stats_lowlevel(void * the_workspace_ptr, uint64_t * counters, uint64_t * node_expansions, uint64_t * edge_steps)
+
+    uint8_t get_search_status_lowlevel(void * the_workspace_ptr)
 
-    if the_workspace == NULL:
-        print ("Received NULL the_workspace from init")
-        return
+    void cancel_search_lowlevel(void * the_workspace_ptr)
 
-    cdef int64_t * ans
+    void set_progress_callback_lowlevel(void * the_workspace_ptr, ProgressCallback callback, void * context, uint64_t every, uint64_t every_ns)
 
-    while True:
-        ans = get_next_solution_lowlevel(the_workspace)  # TODO: Something with the weird array format
-        ans_len = ans[0]
-        if ans_len == -1:
-            # free(ans)   # TODO free ans
-            break
+    void set_search_budget_lowlevel(void * the_workspace_ptr, uint64_t timeout_ns, uint64_t max_bytes)
 
-        final_values = np.zeros((num_values,), dtype=np.int64)
-        for i in range(num_values):
-            final_values[i] = ans[1 + i]
+    void set_layer_callback_lowlevel(void * the_workspace_ptr, LayerCallback callback, void * context)
 
-        final_path = np.zeros((ans_len,), dtype=np.int64)
-        for i in range(ans_len):
-            final_path[i] = ans[1 + num_values + i]
+    int save_search_workspace_lowlevel(void * the_workspace_ptr, const char * path)
 
-        final_values = dict(zip(var_names, final_values))
+    int load_search_workspace_lowlevel(void * the_workspace_ptr, const char * path, uint64_t offset)
 
-        # Turn answer into a proper solution
-        solution = evaluate([nodes[i] for i in final_path], final_values)
+    void free_search_workspace_lowlevel(void * the_workspace_ptr)
 
-        if solution is None:
-            raise Exception('BFS solver thought an invalid solution was valid')
+    uint64_t verify_solutions_lowlevel(void * the_workspace_ptr, const int64_t * packed, uint64_t count)
 
-        # Free the malloced array
-        # free(ans)   # TODO free ans
+    uint64_t solution_stdout_lowlevel(void * the_workspace_ptr, const int64_t * record, int64_t * prints, uint64_t prints_len)
 
-        yield solution
 
+# Kinds of stdout entries from solution_stdout_lowlevel
+PRINT_INTEGER, PRINT_CHARACTER = 0, 1
+
+
+# Get highest unsigned int64; an unbounded limit
+UNLIMITED = 2**64 - 1
+
+
+def c_limit(limit):
+    if limit is None or limit == float('inf'):
+        return UNLIMITED
+    return int(limit)
+
+
+cdef int report_progress(void * context, uint64_t iterations, uint64_t depth, uint64_t frontier) noexcept with gil:
+    # The engine's progress callback; `context` is the CSearch
+    search = <CSearch> context
+    try:
+        return 1 if search.progress.report(iterations, depth, frontier) else 0
+    except BaseException as e:
+        search.progress_error = e  # Raised again once the engine has returned
+        return 1
+
+
+cdef void report_layer(void * context, uint64_t layer, uint64_t iterations, uint64_t states) noexcept with gil:
+    # The engine's layer callback, set while a trace is active
+    trace_layer(layer, iterations, states)
+
+
+cdef class CSearch:
+    """A live C search workspace.
+
+    The workspace keeps its frontier between calls, so raising the limit
+    with `set_limit` and iterating `solutions` again resumes the search
+    where it stopped instead of starting over.
+
+    With `spill_dir`, state values are kept in an mmap'd file there instead
+    of on the heap; `dedup_layers` then also drops duplicate states from
+    each BFS layer. With `dedup`, no state is ever enqueued twice; states
+    are keyed by (node, last node, values), bit-packed when the bounds allow.
+    `dedup_mem` (bytes) does the same with a Bloom filter of that size; a
+    few unexplored states get pruned as duplicates, so running out of states
+    ends it with status INCOMPLETE, not EXHAUSTED (see `false_positive_rate`).
+
+    Solutions are checked by re-running them forwards in C; with `verify`
+    false the engine is trusted and that check is skipped. `budget`, as in
+    `set_budget`, also covers the preprocessing (see `make_search_c`).
+    """
+
+    cdef void * the_workspace
+    cdef readonly object nodes
+    cdef readonly object steps  # The edge of each step, as sorted node names; see solver_c.step_edges
+    cdef readonly object var_names
+    cdef readonly object limit
+    cdef readonly bytes digest
+    cdef object leftover  # Solutions fetched in a batch but not yielded yet
+    cdef object timings  # A SearchStats holding just the times; see `stats`
+    cdef readonly object progress  # A ProgressHook, or None; see `set_progress`
+    cdef object progress_error  # Raised by the progress hook during the last engine call
+    cdef object budget  # A SearchBudget, or None; see `set_budget`
+    cdef readonly object wide  # Continues past the int64 range; see solver_c.WideSearch
+    cdef public bint verify
+
+    def __cinit__(self):
+        self.the_workspace = NULL
+        self.leftover = iter(())
+        self.timings = SearchStats()
+
+    def __init__(self, graph, limit=None, spill_dir=None, dedup_layers=False, dedup=False, dedup_mem=None, verify=True, budget=None):
+        start = perf_counter()
+
+        # Some Python preprocessing
+        arrays = workspace_arrays(graph, budget)
+        nodes, var_names = arrays.nodes, arrays.var_names
+
+        num_fixed_values = len(arrays.fixed_values)
+        num_free_values = len(var_names) - num_fixed_values
+
+        # One spare entry each, so a graph without edges or variables still has an element to point at
+        fixed_values = np.ascontiguousarray(np.append(arrays.fixed_values, 0), dtype=np.int64)
+        node_type_arr = np.ascontiguousarray(arrays.opcodes, dtype=np.uint8)
+        node_lhs_arr = np.ascontiguousarray(arrays.lhs, dtype=np.int64)
+        node_rhs_is_constant_arr = np.ascontiguousarray(arrays.rhs_is_constant, dtype=np.uint8)
+        node_rhs_arr = np.ascontiguousarray(arrays.rhs, dtype=np.int64)
+        neighbor_offsets = np.ascontiguousarray(arrays.neighbor_offsets, dtype=np.uint64)
+        neighbors = np.ascontiguousarray(np.append(arrays.neighbors, 0), dtype=np.uint64)
+        lower_bounds = np.ascontiguousarray(np.append(arrays.lower_bounds, 0), dtype=np.int64)
+        upper_bounds = np.ascontiguousarray(np.append(arrays.upper_bounds, 0), dtype=np.int64)
+        edge_bound_offsets = np.ascontiguousarray(arrays.edge_bound_offsets, dtype=np.uint64)
+        edge_bound_vars = np.ascontiguousarray(np.append(arrays.edge_bound_vars, 0), dtype=np.uint64)
+        edge_bound_lower = np.ascontiguousarray(np.append(arrays.edge_bound_lower, 0), dtype=np.int64)
+        edge_bound_upper = np.ascontiguousarray(np.append(arrays.edge_bound_upper, 0), dtype=np.int64)
+
+        # Make memoryviews (mvs)
+        cdef int64_t[::1] fixed_values_mv = fixed_values
+        cdef uint8_t[::1] node_type_arr_mv = node_type_arr
+        cdef int64_t[::1] node_lhs_arr_mv = node_lhs_arr
+        cdef uint8_t[::1] node_rhs_is_constant_arr_mv = node_rhs_is_constant_arr
+        cdef int64_t[::1] node_rhs_arr_mv = node_rhs_arr
+        cdef uint64_t[::1] neighbor_offsets_mv = neighbor_offsets
+        cdef uint64_t[::1] neighbors_mv = neighbors
+        cdef int64_t[::1] lower_bounds_mv = lower_bounds
+        cdef int64_t[::1] upper_bounds_mv = upper_bounds
+        cdef uint64_t[::1] edge_bound_offsets_mv = edge_bound_offsets
+        cdef uint64_t[::1] edge_bound_vars_mv = edge_bound_vars
+        cdef int64_t[::1] edge_bound_lower_mv = edge_bound_lower
+        cdef int64_t[::1] edge_bound_upper_mv = edge_bound_upper
+
+        cdef uint64_t num_fixed_values_ctype = np.uint64(num_fixed_values)
+        cdef uint64_t num_free_values_ctype = np.uint64(num_free_values)
+        cdef uint64_t num_nodes_ctype = np.uint64(len(nodes))
+        cdef uint64_t limit_ctype = c_limit(limit)
+
+        with trace_span("init_search_workspace_lowlevel"):
+            self.the_workspace = init_search_workspace_lowlevel(
+                num_fixed_values_ctype,
+                num_free_values_ctype,
+                &fixed_values_mv[0],
+                num_nodes_ctype,
+                &node_type_arr_mv[0],
+                &node_lhs_arr_mv[0],
+                &node_rhs_is_constant_arr_mv[0],
+                &node_rhs_arr_mv[0],
+                &neighbor_offsets_mv[0],
+                &neighbors_mv[0],
+                limit_ctype,
+                &lower_bounds_mv[0],
+                &upper_bounds_mv[0],
+                &edge_bound_offsets_mv[0],
+                &edge_bound_vars_mv[0],
+                &edge_bound_lower_mv[0],
+                &edge_bound_upper_mv[0],
+            )
+
+        self.nodes = nodes
+        self.steps = step_edges(arrays)
+        self.var_names = var_names
+        self.limit = limit
+        self.verify = verify
+        self.digest = program_digest(nodes, var_names, graph)
+        self.wide = WideSearch(graph, nodes)
+
+        if self.the_workspace == NULL:
+            print ("Received NULL the_workspace from init")
+        elif spill_dir is not None:
+            if enable_spill_lowlevel(self.the_workspace, spill_dir.encode(), dedup_layers) != 0:
+                raise OSError(f"{spill_dir}: unable to create spill file")
+        if self.the_workspace != NULL and dedup:
+            if enable_dedup_lowlevel(self.the_workspace) != 0:
+                raise MemoryError("unable to allocate the visited set")
+        elif self.the_workspace != NULL and dedup_mem is not None:
+            if enable_approximate_dedup_lowlevel(self.the_workspace, dedup_mem) != 0:
+                raise MemoryError(f"unable to map a {dedup_mem} byte dedup filter")
+        self.timings.preprocessing_time += perf_counter() - start
+        self.set_budget(budget)
+
+    def __dealloc__(self):
+        if self.the_workspace != NULL:
+            free_search_workspace_lowlevel(self.the_workspace)
+
+    @property
+    def iterations(self):
+        if self.the_workspace == NULL:
+            return 0
+        return get_search_iterations_lowlevel(self.the_workspace) + self.wide.iterations
+
+    @property
+    def false_positive_rate(self):
+        """Chance that approximate dedup wrongly prunes the next new state."""
+        if self.the_workspace == NULL:
+            return 0.0
+        return get_false_positive_rate_lowlevel(self.the_workspace)
+
+    def dedup_filter(self, rate=0.01):
+        """The size of the approximate dedup filter, or None without one.
+
+        A (capacity, num_hashes) pair: the states it holds before its
+        false-positive rate reaches `rate`, and the bits each state sets.
+        """
+        cdef uint64_t capacity = 0
+        cdef uint64_t num_hashes = 0
+        if self.the_workspace == NULL:
+            return None
+        get_dedup_filter_lowlevel(self.the_workspace, rate, &capacity, &num_hashes)
+        return (capacity, num_hashes) if num_hashes else None
+
+    @property
+    def overflowed(self):
+        """States the engine set aside because a value left the int64 range; see `WideSearch`."""
+        if self.the_workspace == NULL:
+            return 0
+        return get_overflowed_states_lowlevel(self.the_workspace)
+
+    def overflowed_states(self, start=0):
+        """Those states from the `start`-th on, as `solver.BreadthFirstSearch` seeds."""
+        cdef int64_t[::1] values_mv
+        cdef int64_t[::1] path_mv
+        num_values = len(self.var_names)
+        values = np.zeros((num_values + 1,), dtype=np.int64)
+        path = np.zeros((64,), dtype=np.int64)
+        seeds = []
+        for i in range(start, self.overflowed):
+            values_mv = values
+            path_mv = path
+            length = get_overflowed_state_lowlevel(self.the_workspace, i, &values_mv[0], &path_mv[0], len(path))
+            if length > len(path):
+                path = np.zeros((length,), dtype=np.int64)
+                path_mv = path
+                get_overflowed_state_lowlevel(self.the_workspace, i, &values_mv[0], &path_mv[0], length)
+            seeds.append((dict(zip(self.var_names, values[:num_values].tolist())), [self.nodes[j] for j in path[:length].tolist()]))
+        return seeds
+
+    @property
+    def stats(self):
+        """A `SearchStats` snapshot of the search so far."""
+        if self.the_workspace == NULL:
+            return replace(self.timings)
+
+        counters = np.zeros((5,), dtype=np.uint64)
+        histogram = np.zeros((len(self.nodes) + 1,), dtype=np.uint64)
+        steps = np.zeros((len(self.steps) + 1,), dtype=np.uint64)
+        cdef uint64_t[::1] counters_mv = counters
+        cdef uint64_t[::1] histogram_mv = histogram
+        cdef uint64_t[::1] steps_mv = steps
+        get_search_stats_lowlevel(self.the_workspace, &counters_mv[0], &histogram_mv[0], &steps_mv[0])
+
+        expanded, pruned_by_bounds, pruned_by_backtracking, high_water, allocated = counters.tolist()
+        return self.wide.add_to(replace(
+            self.timings,
+            states_expanded=expanded,
+            pruned_by_bounds=pruned_by_bounds,
+            pruned_by_backtracking=pruned_by_backtracking,
+            queue_high_water=high_water,
+            bytes_allocated=allocated,
+            node_expansions=node_histogram(self.nodes, histogram),
+            edge_steps=edge_histogram(self.steps, steps),
+            status=SearchStatus(get_search_status_lowlevel(self.the_workspace)),
+        ))
+
+    @property
+    def status(self):
+        """Why the search last stopped, a `SearchStatus`."""
+        if self.the_workspace == NULL:
+            return SearchStatus.EXHAUSTED
+        return self.wide.status(SearchStatus(get_search_status_lowlevel(self.the_workspace)))
+
+    @property
+    def limit_reached(self):
+        """Whether the last search stopped at the limit (so raising it may help)."""
+        return self.status == SearchStatus.LIMIT_REACHED
+
+    def set_progress(self, progress):
+        """Report progress to `progress`, a `ProgressHook`, while searching; None stops reporting."""
+        self.progress = progress
+        if self.the_workspace == NULL:
+            return
+        if progress is None:
+            set_progress_callback_lowlevel(self.the_workspace, NULL, NULL, 0, 0)
+        else:
+            set_progress_callback_lowlevel(
+                self.the_workspace,
+                report_progress,
+                <void *> self,
+                progress.every or 0,
+                int(progress.every_ms * 1_000_000) if progress.every_ms else 0,
+            )
+
+    def set_budget(self, budget):
+        """Stop searching when `budget`, a `SearchBudget`, runs out; None removes it."""
+        self.budget = budget
+        if self.the_workspace == NULL:
+            return
+        if budget is None:
+            set_search_budget_lowlevel(self.the_workspace, 0, 0)
+            return
+        remaining = budget.remaining()
+        set_search_budget_lowlevel(
+            self.the_workspace,
+            0 if remaining is None else max(1, int(remaining * 1_000_000_000)),  # 0 would mean no deadline
+            0 if budget.max_memory is None else max(1, budget.max_memory),
+        )
+
+    def set_limit(self, limit):
+        self.limit = limit
+        if self.the_workspace != NULL:
+            set_search_limit_lowlevel(self.the_workspace, c_limit(limit))
+
+    def save(self, path):
+        """Write a checkpoint of the search to `path`."""
+        tmp = temporary_path(path)
+        with open(tmp, 'wb') as f:
+            write_checkpoint_header(f, self.digest, self.wide.dump())
+        if save_search_workspace_lowlevel(self.the_workspace, tmp.encode()) != 0:
+            raise CheckpointError(f"{path}: failed to write checkpoint")
+        commit_checkpoint(path)
+
+    def load(self, path):
+        """Continue from a checkpoint of a search over the same program."""
+        offset, wide = read_checkpoint_header(path, self.digest)
+        self.leftover = iter(())
+        self.wide = WideSearch(self.wide.bfs.graph, self.nodes)
+        self.wide.restore(wide)
+        if load_search_workspace_lowlevel(self.the_workspace, path.encode(), offset) != 0:
+            raise CheckpointError(f"{path}: corrupt checkpoint")
+
+    def next_solutions(self, max_solutions=SOLUTION_BATCH):
+        """Search for up to `max_solutions` more solutions in one call.
+
+        Returns a new int64 array the caller owns, packed as in
+        `get_next_solutions_lowlevel` (see `unpack_solutions`); the engine
+        writes straight into it. Empty when the search has stopped.
+        """
+        cdef uint64_t needed = 0
+        cdef uint64_t count
+        cdef int64_t[::1] view
+
+        if self.the_workspace == NULL:
+            return np.zeros((0,), dtype=np.int64)
+
+        if current_trace() is not None:
+            set_layer_callback_lowlevel(self.the_workspace, report_layer, NULL)
+        else:
+            set_layer_callback_lowlevel(self.the_workspace, NULL, NULL)
+
+        start = perf_counter()
+        record_len = 1 + len(self.var_names) + 64
+        packed = np.empty((max_solutions * record_len,), dtype=np.int64)
+        resume_layers()
+        try:
+            with trace_span("search", iterations=self.iterations):
+                while True:
+                    view = packed
+                    count = get_next_solutions_lowlevel(self.the_workspace, &view[0], len(packed), max_solutions, &needed)
+                    if needed == 0:
+                        break
+                    # Not even one solution fit; it is kept for the retry
+                    packed = np.empty((max(needed, 2 * len(packed)),), dtype=np.int64)
+        finally:
+            pause_layers()
+            self.timings.search_time += perf_counter() - start
+
+        if self.progress_error is not None:
+            error, self.progress_error = self.progress_error, None
+            raise error
+
+        used = 0
+        for _ in range(count):
+            used += 1 + len(self.var_names) + packed[used]
+        return packed[:used]
+
+    def record_stdout(self, int64_t[::1] record):
+        """The stdout of a packed solution record, computed in C."""
+        cdef int64_t[:, ::1] prints = np.empty((16, 2), dtype=np.int64)
+        cdef uint64_t num_prints = solution_stdout_lowlevel(self.the_workspace, &record[0], &prints[0, 0], 16)
+        if num_prints > 16:
+            prints = np.empty((num_prints, 2), dtype=np.int64)
+            solution_stdout_lowlevel(self.the_workspace, &record[0], &prints[0, 0], num_prints)
+
+        return [chr(value) if kind == PRINT_CHARACTER else value for kind, value in np.asarray(prints[:num_prints]).tolist()]
+
+    def solutions(self, batch_size=1):
+        """Yield solutions, fetching `batch_size` at a time from the engine.
+
+        A batch searches past the solution being yielded, so only raise
+        `batch_size` when enumerating many solutions.
+        """
+        cdef int64_t[::1] view
+        if self.the_workspace == NULL:
+            return
+
+        num_values = len(self.var_names)
+
+        while True:
+            if self.overflowed:
+                # Search the states set aside through the last layer the engine finished (see WideSearch)
+                finished = get_search_status_lowlevel(self.the_workspace) in (SearchStatus.EXHAUSTED, SearchStatus.INCOMPLETE)
+                depth = None if finished else get_search_depth_lowlevel(self.the_workspace)
+                engine_iterations = get_search_iterations_lowlevel(self.the_workspace)
+                remaining = None if self.limit is None else max(0, self.limit - engine_iterations)
+                yield from self.wide.solutions(self.overflowed_states(self.wide.taken), depth, remaining, self.progress, self.budget)
+                if finished or self.wide.stopped:
+                    return
+                set_search_limit_lowlevel(self.the_workspace, c_limit(self.wide.engine_limit(self.limit)))
+
+            stopped = False
+            while True:
+                for record in self.leftover:
+                    yield PackedSolution(record, self)  # Path and stdout are resolved when first used
+
+                if stopped:
+                    break
+                try:
+                    packed = self.next_solutions(batch_size)
+                except BaseException:
+                    cancel_search_lowlevel(self.the_workspace)  # Interrupted, or the progress hook raised
+                    raise
+                count = count_solutions(packed, num_values)
+                if self.verify and count > 0:
+                    start = perf_counter()
+                    view = packed
+                    with trace_span("verify", solutions=count):
+                        verified = verify_solutions_lowlevel(self.the_workspace, &view[0], count)
+                    self.timings.verification_time += perf_counter() - start
+                    if verified < count:
+                        raise Exception('BFS solver thought an invalid solution was valid')
+                self.leftover = solution_records(packed, num_values)
+                stopped = count < batch_size  # Limit, end of search or end of a layer
+
+            # Paused at the end of a layer, or out of states: on to the states set aside
+            if not self.overflowed or get_search_status_lowlevel(self.the_workspace) not in (SearchStatus.RUNNING, SearchStatus.EXHAUSTED, SearchStatus.INCOMPLETE):
+                return
+
+
+def solve_graph_bfs_c(graph, limit):
+    yield from CSearch(graph, limit).solutions()
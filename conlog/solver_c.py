@@ -1,492 +1,1101 @@
-# Solve the conlog grid using BFS --  C pseudopython
+# Solve the conlog grid using BFS -- the C engine, or a vectorized NumPy fallback
 
 from __future__ import annotations
-from enum import Enum, auto
-from dataclasses import dataclass
-from conlog.datatypes import Initial, Terminal
-from conlog.elegant import determine_variable_bounds_multipass
-from conlog.evaluator import evaluate
+from collections import deque
+from dataclasses import dataclass, field, replace
+from time import perf_counter
+import json
+import math
+import struct
+import sys
+from conlog.checkpoint import (
+    CheckpointError,
+    commit_checkpoint,
+    program_digest,
+    read_checkpoint_header,
+    temporary_path,
+    write_checkpoint_header,
+)
+from conlog.datatypes import Initial, PackedSolution
+from conlog.elegant import determine_edge_bounds, determine_variable_bounds_multipass
+from conlog.evaluator import ADD, COND_DEC, COND_INC, INITIAL, OPCODES, SUB, TERMINAL, compile_op, evaluate, partial_evaluate
+from conlog.solver import BreadthFirstSearch
+from conlog.stats import BUDGET_CHECK_INTERVAL, ProgressHook, SearchBudget, SearchStats, SearchStatus, edge_histogram, node_histogram, timed_search
+from conlog.trace import pause_layers, resume_layers, trace_layer, trace_span, traced
 import networkx as nx
+import numpy as np
 
 
+# States expanded per vectorized step; bounds the size of the temporaries
+LAYER_CHUNK = 1 << 16
 
-class arr_ptr:
-    def __init__(self, arr, offset):
-        self.arr = arr
-        self.offset = offset
-    def __iadd__(self, num):
-        self.offset += num
-        return self
-    def __iter__(self):
-        yield self.arr[self.offset]
-    def __imul__(self, val):
-        self.arr[self.offset] = val
-        return self
-    def __gt__(self, other):
-        return self.offset > other.offset
-    def __lt__(self, other):
-        return self.offset < other.offset
-    def __ge__(self, other):
-        return self.offset >= other.offset
-    def __le__(self, other):
-        return self.offset <= other.offset
-    def __eq__(self, other):
-        return self.offset == other.offset
-    def __ne__(self, other):
-        return self.offset != other.offset
-
-
-MAX_DEGREE = 16
-MAX_NUM_VALUES = 32
-MAX_QUEUE_LENGTH = 10000000 # 2**24 = 16777216
-
-
-uint8_t = int
-uint16_t = int
-uint32_t = int
-uint64_t = int
-int64_t = int
-char = int
-size_t = uint64_t
-
-
-class NodeType(Enum):   # enum NodeType
-    Initial = 1
-    Terminal = 2
-    Addition = 3
-    IntegerPrint = 4
-    UnicodePrint = 5
-    Subtraction = 6
-    ConditionalIncrement = 7
-    ConditionalDecrement = 8
-    NoneType = 9
+# Reverse update of a state at a node with opcode `op` and operand `rhs`:
+#
+#   values[lhs] += REVERSE_SCALE[op] * rhs + REVERSE_STEP[op] * (rhs > 0)
+#
+# which undoes the arithmetic, and the conditionals when their condition holds
+REVERSE_SCALE = np.zeros(len(OPCODES), dtype=np.int64)
+REVERSE_SCALE[ADD] = -1
+REVERSE_SCALE[SUB] = 1
+REVERSE_STEP = np.zeros(len(OPCODES), dtype=np.int64)
+REVERSE_STEP[COND_INC] = -1
+REVERSE_STEP[COND_DEC] = 1
 
 
 @dataclass
-class CNode():  # Struct CNode
-    node_type: NodeType
-    node_i: uint64_t
-    lhs: int64_t  # Index of the lhs operand
-    rhs_is_constant: bool  # Whether rhs is a constant or an index
-    rhs: int64_t  # Index/value of the rhs operand
-    num_neighbors: size_t  # Number of neighbors of this node
-    neighbor_arr: list[tuple[CNode]] # CNode * [MAX_DEGREE] (Yes, a POINTER ARRAY)
-
-
-@dataclass
-class CSearchState():  # Struct CSearchState
-    node: tuple[CNode]  # CNode *
-    last_node: tuple[CNode]  # CNode *
-    values: list[int]  # int64_t[MAX_NUM_VALUES]
-    parent_search_state: tuple[CSearchState]  # SearchState *
-
-
-@dataclass
-class CSearchWorkspace:  # Struct CSearchWorkspace
-    search_queue: list[CSearchState]  # CSearchState[MAX_QUEUE_LENGTH]
-    search_queue_next_free: arr_ptr  # CSearchState* . Add things via: *search_queue_next_free = thing; search_queue_next_free++
-    search_queue_next_to_pop: arr_ptr  # CSearchState* . Add things via: thing = *search_queue_next_to_pop; search_queue_next_to_pop++
-    node_arr: list[CNode]  # CNode[num_nodes]
-    num_values: size_t  # Number of values of the graph
-    num_free_values: size_t  # Number of values of the graph
-    num_fixed_values: size_t  # Number of values of the graph
-    fixed_values: list[uint64_t]  # uint64_t *  The values themselves
-    terminal_node: tuple[CNode]  # CNode *
-    iterations: uint64_t
-    limit: uint64_t
-    lower_bounds: int64_t
-    upper_bounds: int64_t
-
-
-# These don't have C equivalents; just make it easier to pretend
-def _malloc_CNode():
-    return CNode(
-        node_type=None,
-        node_i=None,
-        lhs=None,
-        rhs_is_constant=None,
-        rhs=None,
-        num_neighbors=None,
-        neighbor_arr=[None] * MAX_DEGREE,
-    )
-def _stack_CSearchState():
-    return CSearchState(  # ON THE STACK
-        node=66,
-        last_node=67, # placeholder that isn't None
-        values=[None] * MAX_NUM_VALUES,
-        parent_search_state=68, # placeholder that isn't None
-    )
-def _malloc_CSearchWorkspace():
-    return CSearchWorkspace(
-        search_queue=[None for _ in range(MAX_QUEUE_LENGTH)],
-        search_queue_next_free=None,
-        search_queue_next_to_pop=None,
-        node_arr=None,
-        num_values=None,
-        num_free_values=None,
-        num_fixed_values=None,
-        fixed_values=None,
-        terminal_node=None,
-        iterations=None,
-        limit=None,
-        lower_bounds=None,
-        upper_bounds=None,
+class LayerWorkspace:
+    """Search state of the NumPy fallback.
+
+    Pending states wait in `queue`, a FIFO of 2D int64 blocks with one row
+    per state: [node_i, last node_i (-1 for none), values0, values1, ...].
+    The blocks are BFS layers, cut into chunks. Every state ever enqueued
+    keeps its node and the index of its parent state in `state_node` and
+    `state_parent`, so solution paths can be traced back.
+    """
+
+    # The program, one entry per node (see evaluator.compile_op)
+    opcodes: np.ndarray
+    lhs: np.ndarray  # Variable index
+    rhs: np.ndarray  # Variable index, or the constant itself
+    rhs_is_constant: np.ndarray
+    neighbor_offsets: np.ndarray  # CSR: the neighbors of node i are neighbors[neighbor_offsets[i]:neighbor_offsets[i + 1]]
+    neighbors: np.ndarray
+    edge_bound_offsets: np.ndarray  # CSR bound records per step to neighbors[j] (see WorkspaceArrays)
+    edge_bound_vars: np.ndarray
+    edge_bound_lower: np.ndarray
+    edge_bound_upper: np.ndarray
+    num_nodes: int
+    num_values: int
+    fixed_values: np.ndarray  # The fixed variables come first
+    lower_bounds: list[int]
+    upper_bounds: list[int]
+    lower: np.ndarray  # The bounds again, as arrays, with a spare unbounded entry (see expand_states_python)
+    upper: np.ndarray
+
+    queue: deque
+    state_node: np.ndarray
+    state_parent: np.ndarray
+    num_states: int
+    next_to_pop: int  # Index of the state at the head of the queue
+    layer_end: int  # One past the last state of the BFS layer being popped
+
+    iterations: int
+    limit: int
+    layer: int = 0  # Number of that layer, as in the C engine
+    paused_layer: int = 0  # The layer get_next_solutions_python last paused before
+    status: SearchStatus = SearchStatus.RUNNING  # Why the search last stopped
+    progress: ProgressHook | None = None  # See set_progress_callback_python
+    budget: SearchBudget | None = None  # See set_search_budget_python
+    overflowed: list = field(default_factory=list)  # [state index, values] of the states set aside in expand_states_python
+    pruned_by_bounds: int = 0  # The counters of get_search_stats_lowlevel
+    pruned_by_backtracking: int = 0
+    pruned_by_filter: int = 0  # Always 0 here, but kept in checkpoints of the C engine's approximate dedup
+    queue_high_water: int = 0
+    bytes_allocated: int = 0
+    node_expansions: np.ndarray | None = None  # States expanded at each node
+    edge_steps: np.ndarray | None = None  # States queued by each step, indexed like `neighbors`
+    key_packed: bool = False  # Whether state keys are bit-packed; see init_state_keys_python
+    key_words: int = 0  # Words per state key
+    key_node_bits: int = 0
+    key_value_bits: list[int] | None = None
+    visited: set | None = None  # Every state enqueued, or None when not deduplicating
+
+
+def init_search_workspace_python(arrays: WorkspaceArrays, limit: int) -> LayerWorkspace | None:
+    num_nodes = len(arrays.opcodes)
+    num_values = len(arrays.var_names)
+    terminals = np.flatnonzero(arrays.opcodes == TERMINAL)
+    if len(terminals) == 0:
+        print('Did not find terminal node')
+        return None
+
+    the_workspace = LayerWorkspace(
+        opcodes=arrays.opcodes.astype(np.int64),
+        lhs=arrays.lhs,
+        rhs=arrays.rhs,
+        rhs_is_constant=arrays.rhs_is_constant.astype(bool),
+        neighbor_offsets=arrays.neighbor_offsets,
+        neighbors=arrays.neighbors,
+        edge_bound_offsets=arrays.edge_bound_offsets,
+        edge_bound_vars=arrays.edge_bound_vars,
+        edge_bound_lower=arrays.edge_bound_lower,
+        edge_bound_upper=arrays.edge_bound_upper,
+        num_nodes=num_nodes,
+        num_values=num_values,
+        fixed_values=arrays.fixed_values,
+        lower_bounds=arrays.lower_bounds,
+        upper_bounds=arrays.upper_bounds,
+        lower=np.array(arrays.lower_bounds + [np.iinfo(np.int64).min], dtype=np.int64),
+        upper=np.array(arrays.upper_bounds + [np.iinfo(np.int64).max], dtype=np.int64),
+        queue=deque(),
+        state_node=np.zeros(LAYER_CHUNK, dtype=np.int64),
+        state_parent=np.zeros(LAYER_CHUNK, dtype=np.int64),
+        num_states=0,
+        next_to_pop=0,
+        layer_end=1,
+        iterations=0,
+        limit=limit,
+        node_expansions=np.zeros(num_nodes, dtype=np.int64),
+        edge_steps=np.zeros(len(arrays.neighbors), dtype=np.int64),
     )
+    init_state_keys_python(the_workspace)
 
+    # The search starts at the (last) terminal, with every value zero
+    first = np.zeros((1, 2 + num_values), dtype=np.int64)
+    first[0, 0] = terminals[-1]
+    first[0, 1] = -1
+    enqueue_states_python(the_workspace, first, np.array([-1], dtype=np.int64))
 
+    return the_workspace
 
-# public void * init_search_workspace()
-def init_search_workspace_python(
-    num_fixed_values: uint64_t,
-    num_free_values: uint64_t,
-    fixed_values: list[uint64_t],  # uint64_t *
-    num_nodes: uint64_t,
-
-    node_type_arr: uint8_t,
-    node_lhs_arr: uint64_t,  # Index of the lhs operand
-    node_rhs_is_constant_arr: bool,  # Whether rhs is a constant or an index
-    node_rhs_arr: uint64_t,  # Index/value of the rhs operand
-
-    adjacency_matrix: list[uint8_t],  # uint8_t[num_nodes][num_nodes]
-    limit: uint64_t,
-    lower_bounds: list[uint64_t],  # lower_bounds[num_values]
-    upper_bounds: list[uint64_t],  # upper_bounds[num_values]
-) -> tuple[CSearchWorkspace]:
-
-    # CSearchWorkspace * the_workspace = malloc(sizeof(CSearchWorkspace))
-    the_workspace = _malloc_CSearchWorkspace()
-
-    # Make the node array
-    # Cnode * node_type_arr = malloc(sizeof(CNode) * num_nodes)
-    node_arr = [_malloc_CNode() for _ in range(num_nodes)]
-    for i in range(num_nodes):
-        # Basics
-        node_arr[i].node_type = node_type_arr[i]
-        node_arr[i].node_i = i
-        node_arr[i].lhs = node_lhs_arr[i]
-        node_arr[i].rhs_is_constant = node_rhs_is_constant_arr[i]
-        node_arr[i].rhs = node_rhs_arr[i]
-        node_arr[i].num_neighbors = 0
-    for i in range(num_nodes):
-        for j in range(num_nodes):
-            if (adjacency_matrix[(i * num_nodes) + j]):
-                # node_arr[i].neighbor_arr[node_arr[i].num_neighbors] = &(node_arr[j])
-                node_arr[i].neighbor_arr[node_arr[i].num_neighbors] = (node_arr[j],)
-                node_arr[i].num_neighbors += 1  # ++
-                if (node_arr[i].num_neighbors >= MAX_DEGREE):
-                    print('Degree too high')
-                    return None  # FAILURE; NULL VECTOR
-
-    # .  ==>  ->
-    # Put the first node on the search queue; the terminal node
-    found_it: uint8_t = 0
-    for i in range(num_nodes):
-        if node_arr[i].node_type == NodeType.Terminal.value:
-            found_it = 1
-            the_workspace.terminal_node = node_arr[i]
-            the_workspace.terminal_node_i = i
-    if (not found_it):
-        print('Did not find terminal node')
-        return None  # FAILURE; NULL VECTOR
-
-    first_search_state = _stack_CSearchState()
-
-    first_search_state.node = the_workspace.terminal_node,
-    first_search_state.last_node = None
-    for i in range(MAX_NUM_VALUES):
-        first_search_state.values[i] = 0
-    first_search_state.parent_search_state = None
-
-    # the_workspace.search_queue_next_to_pop = &(the_workspace->search_queue[0])
-    the_workspace.search_queue_next_to_pop = arr_ptr(the_workspace.search_queue, 0)
-    # the_workspace.search_queue_next_free = &(the_workspace->search_queue[0])
-    the_workspace.search_queue_next_free = arr_ptr(the_workspace.search_queue, 0)
-    # * (the_workspace->search_queue_next_free) = first_search_state
-    the_workspace.search_queue_next_free *= first_search_state
-
-    the_workspace.search_queue_next_free += 1
-
-    # .  ==>  ->
-    the_workspace.node_arr = node_arr 
-    the_workspace.num_free_values = num_free_values
-    the_workspace.num_fixed_values = num_fixed_values
-    the_workspace.num_values = num_free_values + num_fixed_values
-    # the_workspace->fixed_values = malloc(sizeof(uint64_t) * num_fixed_values)
-    the_workspace.fixed_values = [0] * num_fixed_values
-    for i in range(num_fixed_values):
-        the_workspace.fixed_values[i] = fixed_values[i]
-    the_workspace.iterations = 0
-    the_workspace.limit = limit
-    the_workspace.lower_bounds = lower_bounds
-    the_workspace.upper_bounds = upper_bounds
-
-    return the_workspace,  # the_workspace
 
-# public int64_t * get_next_solution(
-def get_next_solution_python(
-    the_workspace: tuple[CSearchWorkspace], # void * the_workspace,  # Really it's a CSearchWorkspace * .. void* so I don't have to explain that to caller
-) -> list[int]:
-    # Doc: Returns an int64_t * ptr. It's an array of length at least 1, specced as follows:
-    #
-    #   [arr_size values0 values1 ... values{N-1} node_id0 node_id1 ... node_id{arr_size-1}]
-    #
-    # The elements are the node ids of the solution path.
-    #
-    # (note that it has arr_size+num_values+1 elements, if arr_size >= 0)
+def init_state_keys_python(the_workspace: LayerWorkspace) -> None:
+    # Doc: Chooses the state key layout; same rules as init_state_keys. When every variable has finite
+    # bounds containing 0, the key bit-packs
     #
-    # If arr_size < 0, search failed. The malloc'd array is of length 1, eg.:
+    #   [node_i | last node_i | values0 - lower0 | values1 - lower1 | ...]
     #
-    #   [-1]
-    #
-
-    the_workspace = the_workspace[0] # IGNORE THIS
-
-    # queue_end = &(the_workspace->search_queue[MAX_QUEUE_LENGTH])
-    queue_end = arr_ptr(the_workspace.search_queue, MAX_QUEUE_LENGTH - MAX_DEGREE - 1)
-
-    iterations: uint64_t = the_workspace.iterations
-    limit: uint64_t = the_workspace.limit
-    num_values: size_t = the_workspace.num_values
-    fixed_values: list[uint64_t] = the_workspace.fixed_values
-    num_fixed_values: size_t = the_workspace.num_fixed_values
-    search_queue_next_to_pop = the_workspace.search_queue_next_to_pop
-    search_queue_next_free = the_workspace.search_queue_next_free
-    lower_bounds = the_workspace.lower_bounds
-    upper_bounds = the_workspace.upper_bounds
-
-    # uint64_t new_values[MAX_NUM_VALUES];
-    new_values: uint64_t = [0] * MAX_NUM_VALUES
-
-    found_solution = False
-    answer_search_head: CSearchState = None
-    while (search_queue_next_free < queue_end) and (iterations < limit) and (not found_solution):
-        iterations += 1
-
-        # # For debugging/profiling, bring back this printf in C:
-        # if iterations == ((iterations >> 15) << 15):
-        #     print(iterations)
-
-        current_state ,= search_queue_next_to_pop
-        search_queue_next_to_pop += 1
-
-        # Create new values for this state
-
-        for i in range(num_values):
-            new_values[i] = current_state.values[i]
-
-        match current_state.node[0].node_type:
-            case NodeType.Addition.value | NodeType.Subtraction.value | NodeType.ConditionalIncrement.value | NodeType.ConditionalDecrement.value:
-                rhs: uint64_t
-                if current_state.node[0].rhs_is_constant:
-                    rhs = current_state.node[0].rhs
-                else:
-                    rhs = new_values[current_state.node[0].rhs]
-
-                rvalue: int64_t = -1  # reverse-search, so reverse the operation
-
-                match current_state.node[0].node_type:
-                    case NodeType.Subtraction.value | NodeType.ConditionalDecrement.value:
-                        rvalue *= -1
-                match current_state.node[0].node_type:
-                    case NodeType.Addition.value | NodeType.Subtraction.value:
-                        rvalue *= rhs
-                match current_state.node[0].node_type:
-                    case NodeType.ConditionalIncrement.value | NodeType.ConditionalDecrement.value:
-                        if (rhs <= 0):
-                            rvalue = 0  # Do nothing if condition not satisfied
-
-                new_values[current_state.node[0].lhs] += rvalue
-            case _:
-                pass
-
+    # into one or two words. Otherwise the key is the raw fields, one word each.
 
-        keep_going_from_here = True
-
-        if (current_state.node[0].node_type == NodeType.Terminal.value) and (current_state.last_node != None):
-            # Terminal nodes terminate this search path, unless it's the first node
-            keep_going_from_here = False
-
-        for i in range(num_values):
-            if (new_values[i] < lower_bounds[i]) or (new_values[i] > upper_bounds[i]):
-                keep_going_from_here = False
-                # Bounds violation.
-                break
+    LOWEST, HIGHEST = -2**63, 2**63 - 1
 
+    node_bits = (the_workspace.num_nodes | 1).bit_length()  # Node ids and "no last node" (num_nodes)
+    value_bits = []
+    packed = True
+    for lower, upper in zip(the_workspace.lower_bounds, the_workspace.upper_bounds):
+        if lower == LOWEST or upper == HIGHEST or lower > 0 or upper < 0:
+            packed = False
+            break
+        value_bits.append((upper - lower).bit_length())
+    total_bits = 2 * node_bits + sum(value_bits)
+    if total_bits > 128:
+        packed = False
+
+    the_workspace.key_node_bits = node_bits
+    the_workspace.key_value_bits = value_bits
+    the_workspace.key_packed = packed
+    if packed:
+        the_workspace.key_words = 2 if total_bits > 64 else 1
+    else:
+        the_workspace.key_words = 2 + the_workspace.num_values
+
+
+def encode_state_key_python(the_workspace: LayerWorkspace, node_i, last_node_i, values) -> tuple[int]:
+    # `last_node_i` is -1 for the terminal state. Words are unsigned, as in C
+    num_values = the_workspace.num_values
+
+    if not the_workspace.key_packed:
+        return (node_i, last_node_i % 2**64) + tuple(v % 2**64 for v in values[:num_values])
+
+    node_bits = the_workspace.key_node_bits
+    packed = node_i | ((the_workspace.num_nodes if last_node_i < 0 else last_node_i) << node_bits)
+    shift = 2 * node_bits
+    for i in range(num_values):
+        bits = the_workspace.key_value_bits[i]
+        packed |= (values[i] - the_workspace.lower_bounds[i]) << shift
+        shift += bits
+
+    return tuple((packed >> (64 * w)) & (2**64 - 1) for w in range(the_workspace.key_words))
+
+
+def decode_state_key_python(the_workspace: LayerWorkspace, key) -> list[int]:
+    # Inverse of encode_state_key_python for the values; the nodes are not decoded
+    num_values = the_workspace.num_values
+
+    if not the_workspace.key_packed:
+        return [v - 2**64 if v >= 2**63 else v for v in key[2:2 + num_values]]
+
+    packed = sum(word << (64 * w) for w, word in enumerate(key))
+    shift = 2 * the_workspace.key_node_bits
+    values = []
+    for i in range(num_values):
+        bits = the_workspace.key_value_bits[i]
+        values.append(the_workspace.lower_bounds[i] + ((packed >> shift) & ((1 << bits) - 1)))
+        shift += bits
+    return values
+
+
+def decode_state_nodes_python(the_workspace: LayerWorkspace, key) -> tuple[int, int]:
+    # Inverse of encode_state_key_python for the nodes; the last node is -1 for the terminal state
+    if not the_workspace.key_packed:
+        return key[0], key[1] - 2**64 if key[1] >= 2**63 else key[1]
+
+    node_bits = the_workspace.key_node_bits
+    mask = (1 << node_bits) - 1
+    node_i, last_node_i = key[0] & mask, (key[0] >> node_bits) & mask
+    return node_i, -1 if last_node_i == the_workspace.num_nodes else last_node_i
+
+
+def _unseen(the_workspace: LayerWorkspace, rows: np.ndarray) -> np.ndarray:
+    # Marks the rows whose state was never enqueued, and records them as seen
+    width = rows.shape[1] * rows.itemsize
+    keys = np.ascontiguousarray(rows).view(np.dtype((np.void, width))).ravel().tolist()
+    visited = the_workspace.visited
+    fresh = np.zeros(len(keys), dtype=bool)
+    for i, key in enumerate(keys):
+        if key not in visited:
+            visited.add(key)
+            fresh[i] = True
+    return fresh
+
+
+def enqueue_states_python(the_workspace: LayerWorkspace, rows: np.ndarray, parents: np.ndarray, steps: np.ndarray | None = None) -> np.ndarray:
+    # Returns the parents of the states actually enqueued; `steps` are the edges that reached them
+    if the_workspace.visited is not None:
+        fresh = _unseen(the_workspace, rows)
+        rows, parents = rows[fresh], parents[fresh]
+        steps = None if steps is None else steps[fresh]
+        the_workspace.bytes_allocated += len(rows) * (rows.shape[1] * rows.itemsize + sys.getsizeof(b""))
+    if steps is not None:
+        the_workspace.edge_steps += np.bincount(steps, minlength=len(the_workspace.edge_steps))
+    if len(rows) == 0:
+        return parents
+
+    start = the_workspace.num_states
+    end = start + len(rows)
+    if end > len(the_workspace.state_node):
+        capacity = max(end, 2 * len(the_workspace.state_node))
+        the_workspace.bytes_allocated += 2 * (capacity - len(the_workspace.state_node)) * the_workspace.state_node.itemsize
+        the_workspace.state_node = np.resize(the_workspace.state_node, capacity)
+        the_workspace.state_parent = np.resize(the_workspace.state_parent, capacity)
+    the_workspace.state_node[start:end] = rows[:, 0]
+    the_workspace.state_parent[start:end] = parents
+    the_workspace.num_states = end
+    the_workspace.queue.append(rows)
+    the_workspace.bytes_allocated += rows.nbytes
+    return parents
+
+
+def csr_entries(offsets: np.ndarray, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # The entries of CSR `rows`, in order: for each, its position in `rows` and its index
+    start = offsets[rows]
+    count = offsets[rows + 1] - start
+    owner = np.repeat(np.arange(len(rows)), count)
+    return owner, start[owner] + np.arange(len(owner)) - (np.cumsum(count) - count)[owner]
+
+
+def expand_states_python(the_workspace: LayerWorkspace, rows: np.ndarray, first_index: int) -> None:
+    # Doc: Expands the popped states `rows`, the first of which is state number `first_index`, and
+    # enqueues their successors: apply the reverse operation of each state's node, drop the states
+    # out of bounds or at the terminal, then step to every neighbor but the one we came from whose
+    # step bounds the values are within.
+
+    ws = the_workspace
+    nodes = rows[:, 0]
+    last = rows[:, 1]
+    ws.node_expansions += np.bincount(nodes, minlength=ws.num_nodes)
+
+    # Reverse updates, every opcode at once. A spare last column stands in for variable 0 in
+    # programs without variables
+    values = np.zeros((len(rows), ws.num_values + 1), dtype=np.int64)
+    values[:, :-1] = rows[:, 2:]
+    r = np.arange(len(rows))
+    opcodes = ws.opcodes[nodes]
+    constant = ws.rhs_is_constant[nodes]
+    operand = np.where(constant, ws.rhs[nodes], values[r, np.where(constant, 0, ws.rhs[nodes])])
+    delta = REVERSE_SCALE[opcodes] * operand + REVERSE_STEP[opcodes] * (operand > 0)
+    lhs = ws.lhs[nodes]
+    updated = values[r, lhs] + delta
+    values[r, lhs] = updated
+
+    # Updates past the int64 range wrap around. Such a state is out of bounds if a finite bound
+    # lies on the side it left by, and is set aside with its values otherwise, as in the C engine
+    negated_min = (REVERSE_SCALE[opcodes] == -1) & (operand == np.iinfo(np.int64).min)
+    overflowed = negated_min | (((updated - delta) ^ updated) & (delta ^ updated) < 0)
+    upward = negated_min | (delta > 0)
+    unbounded = np.where(upward, ws.upper[lhs] == np.iinfo(np.int64).max, ws.lower[lhs] == np.iinfo(np.int64).min)
+    for i in np.flatnonzero(overflowed & unbounded).tolist():
+        ws.overflowed.append([first_index + i, rows[i, 2:].tolist()])
+    ws.pruned_by_bounds += int((overflowed & ~unbounded).sum())
+
+    # Terminals end a path, unless the search starts there
+    keep = ~((opcodes == TERMINAL) & (last >= 0)) & ~overflowed
+    in_bounds = (values >= ws.lower).all(axis=1) & (values <= ws.upper).all(axis=1)
+    ws.pruned_by_bounds += int((keep & ~in_bounds).sum())
+    keep &= in_bounds
+    kept = np.flatnonzero(keep)
+
+    # Gather every neighbor of every kept state from the CSR arrays
+    owner, edges = csr_entries(ws.neighbor_offsets, nodes[kept])
+    parent = kept[owner]
+    child_nodes = ws.neighbors[edges]
+
+    forward = child_nodes != last[parent]  # No backtracking allowed
+    ws.pruned_by_backtracking += len(forward) - int(forward.sum())
+    child_values = values[parent, :-1]
+    step, records = csr_entries(ws.edge_bound_offsets, edges)
+    bounded = child_values[step, ws.edge_bound_vars[records]]
+    outside = (bounded < ws.edge_bound_lower[records]) | (bounded > ws.edge_bound_upper[records])
+    within = np.bincount(step[outside], minlength=len(edges)) == 0
+    ws.pruned_by_bounds += int((forward & ~within).sum())
+    forward &= within
+    parent = parent[forward]
+
+    children = np.empty((len(parent), 2 + ws.num_values), dtype=np.int64)
+    children[:, 0] = child_nodes[forward]
+    children[:, 1] = nodes[parent]
+    children[:, 2:] = child_values[forward]
+    num_states = ws.num_states
+    enqueued = enqueue_states_python(ws, children, first_index + parent, edges[forward]) - first_index
+
+    # The queue is longest right after expanding some state; the C engine checks after each
+    if len(kept):
+        queued = num_states + np.cumsum(np.bincount(enqueued, minlength=len(rows))) - (first_index + np.arange(len(rows)))
+        ws.queue_high_water = max(ws.queue_high_water, int(queued[kept].max()))
+
+
+def solution_record_python(the_workspace: LayerWorkspace, state_i: int, values) -> np.ndarray:
+    # [arr_size values0 ... values{N-1} node_id0 ... node_id{arr_size-1}], from the Initial back to the Terminal
+    path = []
+    while state_i >= 0:
+        path.append(the_workspace.state_node[state_i])
+        state_i = the_workspace.state_parent[state_i]
+    return np.concatenate(([len(path)], values, path)).astype(np.int64)
+
+
+def get_next_solutions_python(the_workspace: LayerWorkspace, max_solutions: int) -> list[np.ndarray]:
+    # Doc: Pops states until `max_solutions` solutions are found, the limit is reached or the queue
+    # runs out, and returns the solution records. A state is a solution when it is at the Initial
+    # with the fixed values. Iterations count popped states, as in get_next_solutions_lowlevel.
+
+    ws = the_workspace
+    num_fixed = len(ws.fixed_values)
+    records = []
+
+    while len(records) < max_solutions and ws.queue and ws.iterations < ws.limit:
+        if ws.next_to_pop == ws.layer_end and ws.overflowed and ws.paused_layer <= ws.layer:
+            # Let the caller search the states set aside through this layer first (see WideSearch)
+            ws.paused_layer = ws.layer + 1
+            ws.status = SearchStatus.RUNNING
+            return records
+
+        if ws.next_to_pop == ws.layer_end:
+            # Each block holds the children of one chunk, so chunks never straddle layers
+            ws.layer_end = ws.num_states
+            ws.layer += 1
+            trace_layer(ws.layer, ws.iterations, ws.num_states - ws.next_to_pop)
+
+        block = ws.queue[0]
+        chunk = min(len(block), LAYER_CHUNK, ws.limit - ws.iterations)
+        if ws.progress is not None and ws.progress.next_iterations is not None:
+            chunk = max(1, min(chunk, ws.progress.next_iterations - ws.iterations))
+        rows = block[:chunk]
+
+        solved = np.flatnonzero((ws.opcodes[rows[:, 0]] == INITIAL) & (rows[:, 2:2 + num_fixed] == ws.fixed_values).all(axis=1))
+        wanted = max_solutions - len(records)
+        if len(solved) >= wanted:
+            # Stop right after the last solution wanted, as the C engine does
+            solved = solved[:wanted]
+            rows = rows[:solved[-1] + 1]
+
+        if len(rows) == len(block):
+            ws.queue.popleft()
+        else:
+            ws.queue[0] = block[len(rows):]
+
+        first_index = ws.next_to_pop
+        ws.next_to_pop += len(rows)
+        ws.iterations += len(rows)
+
+        expand_states_python(ws, rows, first_index)
+        for i in solved:
+            records.append(solution_record_python(ws, first_index + i, rows[i, 2:]))
+
+        if ws.progress is not None and ws.progress.due(ws.iterations):
+            depth, state_i = 0, ws.state_parent[ws.next_to_pop - 1]
+            while state_i >= 0:
+                depth, state_i = depth + 1, ws.state_parent[state_i]
+            if ws.progress.report(ws.iterations, depth, ws.num_states - ws.next_to_pop):
+                ws.status = SearchStatus.CANCELLED
+                return records
+
+        if ws.budget is not None and (exceeded := ws.budget.exceeded(ws.bytes_allocated)) is not None:
+            ws.status = exceeded
+            return records
+
+    if len(records) == max_solutions:
+        ws.status = SearchStatus.RUNNING
+    elif not ws.queue:
+        ws.status = SearchStatus.EXHAUSTED if ws.pruned_by_filter == 0 else SearchStatus.INCOMPLETE
+    else:
+        ws.status = SearchStatus.LIMIT_REACHED
+    return records
 
 
-        if (keep_going_from_here):
-            # Make all successor states (this is where the LOGIC happens!)
-            # for successor_state in compute_successor_states(current_state, bounds=bounds):
-            #     queue.append([successor_state, [current_state, history]])
-            for i in range(current_state.node[0].num_neighbors):
-                # CNode * neighbor_node = current_state.node[0].neighbor_arr[i]
-                neighbor_node: tuple[CNode] = current_state.node[0].neighbor_arr[i]
+# public int64_t get_search_depth(void * the_workspace)
+def get_search_depth_python(the_workspace: LayerWorkspace) -> int:
+    # Doc: The deepest BFS layer popped completely; -1 before the Terminal is
+    ws = the_workspace
+    return ws.layer if ws.next_to_pop == ws.layer_end else ws.layer - 1
 
-                if neighbor_node == current_state.last_node:
-                    continue  # No backtracking allowed
 
-                next_search_state = _stack_CSearchState()
+# public void set_search_limit(void * the_workspace, uint64_t limit)
+def set_search_limit_python(the_workspace: LayerWorkspace, limit: int) -> None:
+    # Raising the limit lets the next get_next_solutions resume from the current frontier
+    the_workspace.limit = limit
 
-                next_search_state.node = neighbor_node
-                next_search_state.last_node = current_state.node[0],
-                for i in range(num_values):
-                    next_search_state.values[i] = new_values[i]
-                # next_search_state.parent_search_state = &(current_state)
-                next_search_state.parent_search_state = current_state,
 
-                search_queue_next_free *= next_search_state
-                search_queue_next_free += 1
+# public void set_progress_callback(void * the_workspace, ...)
+def set_progress_callback_python(the_workspace: LayerWorkspace, progress: ProgressHook | None) -> None:
+    # Doc: Reports progress between chunks of states (cut so that iteration counts are hit exactly),
+    # like set_progress_callback_lowlevel between states. None stops reporting.
+    the_workspace.progress = progress
 
 
+# public void set_search_budget(void * the_workspace, uint64_t timeout_ns, uint64_t max_bytes)
+def set_search_budget_python(the_workspace: LayerWorkspace, budget: SearchBudget | None) -> None:
+    # Doc: Checks `budget` between chunks of states, like set_search_budget_lowlevel every
+    # PROGRESS_CLOCK_INTERVAL states. None removes it.
+    the_workspace.budget = budget
 
-        if (current_state.node[0].node_type == NodeType.Initial.value):
-            fixed_equal = True
-            for i in range(num_fixed_values):
-                if (current_state.values[i] != fixed_values[i]):
-                    fixed_equal = False
-                    break
 
-            if fixed_equal:
-                found_solution = True
-                answer_search_head = current_state
+# public void cancel_search(void * the_workspace)
+def cancel_search_python(the_workspace: LayerWorkspace) -> None:
+    # Records that the caller gave up on the search
+    the_workspace.status = SearchStatus.CANCELLED
 
 
-    # int64_t * ans;
-    ans: int64_t
+# public uint64_t get_search_iterations(void * the_workspace)
+def get_search_iterations_python(the_workspace: LayerWorkspace) -> int:
+    return the_workspace.iterations
 
-    if found_solution:
-        # Traverse the `SearchState`s to find the length of the answer. Then malloc + copy node ids
 
-        # CSearchState * current_search_head
-        current_search_head: tuple[CSearchState]
+# public uint64_t get_overflowed_state(void * the_workspace, uint64_t i, ...)
+def get_overflowed_state_python(the_workspace: LayerWorkspace, i: int) -> tuple[list[int], list[int]]:
+    # The values of the `i`-th state set aside, and its path of node ids back to the Terminal
+    state_i, values = the_workspace.overflowed[i]
+    path = []
+    while state_i >= 0:
+        path.append(int(the_workspace.state_node[state_i]))
+        state_i = the_workspace.state_parent[state_i]
+    return values, path
 
-        soln_len: uint64_t = 1
-        current_search_head = answer_search_head,
-        # [0]. ===> ->
-        while current_search_head[0].parent_search_state != None:
-            # current_search_head = current_search_head->parent_search_state
-            current_search_head = current_search_head[0].parent_search_state
-            soln_len += 1
 
-        # ans = malloc(sizeof(int64_t) * (1 + num_values + soln_len))
-        ans = [None] * (1 + num_values + soln_len)
+# public int enable_dedup(void * the_workspace)
+def enable_dedup_python(the_workspace: LayerWorkspace) -> None:
+    # Doc: Keeps every state enqueued from now on and never enqueues a state twice.
+    # A repeated state has the same future as its first copy, so the first (shortest) solution is
+    # unaffected, but solutions that only differ before a repeated state are not enumerated.
 
-        offset: uint64_t = 0
+    the_workspace.visited = set()
+    for rows in the_workspace.queue:
+        _unseen(the_workspace, rows)
 
-        ans[offset] = soln_len
-        offset += 1
 
-        for i in range(num_values):
-            ans[offset] = current_state.values[i]
-            offset += 1
+def _queued_states(the_workspace: LayerWorkspace) -> np.ndarray:
+    if not the_workspace.queue:
+        return np.zeros((0, 2 + the_workspace.num_values), dtype=np.int64)
+    return np.concatenate(the_workspace.queue)
 
-        current_search_head = answer_search_head,
-        ans[offset] = current_search_head[0].node[0].node_i
-        offset += 1
-        # [0]. ===> ->
-        while current_search_head[0].parent_search_state != None:
-            # current_search_head = current_search_head->parent_search_state
-            current_search_head = current_search_head[0].parent_search_state
-            ans[offset] = current_search_head[0].node[0].node_i
-            offset += 1
 
-    else:
-        # ans = malloc(sizeof(int64_t) * 1)
-        ans = [None]
-        ans[0] = -1  # This special array will make it clear we failed.
-
-    # . ===> ->
+# public int save_search_workspace(void * the_workspace, char * path)
+def save_search_workspace_python(the_workspace: LayerWorkspace, f) -> None:
+    # Same layout as save_search_workspace_lowlevel, streamed to the open file `f`:
+    #
+    #   [num_values key_words iterations num_states next_to_pop num_overflowed pruned_by_filter layer_end layer
+    #    num_visited filter_words]
+    #   [node_i parent_i] * num_states
+    #   [key0 ... key{key_words-1}] * (num_states - next_to_pop)
+    #   [state_i values0 ... values{num_values-1}] * num_overflowed
+    #   [key0 ... key{key_words-1}] * num_visited
+    #
+    # There is no Bloom filter here, so filter_words is always 0.
+
+    num_states = the_workspace.num_states
+    key_words = the_workspace.key_words
+    overflowed = the_workspace.overflowed
+    visited = the_workspace.visited if the_workspace.visited is not None else set()
+    f.write(struct.pack('=11Q', the_workspace.num_values, key_words, the_workspace.iterations, num_states, the_workspace.next_to_pop, len(overflowed), the_workspace.pruned_by_filter, the_workspace.layer_end, the_workspace.layer, len(visited), 0))
+
+    pairs = np.column_stack((the_workspace.state_node[:num_states], the_workspace.state_parent[:num_states]))
+    f.write(pairs.astype('=i8').tobytes())
+    for row in _queued_states(the_workspace).tolist():
+        key = encode_state_key_python(the_workspace, row[0], row[1], row[2:])
+        f.write(struct.pack('=%dQ' % key_words, *key))
+    for state_i, values in overflowed:
+        f.write(struct.pack('=%dq' % (1 + the_workspace.num_values), state_i, *values))
+    for raw in visited:
+        row = np.frombuffer(raw, dtype=np.int64).tolist()
+        key = encode_state_key_python(the_workspace, row[0], row[1], row[2:])
+        f.write(struct.pack('=%dQ' % key_words, *key))
+
+
+# public int load_search_workspace(void * the_workspace, char * path, uint64_t offset)
+def load_search_workspace_python(the_workspace: LayerWorkspace, f) -> None:
+    # Inverse of save_search_workspace_python; `f` is positioned at the start of the body
+
+    def read(size):
+        raw = f.read(size)
+        if len(raw) != size:
+            raise CheckpointError('truncated checkpoint')
+        return raw
+
+    num_values, key_words, iterations, num_states, next_to_pop, num_overflowed, pruned_by_filter, layer_end, layer, num_visited, _ = struct.unpack('=11Q', read(88))
+    if num_values != the_workspace.num_values or key_words != the_workspace.key_words or not next_to_pop <= layer_end <= num_states:
+        raise CheckpointError('checkpoint does not fit this workspace')
+
+    pairs = np.frombuffer(read(16 * num_states), dtype='=i8').reshape(num_states, 2).astype(np.int64)
+    state_node, state_parent = pairs[:, 0], pairs[:, 1]
+    if ((state_node < 0) | (state_node >= the_workspace.num_nodes) | (state_parent >= np.arange(num_states))).any():
+        raise CheckpointError('corrupt checkpoint')
+
+    rows = np.zeros((num_states - next_to_pop, 2 + num_values), dtype=np.int64)
+    for r, i in enumerate(range(next_to_pop, num_states)):
+        key = struct.unpack('=%dQ' % key_words, read(8 * key_words))
+        parent_i = state_parent[i]
+        rows[r, 0] = state_node[i]
+        rows[r, 1] = -1 if parent_i < 0 else state_node[parent_i]
+        rows[r, 2:] = decode_state_key_python(the_workspace, key)
+
+    overflowed = []
+    for _ in range(num_overflowed):
+        state_i, *values = struct.unpack('=%dq' % (1 + num_values), read(8 * (1 + num_values)))
+        if not 0 <= state_i < next_to_pop:
+            raise CheckpointError('corrupt checkpoint')
+        overflowed.append([state_i, values])
+
+    # Only restored into a search that dedups too
+    visited = None
+    if the_workspace.visited is not None and num_visited > 0:
+        visited = set()
+        for _ in range(num_visited):
+            key = struct.unpack('=%dQ' % key_words, read(8 * key_words))
+            row = [*decode_state_nodes_python(the_workspace, key), *decode_state_key_python(the_workspace, key)]
+            visited.add(np.array(row, dtype=np.int64).tobytes())
+
+    the_workspace.state_node = state_node.copy()
+    the_workspace.state_parent = state_parent.copy()
+    the_workspace.num_states = num_states
+    the_workspace.next_to_pop = next_to_pop
+    the_workspace.layer_end = layer_end
+    the_workspace.layer = layer
+    the_workspace.paused_layer = 0
     the_workspace.iterations = iterations
-    the_workspace.limit = limit
-    the_workspace.search_queue_next_to_pop = search_queue_next_to_pop
+    the_workspace.overflowed = overflowed
+    the_workspace.pruned_by_filter = pruned_by_filter
+    the_workspace.status = SearchStatus.RUNNING
+    # One block for the rest of the layer being popped and one for the next, so chunks never straddle layers
+    split = layer_end - next_to_pop
+    the_workspace.queue = deque(block for block in (rows[:split], rows[split:]) if len(block))
+    if visited is not None:
+        the_workspace.visited = visited
+    elif the_workspace.visited is not None:
+        # Saved without one; start it again from the restored frontier
+        enable_dedup_python(the_workspace)
 
-    return ans
 
 
+# Get highest unsigned int64; an unbounded limit
+UNLIMITED = 2**64 - 1
 
-def solve_graph_bfs_c(graph: nx.Graph, limit = None):
-    try:
-        from conlog.solver_bindings import solve_graph_bfs_c as solve_graph_bfs_c_cython
 
-        # solve_graph_bfs_c_cython(graph, limit)
-        yield from solve_graph_bfs_c_cython(graph, limit)
+def c_limit(limit):
+    if limit is None or limit == float('inf'):
+        return UNLIMITED
+    return int(limit)
 
-        return
-    except ImportError as e:
-        print('Failed to import cython module (%s). Falling back to python' % repr(e))
 
-    # Some Python preprocessing
+@dataclass
+class WorkspaceArrays:
+    """A program flattened into the arrays both engines are built from.
+
+    Nodes are indexed in `nodes` order and variables in `var_names` order,
+    fixed variables first. Operations are as in `evaluator.compile_op`, with
+    variables replaced by their index. The adjacency is CSR: the neighbors
+    of node i are neighbors[neighbor_offsets[i]:neighbor_offsets[i + 1]], in
+    node order, and step j of the search goes to neighbors[j]. The bounds of
+    step j (see elegant.determine_edge_bounds) are CSR too: records
+    edge_bound_offsets[j] to edge_bound_offsets[j + 1] each bound one
+    variable, and only the steps tighter than the global bounds have any.
+    """
+
+    nodes: list
+    var_names: list[str]
+    fixed_values: np.ndarray  # int64[num_fixed_values]
+    opcodes: np.ndarray  # uint8[num_nodes]
+    lhs: np.ndarray  # int64[num_nodes]
+    rhs: np.ndarray  # int64[num_nodes]; a variable index, or the constant itself
+    rhs_is_constant: np.ndarray  # uint8[num_nodes]
+    neighbor_offsets: np.ndarray  # int64[num_nodes + 1]
+    neighbors: np.ndarray  # int64[num_edges]
+    lower_bounds: list[int]  # Global bounds, per variable
+    upper_bounds: list[int]
+    edge_bound_offsets: np.ndarray  # int64[num_edges + 1]
+    edge_bound_vars: np.ndarray  # int64[num_records]: the variable index each record bounds
+    edge_bound_lower: np.ndarray  # int64[num_records]
+    edge_bound_upper: np.ndarray
+
+
+@traced
+def workspace_arrays(graph: nx.Graph, budget: SearchBudget | None = None) -> WorkspaceArrays:
+    """Flatten `graph` for the engines, in time linear in its size.
+
+    Past the deadline of `budget`, raises `BudgetExceeded`.
+    """
 
     initial_node = next(node for node in graph.nodes if isinstance(node.op, Initial))
-    terminal_node = next(node for node in graph.nodes if isinstance(node.op, Terminal))
     free, fixed = initial_node.op.free, dict(initial_node.op.fixed)
 
     # VERY IMPORTANT THAT ALL FIXED COME FIRST!
     var_names = list(fixed) + list(free)
 
-    num_fixed_values = len(fixed)
-    num_free_values = len(free)
-    num_values = num_fixed_values + num_free_values
-    fixed_values = list(fixed.values())
-
-    nodes = list(graph.nodes)
-    nodes = sorted(nodes, key=str)
+    nodes = sorted(graph.nodes, key=lambda node: node.name)  # Deterministic, for checkpoints
 
-    num_nodes = len(nodes)
-    node_type_arr = [getattr(NodeType, type(node.op).__name__).value for node in nodes]
-
-    node_lhs_arr = [var_names.index(node.op.lhs) if node.op and hasattr(node.op, 'lhs') else 0 for node in nodes]
-    node_rhs_is_constant_arr = [int(isinstance(node.op.rhs, int)) if (node.op and hasattr(node.op, 'lhs')) else 0 for node in nodes]
-    node_rhs_arr = [(node.op.rhs if isinstance(node.op.rhs, int) else var_names.index(node.op.rhs))  if (node.op and hasattr(node.op, 'lhs')) else 0 for node in nodes]
-
-    adjacency_matrix = [int(graph.has_edge(nodes[i], nodes[j])) for i in range(len(nodes)) for j in range(len(nodes))]
+    var_index = {var: i for i, var in enumerate(var_names)}
+    node_index = {node: i for i, node in enumerate(nodes)}
 
     # Get lowest signed int64:
     LOWEST, HIGHEST = -2**63, 2**63 - 1
 
+    def clamp(bound):
+        return LOWEST if bound <= LOWEST else HIGHEST if bound >= HIGHEST else int(bound)
+
     bounds = {k: [LOWEST, HIGHEST] for k in var_names}
-    bounds.update(determine_variable_bounds_multipass(graph))
-
-    lower_bounds = [int(bounds[var][0]) if bounds[var][0] > float('-inf') else LOWEST for var in var_names]
-    upper_bounds = [int(bounds[var][1]) if bounds[var][1] < float('inf') else HIGHEST for var in var_names]
-
-    assert var_names[0] == list(fixed)[0]
-
-    the_workspace = init_search_workspace_python(
-        num_fixed_values,
-        num_free_values,
-        fixed_values,
-        num_nodes,
-        node_type_arr,
-        node_lhs_arr,
-        node_rhs_is_constant_arr,
-        node_rhs_arr,
-        adjacency_matrix,
-        limit,
-        lower_bounds,
-        upper_bounds,
+    bounds.update(determine_variable_bounds_multipass(graph, budget))
+
+    lower_bounds = [clamp(bounds[var][0]) for var in var_names]
+    upper_bounds = [clamp(bounds[var][1]) for var in var_names]
+
+    # Steps often share their bounds (see determine_edge_bounds); each is flattened once
+    edge_bounds = determine_edge_bounds(graph, bounds, budget)
+    flattened = {}
+
+    def flatten(step_bounds):
+        records = ([], [], [])
+        for var, (step_lower, step_upper) in step_bounds.items():
+            records[0].append(var_index[var])
+            records[1].append(clamp(step_lower))
+            records[2].append(clamp(step_upper))
+            if step_lower > step_upper:
+                break  # No value fits; one record rules the step out
+        return records
+
+    opcodes, lhs, rhs, rhs_is_constant = [], [], [], []
+    neighbor_offsets, neighbors = [0], []
+    edge_bound_offsets, edge_bound_vars, edge_bound_lower, edge_bound_upper = [0], [], [], []
+    for i, node in enumerate(nodes):
+        if budget is not None and i % BUDGET_CHECK_INTERVAL == 0:
+            budget.check()
+        opcode, lhs_var, operand, constant = compile_op(node.op)
+        opcodes.append(opcode)
+        lhs.append(var_index.get(lhs_var, 0))
+        rhs.append(var_index[operand] if not constant else operand or 0)
+        rhs_is_constant.append(constant)
+
+        for other in sorted(graph.adj[node], key=node_index.__getitem__):
+            neighbors.append(node_index[other])
+            step_bounds = edge_bounds.get((node, other))
+            if step_bounds is not None:
+                if id(step_bounds) not in flattened:
+                    flattened[id(step_bounds)] = flatten(step_bounds)
+                step_vars, step_lower, step_upper = flattened[id(step_bounds)]
+                edge_bound_vars.extend(step_vars)
+                edge_bound_lower.extend(step_lower)
+                edge_bound_upper.extend(step_upper)
+            edge_bound_offsets.append(len(edge_bound_vars))
+        neighbor_offsets.append(len(neighbors))
+
+    return WorkspaceArrays(
+        nodes=nodes,
+        var_names=var_names,
+        fixed_values=np.array(list(fixed.values()), dtype=np.int64),
+        opcodes=np.array(opcodes, dtype=np.uint8),
+        lhs=np.array(lhs, dtype=np.int64),
+        rhs=np.array(rhs, dtype=np.int64),
+        rhs_is_constant=np.array(rhs_is_constant, dtype=np.uint8),
+        neighbor_offsets=np.array(neighbor_offsets, dtype=np.int64),
+        neighbors=np.array(neighbors, dtype=np.int64),
+        lower_bounds=lower_bounds,
+        upper_bounds=upper_bounds,
+        edge_bound_offsets=np.array(edge_bound_offsets, dtype=np.int64),
+        edge_bound_vars=np.array(edge_bound_vars, dtype=np.int64),
+        edge_bound_lower=np.array(edge_bound_lower, dtype=np.int64),
+        edge_bound_upper=np.array(edge_bound_upper, dtype=np.int64),
     )
 
-    ans = None
-    while True:
-        ans = get_next_solution_python(the_workspace)  # TODO: Something with the weird array format
-        ans_len = ans[0]
-        if ans_len == -1:
-            break
 
-        final_values = ans[1:num_values + 1]
-        final_path = ans[num_values + 1:ans_len + num_values + 1]
+# Solutions per engine call when enumerating all of them
+SOLUTION_BATCH = 1024
 
-        final_values = dict(zip(var_names, final_values))
 
-        # Turn answer into a proper solution
-        solution = evaluate([nodes[i] for i in final_path], final_values)
+def step_edges(arrays: WorkspaceArrays) -> list[tuple[str, str]]:
+    """The edge each step of `arrays` takes, as sorted node names, indexed like `neighbors`."""
+    names = [node.name for node in arrays.nodes]
+    degrees = np.diff(arrays.neighbor_offsets)
+    return [
+        (u, v) if u <= v else (v, u)
+        for u, v in zip(np.repeat(names, degrees).tolist(), [names[j] for j in arrays.neighbors.tolist()])
+    ]
+
+
+def solution_records(packed, num_values: int):
+    """Yield views of the records packed by `next_solutions`.
+
+    Each record is [arr_size values0 ... values{N-1} node_id0 ... node_id{arr_size-1}].
+    """
+    offset = 0
+    while offset < len(packed):
+        end = offset + 1 + num_values + int(packed[offset])
+        yield packed[offset:end]
+        offset = end
+
+
+def unpack_solutions(packed, num_values: int):
+    """Yield (values, path) views of the records packed by `next_solutions`."""
+    for record in solution_records(packed, num_values):
+        yield record[1:1 + num_values], record[1 + num_values:]
+
+
+def count_solutions(packed, num_values: int) -> int:
+    return sum(1 for _ in solution_records(packed, num_values))
+
+
+def _add_counts(a: dict, b: dict) -> dict:
+    return {key: a.get(key, 0) + b.get(key, 0) for key in a | b}
+
+
+class WideSearch:
+    """The part of a strategy c search past the int64 range.
+
+    The engines set aside the states whose update leaves the int64 range
+    (see `get_overflowed_state_lowlevel`), and while they hold any, pause at
+    the end of each BFS layer. The search object then hands the new ones to
+    a `solver.BreadthFirstSearch`, which searches on from them in Python
+    ints through that layer before the engine goes deeper; so they are
+    searched in BFS order with the other states, and no solution is lost.
+
+    That search keeps its queue between runs, and in checkpoints (see
+    `dump`), so raising the limit resumes it, as it does the engine. The
+    limit counts the iterations of both.
+    """
+
+    def __init__(self, graph: nx.Graph, nodes: list):
+        self.nodes = nodes  # In the engine's order, which numbers them in checkpoints
+        self.bfs = BreadthFirstSearch(graph, SearchStats(), seeds=[], trace_layers=False)
+        self.taken = 0  # States the engine set aside that were queued here
+
+    @property
+    def stats(self) -> SearchStats:
+        return self.bfs.stats
+
+    @property
+    def iterations(self):
+        return self.bfs.iterations
+
+    @property
+    def stopped(self) -> bool:
+        """Whether the last run stopped short of its depth: at the limit, out of budget or cancelled."""
+        return self.stats.status not in (SearchStatus.RUNNING, SearchStatus.EXHAUSTED)
+
+    def engine_limit(self, limit):
+        """What `limit` leaves for the engine."""
+        return None if limit is None else limit - self.iterations
+
+    def status(self, engine: SearchStatus) -> SearchStatus:
+        """The status of the whole search, given the `engine`'s."""
+        wide = self.stats.status
+        if wide == SearchStatus.RUNNING and self.bfs.queue and engine in (SearchStatus.EXHAUSTED, SearchStatus.INCOMPLETE):
+            return SearchStatus.RUNNING  # Stopped at one of its solutions
+        if wide in (SearchStatus.RUNNING, SearchStatus.EXHAUSTED):
+            return engine  # INCOMPLETE stays so
+        return wide
+
+    def solutions(self, seeds, depth, limit, progress: ProgressHook | None, budget: SearchBudget | None):
+        """Queue `seeds`, the states set aside since the last run (see
+        `overflowed_states`), and yield the solutions found through `depth`
+        (None for all) within `limit` iterations."""
+        self.bfs.add_seeds(seeds)
+        self.taken += len(seeds)
+        yield from timed_search(self.bfs.run(math.inf if limit is None else limit, progress, budget, depth), self.stats)
+
+    def dump(self) -> bytes:
+        """The queue and counters, for a checkpoint; empty until the engine set a state aside."""
+        if not self.taken:
+            return b''
+        index = {node: i for i, node in enumerate(self.nodes)}
+        var_names = self.bfs.var_names
+        queue = [[[values[n] for n in var_names], [index[node] for node in path]] for values, path in self.bfs.paths()]
+        return json.dumps({'taken': self.taken, 'iterations': self.iterations, 'queue': queue}).encode()
+
+    def restore(self, dump: bytes) -> None:
+        """Continue from `dump` (see `dump`); the search must be fresh."""
+        if not dump:
+            return
+        var_names = self.bfs.var_names
+        try:
+            saved = json.loads(dump)
+            seeds = []
+            for values, path in saved['queue']:
+                if len(values) != len(var_names) or not all(0 <= i < len(self.nodes) for i in path):
+                    raise ValueError('state out of range')
+                seeds.append((dict(zip(var_names, values)), [self.nodes[i] for i in path]))
+            taken, iterations = int(saved['taken']), int(saved['iterations'])
+        except (ValueError, KeyError, TypeError) as e:
+            raise CheckpointError(f'corrupt checkpoint: {e}')
+        self.bfs.add_seeds(seeds)
+        self.taken = taken
+        self.bfs.iterations = self.stats.states_expanded = iterations
+
+    def add_to(self, stats: SearchStats) -> SearchStats:
+        """The engine's `stats` with those of this search added."""
+        if not self.taken:
+            return stats
+        more = self.stats
+        return replace(
+            stats,
+            states_expanded=stats.states_expanded + more.states_expanded,
+            pruned_by_bounds=stats.pruned_by_bounds + more.pruned_by_bounds,
+            pruned_by_backtracking=stats.pruned_by_backtracking + more.pruned_by_backtracking,
+            queue_high_water=max(stats.queue_high_water, more.queue_high_water),
+            bytes_allocated=stats.bytes_allocated + more.bytes_allocated,
+            node_expansions=_add_counts(stats.node_expansions, more.node_expansions),
+            edge_steps=_add_counts(stats.edge_steps, more.edge_steps),
+            preprocessing_time=stats.preprocessing_time + more.preprocessing_time,
+            search_time=stats.search_time + more.search_time,
+            verification_time=stats.verification_time + more.verification_time,
+            status=self.status(stats.status),
+        )
+
+
+class PythonSearch:
+    """A live search workspace for the NumPy fallback.
+
+    Same interface as `solver_bindings.CSearch`: raising the limit with
+    `set_limit` and iterating `solutions` again resumes the search where it
+    stopped instead of starting over.
+    """
+
+    def __init__(self, graph: nx.Graph, limit = None, dedup = False, verify = True, budget = None):
+        start = perf_counter()
+        arrays = workspace_arrays(graph, budget)
+        nodes, var_names = arrays.nodes, arrays.var_names
+
+        with trace_span("init_search_workspace_python"):
+            the_workspace = init_search_workspace_python(arrays, c_limit(limit))
+
+        if the_workspace is not None and dedup:
+            enable_dedup_python(the_workspace)
+
+        self.the_workspace = the_workspace
+        self.leftover = iter(())  # Solutions fetched in a batch but not yielded yet
+        self.verify = verify
+        self.nodes = nodes
+        self.steps = step_edges(arrays)
+        self.var_names = var_names
+        self.limit = limit
+        self.digest = program_digest(nodes, var_names, graph)
+        self.wide = WideSearch(graph, nodes)
+        self.timings = SearchStats(preprocessing_time=perf_counter() - start)  # See `stats`
+        self.set_budget(budget)
+
+    @property
+    def iterations(self):
+        if self.the_workspace is None:
+            return 0
+        return get_search_iterations_python(self.the_workspace) + self.wide.iterations
+
+    @property
+    def false_positive_rate(self):
+        """Chance that approximate dedup wrongly prunes the next new state."""
+        return 0.0  # Dedup is always exact here
+
+    def dedup_filter(self, rate=0.01):
+        """As in `CSearch`; always None, since dedup is always exact here."""
+        return None
+
+    @property
+    def overflowed(self):
+        """States the engine set aside because a value left the int64 range; see `WideSearch`."""
+        if self.the_workspace is None:
+            return 0
+        return len(self.the_workspace.overflowed)
+
+    def overflowed_states(self, start=0):
+        """Those states from the `start`-th on, as `solver.BreadthFirstSearch` seeds."""
+        seeds = []
+        for i in range(start, self.overflowed):
+            values, path = get_overflowed_state_python(self.the_workspace, i)
+            seeds.append((dict(zip(self.var_names, values)), [self.nodes[j] for j in path]))
+        return seeds
+
+    @property
+    def stats(self):
+        """A `SearchStats` snapshot of the search so far."""
+        ws = self.the_workspace
+        if ws is None:
+            return replace(self.timings)
+        return self.wide.add_to(replace(
+            self.timings,
+            states_expanded=ws.iterations,
+            pruned_by_bounds=ws.pruned_by_bounds,
+            pruned_by_backtracking=ws.pruned_by_backtracking,
+            queue_high_water=ws.queue_high_water,
+            bytes_allocated=ws.bytes_allocated,
+            node_expansions=node_histogram(self.nodes, ws.node_expansions),
+            edge_steps=edge_histogram(self.steps, ws.edge_steps),
+            status=ws.status,
+        ))
+
+    @property
+    def status(self):
+        """Why the search last stopped, a `SearchStatus`."""
+        if self.the_workspace is None:
+            return SearchStatus.EXHAUSTED
+        return self.wide.status(self.the_workspace.status)
+
+    @property
+    def progress(self):
+        """The `ProgressHook` given to `set_progress`, or None."""
+        if self.the_workspace is None:
+            return None
+        return self.the_workspace.progress
+
+    @property
+    def limit_reached(self):
+        """Whether the last search stopped at the limit (so raising it may help)."""
+        return self.status == SearchStatus.LIMIT_REACHED
+
+    def set_limit(self, limit):
+        self.limit = limit
+        if self.the_workspace is not None:
+            set_search_limit_python(self.the_workspace, c_limit(limit))
+
+    def set_progress(self, progress: ProgressHook | None):
+        """Report progress to `progress` while searching; None stops reporting."""
+        if self.the_workspace is not None:
+            set_progress_callback_python(self.the_workspace, progress)
+
+    def set_budget(self, budget: SearchBudget | None):
+        """Stop searching when `budget` runs out; None removes it."""
+        if self.the_workspace is not None:
+            set_search_budget_python(self.the_workspace, budget)
+
+    def save(self, path):
+        """Write a checkpoint of the search to `path`."""
+        with open(temporary_path(path), 'wb') as f:
+            write_checkpoint_header(f, self.digest, self.wide.dump())
+            save_search_workspace_python(self.the_workspace, f)
+        commit_checkpoint(path)
+
+    def load(self, path):
+        """Continue from a checkpoint of a search over the same program."""
+        offset, wide = read_checkpoint_header(path, self.digest)
+        self.leftover = iter(())
+        self.wide = WideSearch(self.wide.bfs.graph, self.nodes)
+        self.wide.restore(wide)
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            load_search_workspace_python(self.the_workspace, f)
+
+    def next_solutions(self, max_solutions=SOLUTION_BATCH):
+        """Search for up to `max_solutions` more solutions, packed as in `CSearch.next_solutions`."""
+        if self.the_workspace is None:
+            return np.zeros((0,), dtype=np.int64)
+
+        start = perf_counter()
+        resume_layers()
+        try:
+            with trace_span("search", iterations=self.iterations):
+                records = get_next_solutions_python(self.the_workspace, max_solutions)
+        except MemoryError:
+            self.the_workspace.status = SearchStatus.OUT_OF_MEMORY
+            records = []
+        finally:
+            pause_layers()
+            self.timings.search_time += perf_counter() - start
+        if not records:
+            return np.zeros((0,), dtype=np.int64)
+        return np.concatenate(records)
+
+    def record_stdout(self, record):
+        """The stdout of a packed solution record."""
+        num_values = len(self.var_names)
+        path = [self.nodes[i] for i in record[1 + num_values:]]
+        return partial_evaluate(path, dict(zip(self.var_names, record[1:1 + num_values])))[1]
+
+    def solutions(self, batch_size=1):
+        if self.the_workspace is None:
+            return
+
+        ws = self.the_workspace
+        nodes = self.nodes
+        var_names = self.var_names
+        num_values = len(var_names)
+
+        while True:
+            if ws.overflowed:
+                # Search the states set aside through the last layer the engine finished (see WideSearch)
+                finished = ws.status in (SearchStatus.EXHAUSTED, SearchStatus.INCOMPLETE)
+                depth = None if finished else get_search_depth_python(ws)
+                remaining = None if self.limit is None else max(0, self.limit - ws.iterations)
+                yield from self.wide.solutions(self.overflowed_states(self.wide.taken), depth, remaining, ws.progress, ws.budget)
+                if finished or self.wide.stopped:
+                    return
+                set_search_limit_python(ws, c_limit(self.wide.engine_limit(self.limit)))
+
+            stopped = False
+            while True:
+                for record in self.leftover:
+                    if not self.verify:
+                        yield PackedSolution(record, self)  # Path and stdout are resolved when first used
+                        continue
+
+                    final_values = dict(zip(var_names, record[1:1 + num_values]))
+                    final_path = [nodes[i] for i in record[1 + num_values:]]
+
+                    # Turn answer into a proper solution
+                    start = perf_counter()
+                    with trace_span("verify"):
+                        solution = evaluate(final_path, final_values)
+                    self.timings.verification_time += perf_counter() - start
+
+                    if solution is None:
+                        raise Exception('BFS solver thought an invalid solution was valid')
+
+                    yield solution
+
+                if stopped:
+                    break
+                try:
+                    packed = self.next_solutions(batch_size)
+                except BaseException:
+                    cancel_search_python(ws)  # Interrupted, or the progress hook raised
+                    raise
+                count = count_solutions(packed, num_values)
+                self.leftover = solution_records(packed, num_values)
+                stopped = count < batch_size  # Limit, end of search or end of a layer (see `status`)
+
+            # Paused at the end of a layer, or out of states: on to the states set aside
+            if not ws.overflowed or ws.status not in (SearchStatus.RUNNING, SearchStatus.EXHAUSTED, SearchStatus.INCOMPLETE):
+                return
+
+
+def make_search_c(graph: nx.Graph, limit = None, spill_dir = None, dedup_layers = False, dedup = False, dedup_mem = None, verify = True, budget = None):
+    """Set up a resumable BFS over `graph`, in C if the extension is built.
+
+    `spill_dir` and `dedup_layers` select the disk-backed frontier of the C
+    engine; the Python fallback ignores them. `dedup` never enqueues the same
+    state twice (see `enable_dedup_python`); `dedup_mem` does so approximately
+    in that many bytes, which the fallback turns into exact dedup. With
+    `verify` false, solutions are not re-checked before they are yielded.
+
+    `budget`, a `SearchBudget`, covers the preprocessing as well as the
+    search; preprocessing past its deadline raises `BudgetExceeded`.
+    """
+    try:
+        from conlog.solver_bindings import CSearch
 
-        if solution is None:
-            raise Exception('BFS solver thought an invalid solution was valid')
+        return CSearch(graph, limit, spill_dir=spill_dir, dedup_layers=dedup_layers, dedup=dedup, dedup_mem=dedup_mem, verify=verify, budget=budget)
+    except ImportError as e:
+        print('Failed to import cython module (%s). Falling back to python' % repr(e))
+
+    if spill_dir is not None:
+        print('Spilling the frontier to disk needs the cython module; keeping it in memory')
+    if dedup_mem is not None and not dedup:
+        print('Approximate dedup needs the cython module; deduplicating exactly')
+        dedup = True
+    return PythonSearch(graph, limit, dedup=dedup, verify=verify, budget=budget)
 
-        # Free the malloced ans
-        # free(ans)
-        del ans
 
-        yield solution
+def solve_graph_bfs_c(graph: nx.Graph, limit = None):
+    yield from make_search_c(graph, limit).solutions()
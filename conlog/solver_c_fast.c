@@ -1,123 +1,1470 @@
 // Solve the conlog grid using BFS --  C
 
+#include <fcntl.h>
+#include <math.h>
 #include <stdio.h>
 #include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <unistd.h>
+#include <sys/mman.h>
 #include "solver_c_fast.h"
 
 
 
+static uint64_t monotonic_ns(void) {
+    struct timespec now;
+    clock_gettime(CLOCK_MONOTONIC, &now);
+    return (uint64_t) now.tv_sec * 1000000000 + now.tv_nsec;
+}
+
+
+
+static uint8_t width_for_value(int64_t value) {
+    // Bytes needed to store `value`
+    if ((value >= INT8_MIN) && (value <= INT8_MAX)) {
+        return 1;
+    }
+    if ((value >= INT16_MIN) && (value <= INT16_MAX)) {
+        return 2;
+    }
+    if ((value >= INT32_MIN) && (value <= INT32_MAX)) {
+        return 4;
+    }
+    return 8;
+}
+
+
+
+static inline void load_values(uint8_t width, const void * src, int64_t * dst, uint64_t num_values) {
+    switch (width) {
+        case 1:
+            for (uint64_t i=0; i < num_values; i++) {
+                dst[i] = ((const int8_t *) src)[i];
+            }
+            break;
+        case 2:
+            for (uint64_t i=0; i < num_values; i++) {
+                dst[i] = ((const int16_t *) src)[i];
+            }
+            break;
+        case 4:
+            for (uint64_t i=0; i < num_values; i++) {
+                dst[i] = ((const int32_t *) src)[i];
+            }
+            break;
+        default:
+            memcpy(dst, src, sizeof(int64_t) * num_values);
+    }
+}
+
+
+
+static inline uint8_t store_values(uint8_t width, const int64_t * src, void * dst, uint64_t num_values) {
+    // Returns 0 (overflow) if some value does not fit in `width` bytes; the caller must widen and retry
+    switch (width) {
+        case 1:
+            for (uint64_t i=0; i < num_values; i++) {
+                if ((src[i] < INT8_MIN) || (src[i] > INT8_MAX)) {
+                    return 0;
+                }
+                ((int8_t *) dst)[i] = src[i];
+            }
+            break;
+        case 2:
+            for (uint64_t i=0; i < num_values; i++) {
+                if ((src[i] < INT16_MIN) || (src[i] > INT16_MAX)) {
+                    return 0;
+                }
+                ((int16_t *) dst)[i] = src[i];
+            }
+            break;
+        case 4:
+            for (uint64_t i=0; i < num_values; i++) {
+                if ((src[i] < INT32_MIN) || (src[i] > INT32_MAX)) {
+                    return 0;
+                }
+                ((int32_t *) dst)[i] = src[i];
+            }
+            break;
+        default:
+            memcpy(dst, src, sizeof(int64_t) * num_values);
+    }
+    return 1;
+}
+
+
+
+static void init_state_keys(CSearchWorkspace * the_workspace) {
+    /**
+     * Doc: Chooses the state key layout. A state is (node, last node, values). When every variable has
+     * finite bounds containing 0 (the terminal state), the key bit-packs
+     *
+     *   [node_i | last node_i | values0 - lower0 | values1 - lower1 | ...]
+     *
+     * into one or two words, using just enough bits per field. Otherwise the key is the raw fields,
+     * one word each. Either way keys are compared and hashed as plain words.
+     */
+
+    uint64_t num_values = the_workspace->num_values;
+    int64_t * lower_bounds = the_workspace->lower_bounds;
+    int64_t * upper_bounds = the_workspace->upper_bounds;
+
+    // Node ids and "no last node" (num_nodes)
+    uint8_t node_bits = 64 - __builtin_clzll(the_workspace->num_nodes | 1);
+    uint64_t total_bits = 2 * node_bits;
+
+    the_workspace->key_value_bits = malloc(num_values + 1);
+    uint8_t packed = 1;
+    for (uint64_t i=0; i < num_values; i++) {
+        if ((lower_bounds[i] == INT64_MIN) || (upper_bounds[i] == INT64_MAX) || (lower_bounds[i] > 0) || (upper_bounds[i] < 0)) {
+            packed = 0;
+            break;
+        }
+        uint64_t range = (uint64_t) upper_bounds[i] - (uint64_t) lower_bounds[i];
+        the_workspace->key_value_bits[i] = (range == 0) ? 0 : 64 - __builtin_clzll(range);
+        total_bits += the_workspace->key_value_bits[i];
+    }
+    if (total_bits > 128) {
+        packed = 0;
+    }
+
+    the_workspace->key_node_bits = node_bits;
+    the_workspace->key_packed = packed;
+    if (packed) {
+        the_workspace->key_words = (total_bits > 64) ? 2 : 1;
+    } else {
+        the_workspace->key_words = 2 + num_values;
+    }
+}
+
+
+
+static inline void encode_state_key(
+    CSearchWorkspace * the_workspace,
+    uint64_t node_i,
+    int64_t last_node_i,  // -1 for the terminal state
+    const int64_t * values,
+    uint64_t * key  // uint64_t[key_words]
+) {
+    uint64_t num_values = the_workspace->num_values;
+
+    if (!the_workspace->key_packed) {
+        key[0] = node_i;
+        key[1] = last_node_i;
+        memcpy(key + 2, values, sizeof(int64_t) * num_values);
+        return;
+    }
+
+    uint8_t node_bits = the_workspace->key_node_bits;
+    unsigned __int128 packed = node_i;
+    packed |= ((unsigned __int128) ((last_node_i < 0) ? the_workspace->num_nodes : (uint64_t) last_node_i)) << node_bits;
+    uint64_t shift = 2 * node_bits;
+    for (uint64_t i=0; i < num_values; i++) {
+        uint8_t bits = the_workspace->key_value_bits[i];
+        if (bits == 0) {
+            continue;  // Only one possible value
+        }
+        packed |= ((unsigned __int128) ((uint64_t) values[i] - (uint64_t) the_workspace->lower_bounds[i])) << shift;
+        shift += bits;
+    }
+
+    key[0] = (uint64_t) packed;
+    if (the_workspace->key_words == 2) {
+        key[1] = (uint64_t) (packed >> 64);
+    }
+}
+
+
+
+static inline void decode_state_key(
+    CSearchWorkspace * the_workspace,
+    const uint64_t * key,
+    int64_t * values  // int64_t[num_values]; the nodes are not decoded
+) {
+    uint64_t num_values = the_workspace->num_values;
+
+    if (!the_workspace->key_packed) {
+        memcpy(values, key + 2, sizeof(int64_t) * num_values);
+        return;
+    }
+
+    unsigned __int128 packed = key[0];
+    if (the_workspace->key_words == 2) {
+        packed |= ((unsigned __int128) key[1]) << 64;
+    }
+    uint64_t shift = 2 * the_workspace->key_node_bits;
+    for (uint64_t i=0; i < num_values; i++) {
+        uint8_t bits = the_workspace->key_value_bits[i];
+        uint64_t offset = 0;
+        if (bits > 0) {
+            offset = (uint64_t) ((packed >> shift) & ((((unsigned __int128) 1) << bits) - 1));
+            shift += bits;
+        }
+        values[i] = (int64_t) ((uint64_t) the_workspace->lower_bounds[i] + offset);
+    }
+}
+
+
+
+static inline int64_t last_node_of(CSearchState * state) {
+    return (state->parent_search_state == NULL) ? -1 : (int64_t) state->parent_search_state->node->node_i;
+}
+
+
+
+static inline uint64_t hash_state_key(const uint64_t * key, uint64_t key_words) {
+    // splitmix64 finalizer over the words
+    uint64_t h = 0x9E3779B97F4A7C15ULL;
+    for (uint64_t i=0; i < key_words; i++) {
+        h ^= key[i];
+        h ^= h >> 30;
+        h *= 0xBF58476D1CE4E5B9ULL;
+        h ^= h >> 27;
+        h *= 0x94D049BB133111EBULL;
+        h ^= h >> 31;
+    }
+    return h;
+}
+
+
+
+static CVisitedSet * new_visited_set(uint64_t key_words, uint64_t capacity) {
+    // `capacity` must be a power of two
+    CVisitedSet * visited = malloc(sizeof(CVisitedSet));
+    visited->keys = malloc(sizeof(uint64_t) * key_words * capacity);
+    visited->occupied = calloc(capacity, 1);
+    if ((visited->keys == NULL) || (visited->occupied == NULL)) {
+        free(visited->keys);
+        free(visited->occupied);
+        free(visited);
+        return NULL;
+    }
+    visited->key_words = key_words;
+    visited->capacity = capacity;
+    visited->count = 0;
+    return visited;
+}
+
+
+
+static void free_visited_set(CVisitedSet * visited) {
+    free(visited->keys);
+    free(visited->occupied);
+    free(visited);
+}
+
+
+
+static uint8_t visited_set_insert(CVisitedSet * visited, const uint64_t * key);
+
+static uint8_t grow_visited_set(CVisitedSet * visited) {
+    CVisitedSet * grown = new_visited_set(visited->key_words, 2 * visited->capacity);
+    if (grown == NULL) {
+        return 0;
+    }
+    for (uint64_t slot=0; slot < visited->capacity; slot++) {
+        if (visited->occupied[slot]) {
+            visited_set_insert(grown, visited->keys + slot * visited->key_words);
+        }
+    }
+    free(visited->keys);
+    free(visited->occupied);
+    *visited = *grown;
+    free(grown);
+    return 1;
+}
+
+
+
+static uint8_t visited_set_reserve(CVisitedSet * visited, uint64_t n) {
+    // Makes room for `n` more keys, keeping a slot free so probing ends. Returns 0 if out of memory
+    while (visited->count + n >= visited->capacity) {
+        if (!grow_visited_set(visited)) {
+            return 0;
+        }
+    }
+    return 1;
+}
+
+
+
+static uint8_t visited_set_insert(CVisitedSet * visited, const uint64_t * key) {
+    // Returns 1 if `key` was new (and is now in the set), 0 if it had been seen already. There must be
+    // room for it; see visited_set_reserve
+    uint64_t key_words = visited->key_words;
+    uint64_t mask = visited->capacity - 1;
+    uint64_t slot = hash_state_key(key, key_words) & mask;
+
+    while (visited->occupied[slot]) {
+        if (memcmp(visited->keys + slot * key_words, key, sizeof(uint64_t) * key_words) == 0) {
+            return 0;
+        }
+        slot = (slot + 1) & mask;  // Linear probing
+    }
+
+    memcpy(visited->keys + slot * key_words, key, sizeof(uint64_t) * key_words);
+    visited->occupied[slot] = 1;
+    visited->count++;
+
+    if (2 * visited->count > visited->capacity) {
+        grow_visited_set(visited);  // Out of memory carries on with a fuller table, while there is room
+    }
+    return 1;
+}
+
+
+
+static CBloomFilter * new_bloom_filter(uint64_t mem_bytes) {
+    // Rounded down to a power of two bits, at least one word
+    uint64_t num_bits = 64;
+    while ((num_bits << 1) <= 8 * mem_bytes) {
+        num_bits <<= 1;
+    }
+
+    CBloomFilter * bloom = malloc(sizeof(CBloomFilter));
+    // Untouched pages of an anonymous mapping cost nothing, so a large budget is only paid for as it fills
+    bloom->bits = mmap(NULL, num_bits / 8, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS | MAP_NORESERVE, -1, 0);
+    if (bloom->bits == MAP_FAILED) {
+        free(bloom);
+        return NULL;
+    }
+    bloom->num_bits = num_bits;
+    bloom->num_hashes = BLOOM_NUM_HASHES;
+    bloom->num_set = 0;
+    bloom->count = 0;
+    return bloom;
+}
+
+
+
+static void free_bloom_filter(CBloomFilter * bloom) {
+    munmap(bloom->bits, bloom->num_bits / 8);
+    free(bloom);
+}
+
+
+
+static uint8_t bloom_filter_insert(CBloomFilter * bloom, const uint64_t * key, uint64_t key_words) {
+    /**
+     * Doc: Returns 1 if `key` was new (and is now in the filter), 0 if it was probably seen already.
+     * A false 0 prunes a state that was never explored; the bits are picked by double hashing.
+     */
+
+    uint64_t h1 = hash_state_key(key, key_words);
+    uint64_t h2 = (h1 * 0xD6E8FEB86659FD93ULL) ^ (h1 >> 32);
+    h2 |= 1;  // Odd, so the probes differ modulo a power of two
+    uint64_t mask = bloom->num_bits - 1;
+
+    uint8_t is_new = 0;
+    for (uint8_t i=0; i < bloom->num_hashes; i++) {
+        uint64_t bit = (h1 + i * h2) & mask;
+        uint64_t word_mask = ((uint64_t) 1) << (bit & 63);
+        if (!(bloom->bits[bit >> 6] & word_mask)) {
+            bloom->bits[bit >> 6] |= word_mask;
+            bloom->num_set++;
+            is_new = 1;
+        }
+    }
+    bloom->count += is_new;
+    return is_new;
+}
+
+
+
+static double bloom_filter_false_positive_rate(CBloomFilter * bloom) {
+    // Chance that a new key finds all its bits set already
+    double fill = (double) bloom->num_set / (double) bloom->num_bits;
+    double rate = 1.0;
+    for (uint8_t i=0; i < bloom->num_hashes; i++) {
+        rate *= fill;
+    }
+    return rate;
+}
+
+
+
+static inline void * state_values(CSearchWorkspace * the_workspace, CSearchState * state) {
+    // Where the values of `state` are stored: in its slot of the value arena, past any spill header
+    return the_workspace->value_arena + (state - the_workspace->search_queue) * the_workspace->value_stride + the_workspace->value_offset;
+}
+
+
+
+static uint8_t store_state_values(CSearchWorkspace * the_workspace, CSearchState * state, const int64_t * values) {
+    /**
+     * Doc: Stores `values` in the arena slot of `state`, whose node and parent are already set.
+     * Returns 0 (overflow) if they do not fit the current width; widen and retry.
+     */
+
+    uint64_t position = state - the_workspace->search_queue;
+    uint8_t * slot = the_workspace->value_arena + position * the_workspace->value_stride;
+
+    if (the_workspace->spill_fd >= 0) {
+        // Spill mode: the values sit behind a [parent_i node_i key...] header used to sort layers
+        int64_t * record = (int64_t *) slot;
+        record[0] = (state->parent_search_state == NULL) ? -1 : (state->parent_search_state - the_workspace->search_queue);
+        record[1] = state->node->node_i;
+        encode_state_key(the_workspace, state->node->node_i, last_node_of(state), values, (uint64_t *) (record + 2));
+    }
+
+    return store_values(the_workspace->value_width, values, slot + the_workspace->value_offset, the_workspace->num_values);
+}
+
+
+
+static void release_popped_values(CSearchWorkspace * the_workspace, CSearchState * search_queue_next_to_pop) {
+    // Slots of popped states are never read again; let the kernel drop their pages
+    uint64_t done_bytes = (search_queue_next_to_pop - the_workspace->search_queue) * the_workspace->value_stride;
+    uint64_t page = sysconf(_SC_PAGESIZE);
+    madvise(the_workspace->value_arena, (done_bytes / page) * page, MADV_DONTNEED);
+#ifdef FALLOC_FL_PUNCH_HOLE
+    if (the_workspace->spill_fd >= 0) {
+        // Dropping the pages of a file mapping keeps its blocks; give them back to the disk too, so
+        // the file only takes up the frontier
+        fallocate(the_workspace->spill_fd, FALLOC_FL_PUNCH_HOLE | FALLOC_FL_KEEP_SIZE, 0, (done_bytes / page) * page);
+    }
+#endif
+}
+
+
+
+static void * reserve_slots(
+    uint64_t * num_slots,  // Wanted; set to the number mapped
+    uint64_t slot_bytes,
+    uint64_t min_slots,
+    int fd  // -1 for anonymous memory
+) {
+    /**
+     * Doc: Maps address space for `num_slots` slots, halving them down to `min_slots` until the system
+     * allows it. Untouched pages cost nothing, so this reserves room to grow into. MAP_FAILED on failure.
+     */
+    while (1) {
+        uint64_t bytes = (*num_slots) * slot_bytes;
+        if (bytes == 0) {
+            bytes = 1;  // No values at all; the slots are empty
+        }
+        void * mapped;
+        if (fd >= 0) {
+            mapped = mmap(NULL, bytes, PROT_READ | PROT_WRITE, MAP_SHARED, fd, 0);
+        } else {
+            mapped = mmap(NULL, bytes, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS | MAP_NORESERVE, -1, 0);
+        }
+        if ((mapped != MAP_FAILED) || (*num_slots / 2 < min_slots)) {
+            return mapped;
+        }
+        *num_slots /= 2;
+    }
+}
+
+
+
+static inline uint64_t spill_file_size(uint64_t needed) {
+    // Rounded up to whole steps of growth, so the file is only extended every SPILL_GROWTH_BYTES
+    return (needed / SPILL_GROWTH_BYTES + 1) * SPILL_GROWTH_BYTES;
+}
+
+
+
+static int grow_spill_file(CSearchWorkspace * the_workspace, uint64_t num_slots) {
+    /**
+     * Doc: Makes the spill file cover the first `num_slots` slots of the value arena. Returns 0 on
+     * success. The blocks are allocated here, not when the mapping is first written: a full disk would
+     * then raise SIGBUS, where this lets the search stop out of memory.
+     */
+    uint64_t needed = num_slots * the_workspace->value_stride;
+    if (needed <= the_workspace->spill_file_bytes) {
+        return 0;
+    }
+    uint64_t bytes = spill_file_size(needed);
+    if (posix_fallocate(the_workspace->spill_fd, the_workspace->spill_file_bytes, bytes - the_workspace->spill_file_bytes) != 0) {
+        return 1;
+    }
+    the_workspace->spill_file_bytes = bytes;
+    return 0;
+}
+
+
+
+static int remap_value_arena(
+    CSearchWorkspace * the_workspace,
+    uint8_t value_width,
+    int spill_fd,  // -1 for anonymous memory
+    CSearchState * frontier_start,  // States in [frontier_start, frontier_stop) are re-encoded into the new arena
+    CSearchState * frontier_stop
+) {
+    /**
+     * Doc: Replaces the value arena with one of the given width and backing (used to widen the values,
+     * and to switch to spill mode). Returns 0 on success, leaving the old arena in place on failure.
+     * The arena has a slot for every queue slot; if the system can not map that much, the queue is
+     * cut down to fit. In spill mode the file only covers the frontier, and grows with the queue.
+     */
+
+    uint64_t num_values = the_workspace->num_values;
+    uint64_t value_offset = (spill_fd >= 0) ? sizeof(int64_t) * (2 + the_workspace->key_words) : 0;
+    uint64_t value_stride = value_offset + value_width * num_values;
+    uint64_t used_slots = ((frontier_stop == NULL) ? 1 : (uint64_t) (frontier_stop - the_workspace->search_queue)) + the_workspace->max_degree + 1;
+
+    uint64_t spill_file_bytes = 0;
+    if (spill_fd >= 0) {
+        spill_file_bytes = spill_file_size(used_slots * value_stride);
+        if (posix_fallocate(spill_fd, 0, spill_file_bytes) != 0) {  // See grow_spill_file
+            return 1;
+        }
+    }
+    uint64_t num_slots = the_workspace->queue_capacity;
+    uint8_t * arena = reserve_slots(&num_slots, value_stride, used_slots, spill_fd);
+    if (arena == MAP_FAILED) {
+        return 1;
+    }
+    uint64_t arena_bytes = (value_stride == 0) ? 1 : num_slots * value_stride;
+    madvise(arena, arena_bytes, MADV_SEQUENTIAL);
+    if (num_slots < the_workspace->queue_capacity) {
+        munmap(the_workspace->search_queue + num_slots, sizeof(CSearchState) * (the_workspace->queue_capacity - num_slots));
+        the_workspace->queue_capacity = num_slots;
+    }
+
+    uint8_t * old_arena = the_workspace->value_arena;
+    uint64_t old_arena_bytes = the_workspace->value_arena_bytes;
+    uint64_t old_stride = the_workspace->value_stride;
+    uint64_t old_offset = the_workspace->value_offset;
+    uint8_t old_width = the_workspace->value_width;
+    int old_spill_fd = the_workspace->spill_fd;
+
+    the_workspace->value_arena = arena;
+    the_workspace->value_arena_bytes = arena_bytes;
+    the_workspace->value_stride = value_stride;
+    the_workspace->value_offset = value_offset;
+    the_workspace->value_width = value_width;
+    the_workspace->spill_fd = spill_fd;
+    the_workspace->spill_file_bytes = spill_file_bytes;
+
+    int64_t values[num_values];
+    for (CSearchState * state = frontier_start; state < frontier_stop; state++) {
+        load_values(old_width, old_arena + (state - the_workspace->search_queue) * old_stride + old_offset, values, num_values);
+        store_state_values(the_workspace, state, values);
+    }
+
+    if (old_arena != NULL) {
+        munmap(old_arena, old_arena_bytes);
+    }
+    if ((old_spill_fd >= 0) && (old_spill_fd != spill_fd)) {
+        close(old_spill_fd);
+    }
+    return 0;
+}
+
+
+
+static int widen_value_arena(
+    CSearchWorkspace * the_workspace,
+    const int64_t * values,  // The values that did not fit
+    CSearchState * frontier_start,
+    CSearchState * frontier_stop
+) {
+    uint8_t value_width = the_workspace->value_width;
+    for (uint64_t i=0; i < the_workspace->num_values; i++) {
+        uint8_t needed = width_for_value(values[i]);
+        if (needed > value_width) {
+            value_width = needed;
+        }
+    }
+    return remap_value_arena(the_workspace, value_width, the_workspace->spill_fd, frontier_start, frontier_stop);
+}
+
+
+
 static void * init_search_workspace_lowlevel(
     uint64_t num_fixed_values,
     uint64_t num_free_values,
     int64_t * fixed_values,
     uint64_t num_nodes,
 
-    uint8_t * node_type_arr,
-    int64_t * node_lhs_arr,  // Index of the lhs operand
-    uint8_t * node_rhs_is_constant_arr,  // Whether rhs is a constant or an index (1 or 0)
-    int64_t * node_rhs_arr,  // Index/value of the rhs operand
+    uint8_t * node_type_arr,
+    int64_t * node_lhs_arr,  // Index of the lhs operand
+    uint8_t * node_rhs_is_constant_arr,  // Whether rhs is a constant or an index (1 or 0)
+    int64_t * node_rhs_arr,  // Index/value of the rhs operand
+
+    uint64_t * neighbor_offsets,  // uint64_t[num_nodes + 1]; the neighbors of node i are neighbors[neighbor_offsets[i]:neighbor_offsets[i + 1]]
+    uint64_t * neighbors,  // uint64_t[num_edges], each node's in node order
+    uint64_t limit,
+    int64_t * lower_bounds,  // lower_bounds[num_values]
+    int64_t * upper_bounds,  // upper_bounds[num_values]
+    uint64_t * edge_bound_offsets,  // uint64_t[num_edges + 1]; the bounds of step j are records edge_bound_offsets[j] to edge_bound_offsets[j + 1]
+    uint64_t * edge_bound_vars,  // uint64_t[num_edge_bounds]: the value each record bounds
+    int64_t * edge_bound_lower,  // int64_t[num_edge_bounds]
+    int64_t * edge_bound_upper  // int64_t[num_edge_bounds]
+)
+{
+    /**
+     * Doc: The arrays are built by solver_c.workspace_arrays. Edge (step) j goes to neighbors[j]. A
+     * successor state reached by a step is only enqueued if its values lie within the bounds of that
+     * step; see elegant.determine_edge_bounds. Only steps tighter than the global bounds have records.
+     */
+
+    uint64_t num_values = num_fixed_values + num_free_values;
+    CSearchWorkspace * the_workspace = malloc(sizeof(CSearchWorkspace));
+
+    // Make the node array
+    uint64_t max_degree = 0;
+    CNode * node_arr = malloc(sizeof(CNode) * num_nodes);
+    for (uint64_t i=0; i < num_nodes; i++) {
+        // Basics
+        node_arr[i].node_type = node_type_arr[i];
+        node_arr[i].node_i = i;
+        node_arr[i].lhs = node_lhs_arr[i];
+        node_arr[i].rhs_is_constant = node_rhs_is_constant_arr[i];
+        node_arr[i].rhs = node_rhs_arr[i];
+        node_arr[i].first_edge = neighbor_offsets[i];
+        node_arr[i].num_neighbors = neighbor_offsets[i + 1] - neighbor_offsets[i];
+        if (node_arr[i].num_neighbors > max_degree) {
+            max_degree = node_arr[i].num_neighbors;
+        }
+    }
+
+    uint64_t num_edges = neighbor_offsets[num_nodes];
+    CNode ** neighbor_arr = malloc(sizeof(CNode *) * num_edges);
+    for (uint64_t j=0; j < num_edges; j++) {
+        neighbor_arr[j] = &(node_arr[neighbors[j]]);
+    }
+
+    if (max_degree >= MAX_QUEUE_LENGTH / 2) {
+        printf("Degree too high\n");
+        return NULL;
+    }
+
+    // Put the first node on the search queue; the terminal node
+    uint8_t found_it = 0;
+    for (uint64_t i=0; i < num_nodes; i++) {
+        if (node_arr[i].node_type == Terminal) {
+            found_it = 1;
+            the_workspace->terminal_node = &(node_arr[i]);
+        }
+    }
+    if (!found_it) {
+        printf("Did not find terminal node\n");
+        return NULL;
+    }
+
+    // Store values as narrow as the known bounds, fixed values and constants allow. Anything
+    // that turns out not to fit later widens the storage (see widen_value_arena)
+    uint8_t value_width = 1;
+    for (uint64_t i=0; i<num_values; i++) {
+        if ((lower_bounds[i] != INT64_MIN) && (width_for_value(lower_bounds[i]) > value_width)) {
+            value_width = width_for_value(lower_bounds[i]);
+        }
+        if ((upper_bounds[i] != INT64_MAX) && (width_for_value(upper_bounds[i]) > value_width)) {
+            value_width = width_for_value(upper_bounds[i]);
+        }
+    }
+    for (uint64_t i=0; i<num_fixed_values; i++) {
+        if (width_for_value(fixed_values[i]) > value_width) {
+            value_width = width_for_value(fixed_values[i]);
+        }
+    }
+    for (uint64_t i=0; i < num_nodes; i++) {
+        if (node_arr[i].rhs_is_constant && (width_for_value(node_arr[i].rhs) > value_width)) {
+            value_width = width_for_value(node_arr[i].rhs);
+        }
+    }
+
+    the_workspace->node_arr = node_arr;
+    the_workspace->neighbor_arr = neighbor_arr;
+    the_workspace->max_degree = max_degree;
+    the_workspace->num_nodes = num_nodes;
+    the_workspace->num_free_values = num_free_values;
+    the_workspace->num_fixed_values = num_fixed_values;
+    the_workspace->num_values = num_values;
+    the_workspace->fixed_values = malloc(sizeof(uint64_t) * num_fixed_values);
+    for (uint64_t i=0; i<num_fixed_values; i++) {
+        the_workspace->fixed_values[i] = fixed_values[i];
+    }
+    the_workspace->iterations = 0;
+    the_workspace->limit = limit;
+    // Copy the bounds so the workspace outlives the caller's arrays
+    the_workspace->lower_bounds = malloc(sizeof(int64_t) * num_values);
+    the_workspace->upper_bounds = malloc(sizeof(int64_t) * num_values);
+    for (uint64_t i=0; i<num_values; i++) {
+        the_workspace->lower_bounds[i] = lower_bounds[i];
+        the_workspace->upper_bounds[i] = upper_bounds[i];
+    }
+    the_workspace->num_edges = num_edges;
+    uint64_t num_edge_bounds = edge_bound_offsets[num_edges];
+    the_workspace->edge_bound_offsets = malloc(sizeof(uint64_t) * (num_edges + 1));
+    the_workspace->edge_bound_vars = malloc(sizeof(uint64_t) * num_edge_bounds);
+    the_workspace->edge_bound_lower = malloc(sizeof(int64_t) * num_edge_bounds);
+    the_workspace->edge_bound_upper = malloc(sizeof(int64_t) * num_edge_bounds);
+    memcpy(the_workspace->edge_bound_offsets, edge_bound_offsets, sizeof(uint64_t) * (num_edges + 1));
+    memcpy(the_workspace->edge_bound_vars, edge_bound_vars, sizeof(uint64_t) * num_edge_bounds);
+    memcpy(the_workspace->edge_bound_lower, edge_bound_lower, sizeof(int64_t) * num_edge_bounds);
+    memcpy(the_workspace->edge_bound_upper, edge_bound_upper, sizeof(int64_t) * num_edge_bounds);
+    init_state_keys(the_workspace);
+    the_workspace->visited = NULL;
+    the_workspace->bloom = NULL;
+    the_workspace->pending_solution = NULL;
+    the_workspace->overflowed_states = 0;
+    the_workspace->overflowed = NULL;
+    the_workspace->overflowed_capacity = 0;
+    the_workspace->status = SearchRunning;
+    the_workspace->progress_callback = NULL;
+    the_workspace->deadline_ns = 0;
+    the_workspace->max_bytes = 0;
+    the_workspace->pruned_by_bounds = 0;
+    the_workspace->pruned_by_backtracking = 0;
+    the_workspace->pruned_by_filter = 0;
+    the_workspace->queue_high_water = 0;
+    the_workspace->node_expansions = calloc(num_nodes + 1, sizeof(uint64_t));
+    the_workspace->edge_steps = calloc(num_edges + 1, sizeof(uint64_t));
+    the_workspace->pending_values = malloc(sizeof(int64_t) * (num_values + 1));
+
+    the_workspace->queue_capacity = MAX_QUEUE_LENGTH;
+    the_workspace->search_queue = reserve_slots(&(the_workspace->queue_capacity), sizeof(CSearchState), 2 * (max_degree + 1), -1);
+    if (the_workspace->search_queue == MAP_FAILED) {
+        printf("Could not map search queue\n");
+        return NULL;
+    }
+
+    the_workspace->value_arena = NULL;
+    the_workspace->value_arena_bytes = 0;
+    the_workspace->value_stride = 0;
+    the_workspace->value_offset = 0;
+    the_workspace->value_width = value_width;
+    the_workspace->spill_fd = -1;
+    the_workspace->dedup_layers = 0;
+    if (remap_value_arena(the_workspace, value_width, -1, NULL, NULL) != 0) {
+        printf("Could not map value arena\n");
+        return NULL;
+    }
+
+    CSearchState first_search_state;
+    int64_t first_values[num_values];
+    for (uint64_t i=0; i<num_values; i++) {
+        first_values[i] = 0;
+    }
+
+    first_search_state.node = the_workspace->terminal_node;
+    first_search_state.parent_search_state = NULL;
+
+    the_workspace->search_queue_next_to_pop = &(the_workspace->search_queue[0]);
+    the_workspace->search_queue_next_free = &(the_workspace->search_queue[0]);
+    *(the_workspace->search_queue_next_free) = first_search_state;
+    store_state_values(the_workspace, the_workspace->search_queue_next_free, first_values);
+
+    the_workspace->search_queue_next_free++;
+    the_workspace->layer_end = the_workspace->search_queue_next_free;
+    the_workspace->layer = 0;
+    the_workspace->paused_layer = 0;
+    the_workspace->layer_callback = NULL;
+
+    return the_workspace;
+}
+
+
+
+static void set_search_limit_lowlevel(void * the_workspace_ptr, uint64_t limit) {
+    // Raising the limit lets the next get_next_solutions_lowlevel resume from the current frontier
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+    the_workspace->limit = limit;
+}
+
+
+
+static uint64_t get_search_iterations_lowlevel(void * the_workspace_ptr) {
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+    return the_workspace->iterations;
+}
+
+
+
+static int64_t get_search_depth_lowlevel(void * the_workspace_ptr) {
+    // The deepest BFS layer popped completely; -1 before the Terminal is
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+    if (the_workspace->search_queue_next_to_pop == the_workspace->layer_end) {
+        return the_workspace->layer;
+    }
+    return (int64_t) the_workspace->layer - 1;
+}
+
+
+
+static int enable_spill_lowlevel(
+    void * the_workspace_ptr,  // Freshly initialized, before any search
+    const char * spill_dir,
+    uint8_t dedup_layers
+) {
+    /**
+     * Doc: Moves state values out of the heap into a sparse, unlinked file in `spill_dir` that is
+     * mmap'd with one record per queue slot, so BFS layers are contiguous ranges of the file and the
+     * kernel can page them out. The file grows on disk with the queue (see grow_spill_file) and gives
+     * back the blocks of popped states (see release_popped_values), so the frontier is bounded by the
+     * disk, and only the node and parent links stay resident. Returns 0 on success.
+     */
+
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+
+    char path[4096];
+    if (snprintf(path, sizeof(path), "%s/conlog-frontier-XXXXXX", spill_dir) >= (int) sizeof(path)) {
+        return 1;
+    }
+    int fd = mkstemp(path);
+    if (fd < 0) {
+        return 1;
+    }
+    unlink(path);  // The file disappears with the workspace (or the process)
+
+    // Spilled records are sorted as int64s, so they are never narrow
+    if (remap_value_arena(the_workspace, sizeof(int64_t), fd, the_workspace->search_queue_next_to_pop, the_workspace->search_queue_next_free) != 0) {
+        close(fd);
+        return 1;
+    }
+    the_workspace->dedup_layers = dedup_layers;
+
+    return 0;
+}
+
+
+
+static uint64_t spill_sort_key_words;  // qsort has no context argument
+
+static int compare_spill_records(const void * a_ptr, const void * b_ptr) {
+    // Order by state key; the parent and node indices (record[0], record[1]) come before it
+    const uint64_t * a = ((const uint64_t *) a_ptr) + 2;
+    const uint64_t * b = ((const uint64_t *) b_ptr) + 2;
+    for (uint64_t i=0; i < spill_sort_key_words; i++) {
+        if (a[i] != b[i]) {
+            return (a[i] < b[i]) ? -1 : 1;
+        }
+    }
+    return 0;
+}
+
+
+
+static CSearchState * dedup_spilled_layer(
+    CSearchWorkspace * the_workspace,
+    CSearchState * layer_start,
+    CSearchState * layer_stop
+) {
+    /**
+     * Doc: Sorts the records of a freshly built layer in place and drops duplicate states. Nothing
+     * refers to a layer before it is popped, so its slots can be rearranged. Returns the new end.
+     */
+
+    uint64_t record_len = the_workspace->value_stride / sizeof(int64_t);
+    uint64_t first = layer_start - the_workspace->search_queue;
+    uint64_t count = layer_stop - layer_start;
+    int64_t * records = (int64_t *) (the_workspace->value_arena + first * the_workspace->value_stride);
+
+    spill_sort_key_words = the_workspace->key_words;
+    qsort(records, count, the_workspace->value_stride, compare_spill_records);
+
+    uint64_t num_unique = 0;
+    for (uint64_t i=0; i < count; i++) {
+        int64_t * record = records + i * record_len;
+        if ((num_unique > 0) && (compare_spill_records(records + (num_unique - 1) * record_len, record) == 0)) {
+            continue;  // Same state reached by another path of the same length
+        }
+        int64_t * kept = records + num_unique * record_len;
+        if (kept != record) {
+            memcpy(kept, record, the_workspace->value_stride);
+        }
+        num_unique++;
+    }
+
+    // Rebuild the queue slots from the records
+    for (uint64_t i=0; i < num_unique; i++) {
+        int64_t * record = records + i * record_len;
+        CSearchState * state = &(layer_start[i]);
+        state->parent_search_state = (record[0] < 0) ? NULL : &(the_workspace->search_queue[record[0]]);
+        state->node = &(the_workspace->node_arr[record[1]]);
+    }
+
+    return layer_start + num_unique;
+}
+
+
+
+static int enable_dedup_lowlevel(void * the_workspace_ptr) {
+    /**
+     * Doc: Keeps an exact set of every state key enqueued from now on and never enqueues a state twice.
+     * A repeated state has the same future as its first copy, so the first (shortest) solution is
+     * unaffected, but solutions that only differ before a repeated state are not enumerated. Returns 0
+     * on success.
+     */
+
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+    uint64_t num_values = the_workspace->num_values;
+
+    the_workspace->visited = new_visited_set(the_workspace->key_words, 1 << 16);
+    if (the_workspace->visited == NULL) {
+        return 1;
+    }
+
+    uint64_t key[the_workspace->key_words];
+    int64_t values[num_values];
+    for (CSearchState * state = the_workspace->search_queue_next_to_pop; state < the_workspace->search_queue_next_free; state++) {
+        load_values(the_workspace->value_width, state_values(the_workspace, state), values, num_values);
+        encode_state_key(the_workspace, state->node->node_i, last_node_of(state), values, key);
+        if (!visited_set_reserve(the_workspace->visited, 1)) {
+            return 1;
+        }
+        visited_set_insert(the_workspace->visited, key);
+    }
+    return 0;
+}
+
+
+
+static int enable_approximate_dedup_lowlevel(void * the_workspace_ptr, uint64_t mem_bytes) {
+    /**
+     * Doc: Like enable_dedup_lowlevel, but remembers states in a Bloom filter of at most `mem_bytes`.
+     * Memory stays fixed however many states are seen; in exchange a state is occasionally taken for
+     * one already enqueued and pruned, so the search is only best-effort complete. Solutions it does
+     * find are unaffected. Returns 0 on success.
+     */
+
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+    uint64_t num_values = the_workspace->num_values;
+
+    the_workspace->bloom = new_bloom_filter(mem_bytes);
+    if (the_workspace->bloom == NULL) {
+        return 1;
+    }
+
+    uint64_t key[the_workspace->key_words];
+    int64_t values[num_values];
+    for (CSearchState * state = the_workspace->search_queue_next_to_pop; state < the_workspace->search_queue_next_free; state++) {
+        load_values(the_workspace->value_width, state_values(the_workspace, state), values, num_values);
+        encode_state_key(the_workspace, state->node->node_i, last_node_of(state), values, key);
+        bloom_filter_insert(the_workspace->bloom, key, the_workspace->key_words);
+    }
+    return 0;
+}
+
+
+
+static uint8_t get_search_status_lowlevel(void * the_workspace_ptr) {
+    // One of the Search* status codes: why the last search stopped
+    return ((CSearchWorkspace *) the_workspace_ptr)->status;
+}
+
+
+
+static void set_progress_callback_lowlevel(
+    void * the_workspace_ptr,
+    ProgressCallback callback,  // NULL to stop reporting
+    void * context,  // Passed back to `callback`
+    uint64_t every,  // Call every this many iterations; 0 for never
+    uint64_t every_ns  // Call when this many nanoseconds passed since the last call; 0 for never
+) {
+    /**
+     * Doc: The search calls `callback` between states, with the iterations so far, the depth of the
+     * state just expanded (steps from the Terminal) and the number of states in the queue. A nonzero
+     * return ends the search with status SearchCancelled; searching again resumes it.
+     */
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+    the_workspace->progress_callback = callback;
+    the_workspace->progress_context = context;
+    the_workspace->progress_every = every;
+    the_workspace->progress_every_ns = every_ns;
+    the_workspace->next_progress_iterations = the_workspace->iterations + every;
+    the_workspace->next_progress_ns = monotonic_ns() + every_ns;
+}
+
+
+
+static inline uint8_t progress_due(CSearchWorkspace * the_workspace, uint64_t iterations) {
+    if (the_workspace->progress_every && (iterations >= the_workspace->next_progress_iterations)) {
+        return 1;
+    }
+    return the_workspace->progress_every_ns && (iterations % PROGRESS_CLOCK_INTERVAL == 0) && (monotonic_ns() >= the_workspace->next_progress_ns);
+}
+
+
+
+static int report_progress(CSearchWorkspace * the_workspace, CSearchState * last_popped) {
+    // Calls the progress callback; the caller has stored its loop state in the workspace
+    uint64_t depth = 0;
+    for (CSearchState * state = last_popped->parent_search_state; state != NULL; state = state->parent_search_state) {
+        depth++;
+    }
+    uint64_t iterations = the_workspace->iterations;
+    the_workspace->next_progress_iterations = iterations + the_workspace->progress_every;
+    the_workspace->next_progress_ns = monotonic_ns() + the_workspace->progress_every_ns;
+    uint64_t frontier = the_workspace->search_queue_next_free - the_workspace->search_queue_next_to_pop;
+    return the_workspace->progress_callback(the_workspace->progress_context, iterations, depth, frontier);
+}
+
+
+
+static void set_search_budget_lowlevel(
+    void * the_workspace_ptr,
+    uint64_t timeout_ns,  // From now; 0 for no deadline
+    uint64_t max_bytes  // 0 for no cap
+) {
+    /**
+     * Doc: Every PROGRESS_CLOCK_INTERVAL states, the search checks the clock and the bytes it has
+     * allocated (as counted by get_search_stats_lowlevel). Past the deadline it ends with status
+     * SearchTimedOut, over the cap with SearchOutOfMemory; searching again under a new budget resumes it.
+     */
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+    the_workspace->deadline_ns = (timeout_ns == 0) ? 0 : monotonic_ns() + timeout_ns;
+    the_workspace->max_bytes = max_bytes;
+}
+
+
+
+static uint64_t workspace_bytes(CSearchWorkspace * the_workspace) {
+    // The bytes allocated counter of get_search_stats_lowlevel
+    uint64_t num_values = the_workspace->num_values;
+    uint64_t touched = the_workspace->search_queue_next_free - the_workspace->search_queue;
+
+    uint64_t bytes = the_workspace->num_nodes * (sizeof(CNode) + sizeof(uint64_t))
+        + the_workspace->num_edges * (sizeof(CNode *) + sizeof(uint64_t) + 2 * sizeof(int64_t) * num_values + 1)
+        + sizeof(int64_t) * (the_workspace->num_fixed_values + 3 * num_values + 1)
+        + touched * (sizeof(CSearchState) + the_workspace->value_stride)
+        + the_workspace->overflowed_capacity * sizeof(int64_t) * (1 + num_values);
+    if (the_workspace->visited != NULL) {
+        bytes += the_workspace->visited->capacity * (sizeof(uint64_t) * the_workspace->key_words + 1);
+    }
+    if (the_workspace->bloom != NULL) {
+        bytes += the_workspace->bloom->num_bits / 8;
+    }
+    return bytes;
+}
+
+
+
+static inline uint8_t budget_status(CSearchWorkspace * the_workspace) {
+    // The status to stop with, or SearchRunning while within budget
+    if (the_workspace->max_bytes && (workspace_bytes(the_workspace) > the_workspace->max_bytes)) {
+        return SearchOutOfMemory;
+    }
+    if (the_workspace->deadline_ns && (monotonic_ns() >= the_workspace->deadline_ns)) {
+        return SearchTimedOut;
+    }
+    return SearchRunning;
+}
+
+
+
+static void set_layer_callback_lowlevel(
+    void * the_workspace_ptr,
+    LayerCallback callback,  // NULL to stop reporting
+    void * context  // Passed back to `callback`
+) {
+    /**
+     * Doc: The search calls `callback` when it starts popping a BFS layer, with the layer's number, the
+     * iterations before it and its number of states. There is one layer per step of depth, so this is cheap.
+     */
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+    the_workspace->layer_callback = callback;
+    the_workspace->layer_context = context;
+}
+
+
+
+static void cancel_search_lowlevel(void * the_workspace_ptr) {
+    // Records that the caller gave up on the search; searching again resumes it
+    ((CSearchWorkspace *) the_workspace_ptr)->status = SearchCancelled;
+}
+
+
+
+static void get_search_stats_lowlevel(
+    void * the_workspace_ptr,
+    uint64_t * counters,  // uint64_t[5]: states expanded, pruned by bounds, pruned by backtracking, queue high-water, bytes allocated
+    uint64_t * node_expansions,  // uint64_t[num_nodes]
+    uint64_t * edge_steps  // uint64_t[num_edges], in the order of the neighbors passed to init_search_workspace_lowlevel
+) {
+    /**
+     * Doc: Counters since the workspace was made (a checkpoint only restores `iterations`). Bytes
+     * allocated counts the queue slots and value arena touched so far, not their address space reservation.
+     */
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+    counters[0] = the_workspace->iterations;
+    counters[1] = the_workspace->pruned_by_bounds;
+    counters[2] = the_workspace->pruned_by_backtracking;
+    counters[3] = the_workspace->queue_high_water;
+    counters[4] = workspace_bytes(the_workspace);
+    memcpy(node_expansions, the_workspace->node_expansions, sizeof(uint64_t) * the_workspace->num_nodes);
+    memcpy(edge_steps, the_workspace->edge_steps, sizeof(uint64_t) * the_workspace->num_edges);
+}
+
+
+
+static uint64_t get_overflowed_states_lowlevel(void * the_workspace_ptr) {
+    // States set aside because a value left the int64 range where no bound excluded it
+    return ((CSearchWorkspace *) the_workspace_ptr)->overflowed_states;
+}
+
 
-    uint8_t* adjacency_matrix,  // uint8_t[num_nodes * num_nodes]
-    uint64_t limit,
-    int64_t * lower_bounds,  // lower_bounds[num_values]
-    int64_t * upper_bounds  // upper_bounds[num_values]
-)
-{
-    uint64_t num_values = num_fixed_values + num_free_values;
-    CSearchWorkspace * the_workspace = malloc(sizeof(CSearchWorkspace));
 
-    // Make the node array
-    CNode * node_arr = malloc(sizeof(CNode) * num_nodes);
-    for (uint64_t i=0; i < num_nodes; i++) {
-        // Basics
-        node_arr[i].node_type = node_type_arr[i];
-        node_arr[i].node_i = i;
-        node_arr[i].lhs = node_lhs_arr[i];
-        node_arr[i].rhs_is_constant = node_rhs_is_constant_arr[i];
-        node_arr[i].rhs = node_rhs_arr[i];
-        node_arr[i].num_neighbors = 0;
+static uint64_t get_overflowed_state_lowlevel(
+    void * the_workspace_ptr,
+    uint64_t i,  // Less than get_overflowed_states_lowlevel
+    int64_t * values,  // int64_t[num_values]; filled in with the state's values
+    int64_t * path,  // int64_t[path_len]; filled in with node ids, from the state back to the Terminal
+    uint64_t path_len
+) {
+    /**
+     * Doc: The `i`-th state set aside because reversing its node's update left the int64 range.
+     * Its values are from before that update, so searching on from it needs wider integers. Returns
+     * the length of its path, of which only the first `path_len` node ids are written.
+     */
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+    int64_t * record = the_workspace->overflowed + i * (1 + the_workspace->num_values);
+    memcpy(values, record + 1, sizeof(int64_t) * the_workspace->num_values);
+
+    uint64_t length = 0;
+    for (CSearchState * state = &(the_workspace->search_queue[record[0]]); state != NULL; state = state->parent_search_state) {
+        if (length < path_len) {
+            path[length] = state->node->node_i;
+        }
+        length++;
     }
+    return length;
+}
 
-    for (uint64_t i=0; i < num_nodes; i++) {
-        for (uint64_t j=0; j < num_nodes; j++) {
-            if (adjacency_matrix[(i * num_nodes) + j]) {
-                node_arr[i].neighbor_arr[node_arr[i].num_neighbors] = &(node_arr[j]);
-                node_arr[i].num_neighbors ++;
-                if (node_arr[i].num_neighbors >= MAX_DEGREE) {
-                    printf("Degree too high\n");
-                    return NULL;
-                }
-            }
+
+
+static uint8_t set_overflowed_state_aside(CSearchWorkspace * the_workspace, CSearchState * state, const int64_t * values) {
+    // Records `state`, with its `values`, for get_overflowed_state_lowlevel. Returns 0 if out of memory
+    uint64_t record_len = 1 + the_workspace->num_values;
+    if (the_workspace->overflowed_states == the_workspace->overflowed_capacity) {
+        uint64_t capacity = (the_workspace->overflowed_capacity == 0) ? 16 : 2 * the_workspace->overflowed_capacity;
+        int64_t * grown = realloc(the_workspace->overflowed, sizeof(int64_t) * record_len * capacity);
+        if (grown == NULL) {
+            return 0;
         }
+        the_workspace->overflowed = grown;
+        the_workspace->overflowed_capacity = capacity;
+    }
+    int64_t * record = the_workspace->overflowed + record_len * the_workspace->overflowed_states;
+    record[0] = state - the_workspace->search_queue;
+    memcpy(record + 1, values, sizeof(int64_t) * the_workspace->num_values);
+    the_workspace->overflowed_states++;
+    return 1;
+}
+
+
+
+static void get_dedup_filter_lowlevel(
+    void * the_workspace_ptr,
+    double rate,  // A false-positive rate, between 0 and 1
+    uint64_t * capacity,  // Set to the states the filter holds before its false-positive rate reaches `rate`
+    uint64_t * num_hashes  // Set to the bits each state sets
+) {
+    // The size of the approximate dedup filter; both 0 without one
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+    if (the_workspace->bloom == NULL) {
+        *capacity = 0;
+        *num_hashes = 0;
+        return;
     }
+    double k = the_workspace->bloom->num_hashes;
+    *capacity = (uint64_t) (-(double) the_workspace->bloom->num_bits / k * log(1.0 - pow(rate, 1.0 / k)));
+    *num_hashes = the_workspace->bloom->num_hashes;
+}
 
-    // Put the first node on the search queue; the terminal node
-    uint8_t found_it = 0;
-    for (uint64_t i=0; i < num_nodes; i++) {
-        if (node_arr[i].node_type == Terminal) {
-            found_it = 1;
-            the_workspace->terminal_node = &(node_arr[i]);
+
+
+static double get_false_positive_rate_lowlevel(void * the_workspace_ptr) {
+    // Of the approximate dedup filter, as filled so far; 0 without one
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+    if (the_workspace->bloom == NULL) {
+        return 0.0;
+    }
+    return bloom_filter_false_positive_rate(the_workspace->bloom);
+}
+
+
+
+static int save_search_workspace_lowlevel(
+    void * the_workspace_ptr,
+    const char * path  // Appended to; the caller writes the file header
+) {
+    /**
+     * Doc: Streams the search state to the end of `path`. Returns 0 on success. Layout, all 8-byte ints:
+     *
+     *   [num_values key_words iterations num_states next_to_pop num_overflowed pruned_by_filter layer_end layer
+     *    num_visited filter_words]
+     *   [node_i parent_i] * num_states           (parent_i is -1 for the root)
+     *   [key0 ... key{key_words-1}] * (num_states - next_to_pop)
+     *   [state_i values0 ... values{num_values-1}] * num_overflowed   (see get_overflowed_state_lowlevel)
+     *   [key0 ... key{key_words-1}] * num_visited                     (the exact visited set, in no order)
+     *   [num_set count bits0 ... bits{filter_words-1}]                (the Bloom filter, if filter_words)
+     *
+     * Popped states only keep their links (for path reconstruction); their values are already freed.
+     * Values are always written as int64, whatever width the workspace stores them at. layer_end keeps
+     * the boundary between the current layer and the next, which the dedup of whole layers relies on,
+     * and layer its number, which is the depth the wide search catches up to (see solver_c.WideSearch).
+     * The dedup state covers the states already popped too, so a resumed search does not enqueue them
+     * again.
+     */
+
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+
+    FILE * f = fopen(path, "ab");
+    if (f == NULL) {
+        return 1;
+    }
+
+    uint64_t num_states = the_workspace->search_queue_next_free - the_workspace->search_queue;
+    uint64_t next_to_pop = the_workspace->search_queue_next_to_pop - the_workspace->search_queue;
+
+    uint64_t layer_end = the_workspace->layer_end - the_workspace->search_queue;
+
+    CVisitedSet * visited = the_workspace->visited;
+    CBloomFilter * bloom = the_workspace->bloom;
+    uint64_t num_visited = (visited == NULL) ? 0 : visited->count;
+    uint64_t filter_words = (bloom == NULL) ? 0 : bloom->num_bits / 64;
+
+    uint64_t header[11] = {the_workspace->num_values, the_workspace->key_words, the_workspace->iterations, num_states, next_to_pop, the_workspace->overflowed_states, the_workspace->pruned_by_filter, layer_end, the_workspace->layer, num_visited, filter_words};
+    fwrite(header, sizeof(uint64_t), 11, f);
+
+    for (uint64_t i=0; i<num_states; i++) {
+        CSearchState * state = &(the_workspace->search_queue[i]);
+        int64_t link[2];
+        link[0] = state->node->node_i;
+        link[1] = (state->parent_search_state == NULL) ? -1 : (state->parent_search_state - the_workspace->search_queue);
+        fwrite(link, sizeof(int64_t), 2, f);
+    }
+    int64_t values[the_workspace->num_values];
+    uint64_t key[the_workspace->key_words];
+    for (uint64_t i=next_to_pop; i<num_states; i++) {
+        CSearchState * state = &(the_workspace->search_queue[i]);
+        load_values(the_workspace->value_width, state_values(the_workspace, state), values, the_workspace->num_values);
+        encode_state_key(the_workspace, state->node->node_i, last_node_of(state), values, key);
+        fwrite(key, sizeof(uint64_t), the_workspace->key_words, f);
+    }
+    fwrite(the_workspace->overflowed, sizeof(int64_t) * (1 + the_workspace->num_values), the_workspace->overflowed_states, f);
+
+    if (visited != NULL) {
+        for (uint64_t slot=0; slot < visited->capacity; slot++) {
+            if (visited->occupied[slot]) {
+                fwrite(visited->keys + slot * visited->key_words, sizeof(uint64_t), visited->key_words, f);
+            }
         }
     }
-    if (!found_it) {
-        printf("Did not find terminal node\n");
-        return NULL;
+    if (bloom != NULL) {
+        uint64_t counts[2] = {bloom->num_set, bloom->count};
+        fwrite(counts, sizeof(uint64_t), 2, f);
+        fwrite(bloom->bits, sizeof(uint64_t), filter_words, f);
     }
 
-    CSearchState first_search_state;
+    int failed = ferror(f);
+    if (fclose(f) != 0) {
+        failed = 1;
+    }
+    return failed;
+}
 
-    first_search_state.node = the_workspace->terminal_node;
-    first_search_state.values = malloc(sizeof(int64_t) * num_values);
-    for (uint64_t i=0; i<num_values; i++) {
-        first_search_state.values[i] = 0;
+
+
+static int load_search_workspace_lowlevel(
+    void * the_workspace_ptr,  // Freshly initialized from the same program
+    const char * path,
+    uint64_t offset  // Where save_search_workspace_lowlevel started writing
+) {
+    /**
+     * Doc: Replaces the search state with one written by save_search_workspace_lowlevel. Returns 0 on
+     * success. On a malformed file the frontier is left empty, so the search ends immediately.
+     */
+
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+    uint64_t num_values = the_workspace->num_values;
+
+    FILE * f = fopen(path, "rb");
+    if (f == NULL) {
+        return 1;
+    }
+
+    uint64_t header[11];
+    if ((fseek(f, offset, SEEK_SET) != 0) || (fread(header, sizeof(uint64_t), 11, f) != 11)) {
+        fclose(f);
+        return 1;
+    }
+    uint64_t num_states = header[3];
+    uint64_t next_to_pop = header[4];
+    uint64_t layer_end = header[7];
+    if ((header[0] != num_values) || (header[1] != the_workspace->key_words) || (num_states > the_workspace->queue_capacity - the_workspace->max_degree - 1) || (next_to_pop > layer_end) || (layer_end > num_states)) {
+        fclose(f);
+        return 1;
+    }
+    if ((the_workspace->spill_fd >= 0) && (grow_spill_file(the_workspace, num_states + the_workspace->max_degree + 1) != 0)) {
+        fclose(f);
+        return 1;
     }
-    first_search_state.parent_search_state = NULL;
 
+    // Drop the fresh frontier; from here on a failure leaves the queue empty
     the_workspace->search_queue_next_to_pop = &(the_workspace->search_queue[0]);
     the_workspace->search_queue_next_free = &(the_workspace->search_queue[0]);
-    *(the_workspace->search_queue_next_free) = first_search_state;
 
-    the_workspace->search_queue_next_free++;
+    uint8_t failed = 0;
+    for (uint64_t i=0; i<num_states; i++) {
+        int64_t link[2];
+        if ((fread(link, sizeof(int64_t), 2, f) != 2) || (link[0] < 0) || ((uint64_t) link[0] >= the_workspace->num_nodes) || (link[1] >= (int64_t) i)) {
+            failed = 1;
+            break;
+        }
+        CSearchState * state = &(the_workspace->search_queue[i]);
+        state->node = &(the_workspace->node_arr[link[0]]);
+        state->parent_search_state = (link[1] < 0) ? NULL : &(the_workspace->search_queue[link[1]]);
+    }
+    int64_t values[num_values];
+    uint64_t key[the_workspace->key_words];
+    for (uint64_t i=next_to_pop; (!failed) && (i < num_states); i++) {
+        CSearchState * state = &(the_workspace->search_queue[i]);
+        if (fread(key, sizeof(uint64_t), the_workspace->key_words, f) != the_workspace->key_words) {
+            failed = 1;
+            break;
+        }
+        decode_state_key(the_workspace, key, values);
+        if (!store_state_values(the_workspace, state, values)) {
+            if (widen_value_arena(the_workspace, values, &(the_workspace->search_queue[next_to_pop]), state) != 0) {
+                failed = 1;
+                break;
+            }
+            store_state_values(the_workspace, state, values);
+        }
+    }
+    the_workspace->overflowed_states = 0;
+    for (uint64_t i=0; (!failed) && (i < header[5]); i++) {
+        int64_t state_i;
+        if ((fread(&state_i, sizeof(int64_t), 1, f) != 1) || (state_i < 0) || ((uint64_t) state_i >= next_to_pop) || (fread(values, sizeof(int64_t), num_values, f) != num_values)) {
+            failed = 1;
+            break;
+        }
+        if (!set_overflowed_state_aside(the_workspace, &(the_workspace->search_queue[state_i]), values)) {
+            failed = 1;
+        }
+    }
 
+    // The dedup state is only restored into the same kind of dedup; otherwise it starts again below
+    CVisitedSet * visited = NULL;
+    CBloomFilter * bloom = NULL;
+    uint64_t num_visited = header[9];
+    uint64_t filter_words = header[10];
+    if ((!failed) && (the_workspace->visited != NULL) && (num_visited > 0)) {
+        visited = new_visited_set(the_workspace->key_words, 1 << 16);
+        failed = (visited == NULL);
+        for (uint64_t i=0; (!failed) && (i < num_visited); i++) {
+            if ((fread(key, sizeof(uint64_t), the_workspace->key_words, f) != the_workspace->key_words) || !visited_set_reserve(visited, 1)) {
+                failed = 1;
+                break;
+            }
+            visited_set_insert(visited, key);
+        }
+    } else if ((!failed) && (the_workspace->bloom != NULL) && (filter_words > 0) && (num_visited == 0)) {
+        uint64_t counts[2];
+        bloom = new_bloom_filter(8 * filter_words);
+        failed = (bloom == NULL) || (bloom->num_bits != 64 * filter_words);
+        if ((!failed) && ((fread(counts, sizeof(uint64_t), 2, f) != 2) || (fread(bloom->bits, sizeof(uint64_t), filter_words, f) != filter_words))) {
+            failed = 1;
+        }
+        if (!failed) {
+            bloom->num_set = counts[0];
+            bloom->count = counts[1];
+        }
+    }
+    fclose(f);
 
-    the_workspace->node_arr = node_arr;
-    the_workspace->num_free_values = num_free_values;
-    the_workspace->num_fixed_values = num_fixed_values;
-    the_workspace->num_values = num_free_values + num_fixed_values;
-    the_workspace->fixed_values = malloc(sizeof(uint64_t) * num_fixed_values);
-    for (uint64_t i=0; i<num_fixed_values; i++) {
-        the_workspace->fixed_values[i] = fixed_values[i];
+    if (failed) {
+        if (visited != NULL) {
+            free_visited_set(visited);
+        }
+        if (bloom != NULL) {
+            free_bloom_filter(bloom);
+        }
+        return 1;
     }
-    the_workspace->iterations = 0;
-    the_workspace->limit = limit;
-    the_workspace->lower_bounds = lower_bounds;
-    the_workspace->upper_bounds = upper_bounds;
 
-    return the_workspace;
+    the_workspace->iterations = header[2];
+    the_workspace->pruned_by_filter = header[6];
+    the_workspace->status = SearchRunning;
+    the_workspace->search_queue_next_to_pop = &(the_workspace->search_queue[next_to_pop]);
+    the_workspace->search_queue_next_free = &(the_workspace->search_queue[num_states]);
+    the_workspace->layer_end = &(the_workspace->search_queue[layer_end]);
+    the_workspace->layer = header[8];
+    the_workspace->paused_layer = 0;
+    the_workspace->pending_solution = NULL;
+    if (visited != NULL) {
+        free_visited_set(the_workspace->visited);
+        the_workspace->visited = visited;
+    } else if (the_workspace->visited != NULL) {
+        // Saved without one; start it again from the restored frontier
+        free_visited_set(the_workspace->visited);
+        return enable_dedup_lowlevel(the_workspace);
+    }
+    if (bloom != NULL) {
+        free_bloom_filter(the_workspace->bloom);
+        the_workspace->bloom = bloom;
+    } else if (the_workspace->bloom != NULL) {
+        uint64_t mem_bytes = the_workspace->bloom->num_bits / 8;
+        free_bloom_filter(the_workspace->bloom);
+        return enable_approximate_dedup_lowlevel(the_workspace, mem_bytes);
+    }
+    return 0;
+}
+
+
+
+static void free_search_workspace_lowlevel(void * the_workspace_ptr) {
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+
+    munmap(the_workspace->value_arena, the_workspace->value_arena_bytes);
+    munmap(the_workspace->search_queue, sizeof(CSearchState) * the_workspace->queue_capacity);
+    if (the_workspace->visited != NULL) {
+        free_visited_set(the_workspace->visited);
+    }
+    if (the_workspace->bloom != NULL) {
+        free_bloom_filter(the_workspace->bloom);
+    }
+    free(the_workspace->key_value_bits);
+    free(the_workspace->pending_values);
+    free(the_workspace->overflowed);
+    if (the_workspace->spill_fd >= 0) {
+        close(the_workspace->spill_fd);
+    }
+    free(the_workspace->node_arr);
+    free(the_workspace->neighbor_arr);
+    free(the_workspace->node_expansions);
+    free(the_workspace->edge_steps);
+    free(the_workspace->fixed_values);
+    free(the_workspace->lower_bounds);
+    free(the_workspace->upper_bounds);
+    free(the_workspace->edge_bound_offsets);
+    free(the_workspace->edge_bound_vars);
+    free(the_workspace->edge_bound_lower);
+    free(the_workspace->edge_bound_upper);
+    free(the_workspace);
 }
 
 
 
-static int64_t * get_next_solution_lowlevel(
-    void * the_workspace_ptr  // Really it's a CSearchWorkspace * .. void* so I don't have to explain that to caller
+static inline uint8_t values_within_step(CSearchWorkspace * the_workspace, uint64_t edge, const int64_t * values) {
+    // Whether `values` lie within the bounds of step `edge`
+    for (uint64_t k=the_workspace->edge_bound_offsets[edge]; k < the_workspace->edge_bound_offsets[edge + 1]; k++) {
+        int64_t value = values[the_workspace->edge_bound_vars[k]];
+        if ((value < the_workspace->edge_bound_lower[k]) || (value > the_workspace->edge_bound_upper[k])) {
+            return 0;
+        }
+    }
+    return 1;
+}
+
+
+static CSearchState * search_next_solution(
+    CSearchWorkspace * the_workspace,
+    int64_t * answer_values  // int64_t[num_values]; filled in when a solution is found
 ) {
     /**
-     * Doc: Returns an int64_t * ptr. It's an array of length at least 1, specced as follows:
-     *
-     *   [arr_size values0 values1 ... values{N-1} node_id0 node_id1 ... node_id{arr_size-1}]
-     *
-     * The elements are the node ids of the solution path.
-     *
-     * (note that it has arr_size+num_values+1 elements, if arr_size >= 0)
-     *
-     * If arr_size < 0, search failed. The malloc'd array is of length 1, eg.:
-     *
-     *   [-1]
+     * Doc: Runs the search until the next solution, the limit or the end of the search. Returns the
+     * queue slot of the solution's Initial state (follow parent_search_state to the Terminal), or NULL.
      */
 
-    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
-
-    CSearchState * queue_end = &(the_workspace->search_queue[MAX_QUEUE_LENGTH - MAX_DEGREE - 1]);
+    CSearchState * queue_end = &(the_workspace->search_queue[the_workspace->queue_capacity - the_workspace->max_degree - 1]);
 
     uint64_t iterations = the_workspace->iterations;
     uint64_t limit = the_workspace->limit;
@@ -128,27 +1475,64 @@ static int64_t * get_next_solution_lowlevel(
     CSearchState * search_queue_next_free = the_workspace->search_queue_next_free;
     int64_t * lower_bounds = the_workspace->lower_bounds;
     int64_t * upper_bounds = the_workspace->upper_bounds;
+    CNode ** neighbor_arr = the_workspace->neighbor_arr;
 
+    int64_t current_values[num_values];
     int64_t new_values[num_values];
+    CVisitedSet * visited = the_workspace->visited;
+    CBloomFilter * bloom = the_workspace->bloom;
+    uint64_t key[the_workspace->key_words];
 
     uint8_t found_solution = 0;
-    CSearchState answer_search_head;
-    while ((search_queue_next_free < queue_end) && (search_queue_next_to_pop < search_queue_next_free) && (iterations < limit) && (!found_solution)) {
+    uint8_t out_of_memory = 0;
+    uint8_t cancelled = 0;
+    uint8_t paused = 0;
+    uint8_t over_budget = SearchRunning;  // Or the status to stop with
+    uint8_t budgeted = (the_workspace->deadline_ns != 0) || (the_workspace->max_bytes != 0);
+    CSearchState * answer_search_head = NULL;
+    while ((search_queue_next_free < queue_end) && (search_queue_next_to_pop < search_queue_next_free) && (iterations < limit) && (!found_solution) && (!out_of_memory) && (!cancelled) && (over_budget == SearchRunning)) {
+        if ((search_queue_next_to_pop == the_workspace->layer_end) && (the_workspace->overflowed_states > 0) && (the_workspace->paused_layer <= the_workspace->layer)) {
+            // Let the caller search the states set aside through this layer first (see solver_c.WideSearch)
+            the_workspace->paused_layer = the_workspace->layer + 1;
+            paused = 1;
+            break;
+        }
+        if ((the_workspace->spill_fd >= 0) && (grow_spill_file(the_workspace, (search_queue_next_free - the_workspace->search_queue) + the_workspace->max_degree) != 0)) {
+            out_of_memory = 1;  // No room for the children of the next state on disk
+            break;
+        }
+        if ((visited != NULL) && !visited_set_reserve(visited, the_workspace->max_degree)) {
+            out_of_memory = 1;  // No room for them in the visited set
+            break;
+        }
         iterations++;
 
-        CSearchState current_state = *search_queue_next_to_pop;
+        if (search_queue_next_to_pop == the_workspace->layer_end) {
+            // Starting the next BFS layer, which is now complete
+            if (the_workspace->dedup_layers) {
+                search_queue_next_free = dedup_spilled_layer(the_workspace, search_queue_next_to_pop, search_queue_next_free);
+            }
+            release_popped_values(the_workspace, search_queue_next_to_pop);
+            the_workspace->layer_end = search_queue_next_free;
+            the_workspace->layer++;
+            if (the_workspace->layer_callback != NULL) {
+                the_workspace->layer_callback(the_workspace->layer_context, the_workspace->layer, iterations - 1, search_queue_next_free - search_queue_next_to_pop);
+            }
+        } else if ((search_queue_next_to_pop - the_workspace->search_queue) % VALUE_RELEASE_INTERVAL == 0) {
+            release_popped_values(the_workspace, search_queue_next_to_pop);
+        }
 
-        // // For debugging/profiling
-        // if (iterations == ((iterations >> 18) << 18)) {
-        //     printf("%lld\n", iterations);
-        // }
+        CSearchState current_state = *search_queue_next_to_pop;
+        the_workspace->node_expansions[current_state.node->node_i]++;
 
         // Create new values for this state
 
+        load_values(the_workspace->value_width, state_values(the_workspace, search_queue_next_to_pop), current_values, num_values);
         for (uint64_t i=0; i < num_values; i++) {
-            new_values[i] = current_state.values[i];
+            new_values[i] = current_values[i];
         }
 
+        uint8_t overflowed = 0;
         switch (current_state.node->node_type) {
             case Addition:
             case Subtraction:
@@ -159,7 +1543,7 @@ static int64_t * get_next_solution_lowlevel(
                 if (current_state.node->rhs_is_constant) {
                     rhs = current_state.node->rhs;
                 } else {
-                    rhs = current_state.values[current_state.node->rhs];
+                    rhs = current_values[current_state.node->rhs];
                 }
 
                 int64_t rvalue = -1;  // reverse-search, so reverse the operation
@@ -169,10 +1553,12 @@ static int64_t * get_next_solution_lowlevel(
                     case ConditionalDecrement:
                         rvalue *= -1;
                 }
+                uint8_t upward = rvalue > 0;  // Direction of an overflow, if any
                 switch (current_state.node->node_type) {
                     case Addition:
                     case Subtraction:
-                        rvalue *= rhs;
+                        upward = (rhs < 0) == (rvalue < 0);
+                        overflowed = __builtin_mul_overflow(rvalue, rhs, &rvalue);
                 }
                 switch (current_state.node->node_type) {
                     case ConditionalIncrement:
@@ -182,20 +1568,31 @@ static int64_t * get_next_solution_lowlevel(
                         }
                 }
 
-                new_values[current_state.node->lhs] += rvalue;
+                overflowed = overflowed || __builtin_add_overflow(new_values[current_state.node->lhs], rvalue, &(new_values[current_state.node->lhs]));
+                if (overflowed) {
+                    // The exact value is past the int64 range. A finite bound on that side rules the
+                    // state out anyway; otherwise it is set aside (see get_overflowed_state_lowlevel)
+                    int64_t bound = upward ? upper_bounds[current_state.node->lhs] : lower_bounds[current_state.node->lhs];
+                    if ((bound == INT64_MAX) || (bound == INT64_MIN)) {
+                        out_of_memory = !set_overflowed_state_aside(the_workspace, search_queue_next_to_pop, current_values);
+                    } else {
+                        the_workspace->pruned_by_bounds++;
+                    }
+                }
         }
 
-        uint8_t keep_going_from_here = 1;
+        uint8_t keep_going_from_here = !overflowed;
 
         if ((current_state.node->node_type == Terminal) && (current_state.parent_search_state != NULL)) {
             // Terminal nodes terminate this search path, unless it's the first node
             keep_going_from_here = 0;
         }
 
-        for (uint64_t i=0; i<num_values; i++) {
+        for (uint64_t i=0; keep_going_from_here && (i<num_values); i++) {
             if ((new_values[i] < lower_bounds[i]) || (new_values[i] > upper_bounds[i])) {
                 keep_going_from_here = 0;
                 // Bounds violation.
+                the_workspace->pruned_by_bounds++;
                 break;
             }
         }
@@ -203,97 +1600,320 @@ static int64_t * get_next_solution_lowlevel(
         if (keep_going_from_here) {
             // Make all successor states (this is where the LOGIC happens!)
             for (uint64_t ii=0; ii < current_state.node->num_neighbors; ii++) {
-                CNode * neighbor_node = current_state.node->neighbor_arr[ii];
+                CNode * neighbor_node = neighbor_arr[current_state.node->first_edge + ii];
 
                 if ((current_state.parent_search_state != NULL) && (neighbor_node == current_state.parent_search_state->node)) {
+                    the_workspace->pruned_by_backtracking++;
                     continue;  // No backtracking allowed
                 }
 
-                CSearchState next_search_state;
+                uint64_t edge = current_state.node->first_edge + ii;
+                if (!values_within_step(the_workspace, edge, new_values)) {
+                    the_workspace->pruned_by_bounds++;
+                    continue;  // Can not reach a solution through this step
+                }
+
+                if (visited != NULL) {
+                    encode_state_key(the_workspace, neighbor_node->node_i, current_state.node->node_i, new_values, key);
+                    if (!visited_set_insert(visited, key)) {
+                        continue;  // Already enqueued once
+                    }
+                } else if (bloom != NULL) {
+                    encode_state_key(the_workspace, neighbor_node->node_i, current_state.node->node_i, new_values, key);
+                    if (!bloom_filter_insert(bloom, key, the_workspace->key_words)) {
+                        the_workspace->pruned_by_filter++;
+                        continue;  // Probably enqueued once
+                    }
+                }
+
+                CSearchState * next_search_state = search_queue_next_free;
 
-                next_search_state.node = neighbor_node;
-                next_search_state.values = malloc(sizeof(int64_t) * num_values);
-                for (uint64_t i=0; i < num_values; i++) {
-                    next_search_state.values[i] = new_values[i];
+                next_search_state->node = neighbor_node;
+                next_search_state->parent_search_state = search_queue_next_to_pop;
+                if (!store_state_values(the_workspace, next_search_state, new_values)) {
+                    // Too wide for the current storage: re-encode the unpopped frontier and retry
+                    if (widen_value_arena(the_workspace, new_values, search_queue_next_to_pop + 1, search_queue_next_free) != 0) {
+                        out_of_memory = 1;  // Could not widen value storage
+                        break;
+                    }
+                    store_state_values(the_workspace, next_search_state, new_values);
                 }
-                next_search_state.parent_search_state = search_queue_next_to_pop;
 
-                *search_queue_next_free = next_search_state;
                 search_queue_next_free++;
+                the_workspace->edge_steps[edge]++;
+            }
+            if ((uint64_t) (search_queue_next_free - search_queue_next_to_pop) > the_workspace->queue_high_water) {
+                the_workspace->queue_high_water = search_queue_next_free - search_queue_next_to_pop;
             }
         }
 
         if (current_state.node->node_type == Initial) {
             uint8_t fixed_equal = 1;
             for (uint64_t i=0; i<num_fixed_values; i++) {
-                if (current_state.values[i] != fixed_values[i]) {
+                if (current_values[i] != fixed_values[i]) {
                     fixed_equal = 0;
                 }
             }
             if (fixed_equal) {
                 found_solution = 1;
-                answer_search_head = current_state;
+                answer_search_head = search_queue_next_to_pop;  // Popped states keep their links
+                memcpy(answer_values, new_values, sizeof(int64_t) * num_values);
             }
         }
 
-        // Once we're done with a node, free its values
-        free(search_queue_next_to_pop->values);
-        search_queue_next_to_pop->values = NULL;
-        search_queue_next_to_pop++;
-    }
+        search_queue_next_to_pop++;  // Its slot is reclaimed by release_popped_values
 
-    int64_t * ans;
+        if ((the_workspace->progress_callback != NULL) && progress_due(the_workspace, iterations)) {
+            the_workspace->iterations = iterations;
+            the_workspace->search_queue_next_to_pop = search_queue_next_to_pop;
+            the_workspace->search_queue_next_free = search_queue_next_free;
+            cancelled = report_progress(the_workspace, search_queue_next_to_pop - 1) != 0;
+        }
 
-    if (found_solution) {
-        // Traverse the `SearchState`s to find the length of the answer. Then malloc + copy node ids
-        uint64_t soln_len = 1;
-        CSearchState * current_search_head;
-        current_search_head = &(answer_search_head);
-        while (current_search_head->parent_search_state != NULL) {
-            current_search_head = current_search_head->parent_search_state;
-            soln_len += 1;
+        if (budgeted && (iterations % PROGRESS_CLOCK_INTERVAL == 0)) {
+            the_workspace->search_queue_next_free = search_queue_next_free;
+            over_budget = budget_status(the_workspace);
         }
+    }
 
-        ans = malloc(sizeof(int64_t) * (1 + num_values + soln_len));
+    // Why the search stopped, for get_search_status_lowlevel; running it again only helps at the limit
+    if (found_solution || paused) {
+        the_workspace->status = SearchRunning;
+    } else if (cancelled) {
+        the_workspace->status = SearchCancelled;
+    } else if (over_budget != SearchRunning) {
+        the_workspace->status = over_budget;
+    } else if (out_of_memory || (search_queue_next_free >= queue_end)) {
+        the_workspace->status = SearchOutOfMemory;
+    } else if (search_queue_next_to_pop >= search_queue_next_free) {
+        // Only a proof that there are no more solutions if no state was pruned on a guess
+        the_workspace->status = (the_workspace->pruned_by_filter == 0) ? SearchExhausted : SearchIncomplete;
+    } else {
+        the_workspace->status = SearchLimitReached;
+    }
+
+    the_workspace->iterations = iterations;
+    the_workspace->search_queue_next_to_pop = search_queue_next_to_pop;
+    the_workspace->search_queue_next_free = search_queue_next_free;
+
+    return answer_search_head;
+}
+
+
+
+static uint64_t solution_record_length(CSearchWorkspace * the_workspace, CSearchState * answer_search_head) {
+    // [arr_size values... node ids...]
+    uint64_t soln_len = 1;
+    for (CSearchState * current_search_head = answer_search_head; current_search_head->parent_search_state != NULL; current_search_head = current_search_head->parent_search_state) {
+        soln_len += 1;
+    }
+    return 1 + the_workspace->num_values + soln_len;
+}
 
-        uint64_t offset = 0;
 
-        ans[offset] = soln_len;
+
+static void write_solution_record(
+    CSearchWorkspace * the_workspace,
+    CSearchState * answer_search_head,
+    const int64_t * answer_values,
+    int64_t * record  // int64_t[solution_record_length(...)]
+) {
+    uint64_t num_values = the_workspace->num_values;
+    uint64_t offset = 0;
+
+    record[offset] = solution_record_length(the_workspace, answer_search_head) - 1 - num_values;
+    offset++;
+
+    for (uint64_t i=0; i<num_values; i++) {
+        record[offset] = answer_values[i];
         offset++;
+    }
 
-        for (uint64_t i=0; i<num_values; i++) {
-            ans[offset] = new_values[i];
-            offset++;
-        }
-        current_search_head = &(answer_search_head);  // One more time through, now that we've malloc'd ans at the proper length
-        ans[offset] = current_search_head->node->node_i;
+    CSearchState * current_search_head = answer_search_head;
+    record[offset] = current_search_head->node->node_i;
+    offset++;
+    while (current_search_head->parent_search_state != NULL) {
+        current_search_head = current_search_head->parent_search_state;
+        record[offset] = current_search_head->node->node_i;
         offset++;
-        while (current_search_head->parent_search_state != NULL) {
-            current_search_head = current_search_head->parent_search_state;
-            ans[offset] = current_search_head->node->node_i;
-            offset++;
+    }
+}
+
+
+
+static uint64_t get_next_solutions_lowlevel(
+    void * the_workspace_ptr,
+    int64_t * buffer,  // Caller-owned
+    uint64_t buffer_len,  // In int64_t's
+    uint64_t max_solutions,
+    uint64_t * needed  // Out: set when not even one solution fits the buffer
+) {
+    /**
+     * Doc: Finds up to `max_solutions` solutions and packs them into `buffer`, back to back, each in the
+     * format
+     *
+     *   [arr_size values0 ... values{N-1} node_id0 ... node_id{arr_size-1}] * count
+     *
+     * The node ids are the solution path.
+     *
+     * Returns the count; fewer than `max_solutions` means the search stopped (limit or exhaustion),
+     * or paused at the end of a layer while states are set aside (the status stays SearchRunning),
+     * unless a solution did not fit. Such a solution is kept for the next call; if it was the first of
+     * this call, `*needed` is set to its length so the caller can retry with a larger buffer.
+     */
+
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+
+    uint64_t count = 0;
+    uint64_t used = 0;
+    *needed = 0;
+    while (count < max_solutions) {
+        if (the_workspace->pending_solution == NULL) {
+            the_workspace->pending_solution = search_next_solution(the_workspace, the_workspace->pending_values);
+            if (the_workspace->pending_solution == NULL) {
+                break;
+            }
         }
 
-    } else {
-        if (search_queue_next_free >= queue_end) {
-            printf("Search terminated: Out of queue space\n");
+        uint64_t record_len = solution_record_length(the_workspace, the_workspace->pending_solution);
+        if (used + record_len > buffer_len) {
+            if (count == 0) {
+                *needed = record_len;
+            }
+            break;
+        }
+
+        write_solution_record(the_workspace, the_workspace->pending_solution, the_workspace->pending_values, buffer + used);
+        the_workspace->pending_solution = NULL;
+        used += record_len;
+        count++;
+    }
+    return count;
+}
+
+
+
+static uint8_t evaluate_solution_record(
+    CSearchWorkspace * the_workspace,
+    const int64_t * record,  // As written by get_next_solutions_lowlevel
+    int64_t * prints,  // int64_t[prints_len][2] of [kind value]; may be NULL if prints_len is 0
+    uint64_t prints_len,
+    uint64_t * num_prints  // Out: prints made, even those that did not fit
+) {
+    /**
+     * Doc: Runs a solution forwards from its initial values, like evaluator.evaluate, and returns whether
+     * it holds: the fixed values agree, consecutive nodes are adjacent, and every value is 0 at the
+     * Terminal. The path is node ids from the Initial node to the Terminal.
+     */
+
+    uint64_t num_values = the_workspace->num_values;
+    uint64_t soln_len = record[0];
+    const int64_t * path = record + 1 + num_values;
+    CNode * node_arr = the_workspace->node_arr;
+
+    int64_t values[num_values];
+    memcpy(values, record + 1, sizeof(int64_t) * num_values);
+    *num_prints = 0;
+
+    if ((soln_len < 2) || (node_arr[path[0]].node_type != Initial) || (node_arr[path[soln_len - 1]].node_type != Terminal)) {
+        return 0;
+    }
+    for (uint64_t i=0; i < the_workspace->num_fixed_values; i++) {
+        if (values[i] != the_workspace->fixed_values[i]) {
+            return 0;
+        }
+    }
+
+    for (uint64_t k=1; k < soln_len; k++) {
+        CNode * last_node = &(node_arr[path[k - 1]]);
+        CNode * node = &(node_arr[path[k]]);
+
+        uint8_t adjacent = 0;
+        for (uint64_t ii=0; ii < last_node->num_neighbors; ii++) {
+            if (the_workspace->neighbor_arr[last_node->first_edge + ii] == node) {
+                adjacent = 1;
+                break;
+            }
+        }
+        if (!adjacent) {
+            return 0;
         }
-        if (search_queue_next_to_pop >= search_queue_next_free) {
-            printf("Search terminated: Out of nodes to search\n");
+
+        if (node->node_type == Terminal) {
+            break;  // The first Terminal ends the evaluation
+        }
+
+        int64_t rhs = node->rhs_is_constant ? node->rhs : values[node->rhs];
+        uint8_t overflowed = 0;
+        switch (node->node_type) {
+            case Addition:
+                overflowed = __builtin_add_overflow(values[node->lhs], rhs, &(values[node->lhs]));
+                break;
+            case Subtraction:
+                overflowed = __builtin_sub_overflow(values[node->lhs], rhs, &(values[node->lhs]));
+                break;
+            case ConditionalIncrement:
+                if (rhs > 0) {
+                    overflowed = __builtin_add_overflow(values[node->lhs], 1, &(values[node->lhs]));
+                }
+                break;
+            case ConditionalDecrement:
+                if (rhs > 0) {
+                    overflowed = __builtin_sub_overflow(values[node->lhs], 1, &(values[node->lhs]));
+                }
+                break;
+            case IntegerPrint:
+            case UnicodePrint:
+                if (*num_prints < prints_len) {
+                    prints[2 * (*num_prints)] = (node->node_type == IntegerPrint) ? PrintInteger : PrintCharacter;
+                    prints[2 * (*num_prints) + 1] = rhs;
+                }
+                (*num_prints)++;
+                break;
+        }
+        if (overflowed) {
+            return 0;  // The search never goes past the int64 range, so neither does a solution
         }
-        if (iterations >= limit) {
-            // printf("Search terminated: Reached iteration limit\n"); // Not informative.
+    }
+
+    for (uint64_t i=0; i < num_values; i++) {
+        if (values[i] != 0) {
+            return 0;
         }
+    }
+    return 1;
+}
+
+
+
+static uint64_t verify_solutions_lowlevel(
+    void * the_workspace_ptr,
+    const int64_t * packed,  // As written by get_next_solutions_lowlevel
+    uint64_t count
+) {
+    // Returns the index of the first solution that does not hold, or `count` if they all do
+    CSearchWorkspace * the_workspace = (CSearchWorkspace *) the_workspace_ptr;
+    uint64_t num_prints;
 
-        // This special array will make it clear we failed.
-        ans = malloc(sizeof(uint64_t));
-        ans[0] = -1;
+    for (uint64_t i=0; i < count; i++) {
+        if (!evaluate_solution_record(the_workspace, packed, NULL, 0, &num_prints)) {
+            return i;
+        }
+        packed += 1 + the_workspace->num_values + packed[0];
     }
+    return count;
+}
 
-    the_workspace->iterations = iterations;
-    the_workspace->search_queue_next_to_pop = search_queue_next_to_pop;
-    the_workspace->search_queue_next_free = search_queue_next_free;
 
-    return ans;
 
-}
\ No newline at end of file
+static uint64_t solution_stdout_lowlevel(
+    void * the_workspace_ptr,
+    const int64_t * record,
+    int64_t * prints,  // int64_t[prints_len][2] of [kind value], kind being PrintInteger or PrintCharacter
+    uint64_t prints_len
+) {
+    // Returns the number of prints; if more than `prints_len`, only the first `prints_len` were written
+    uint64_t num_prints;
+    evaluate_solution_record((CSearchWorkspace *) the_workspace_ptr, record, prints, prints_len, &num_prints);
+    return num_prints;
+}
@@ -2,19 +2,34 @@
 
 #include <stdint.h>
 
-#define MAX_DEGREE 16
-#define MAX_QUEUE_LENGTH 110000000
+#define MAX_QUEUE_LENGTH (1ULL << 34)  // Queue slots to reserve address space for, halved until the system allows it
+#define SPILL_GROWTH_BYTES (64 << 20)  // The spill file grows by this much at a time
+#define VALUE_RELEASE_INTERVAL 1048576  // Popped value slots are handed back to the kernel this often
+#define PROGRESS_CLOCK_INTERVAL 1024  // Iterations between clock reads for timed progress callbacks, and budget checks
 
 
+// Node types; the opcodes of evaluator.py
+#define NoneType 0
 #define Initial 1
 #define Terminal 2
 #define Addition 3
-#define IntegerPrint 4
-#define UnicodePrint 5
-#define Subtraction 6
-#define ConditionalIncrement 7
-#define ConditionalDecrement 8
-#define NoneType 9
+#define Subtraction 4
+#define ConditionalIncrement 5
+#define ConditionalDecrement 6
+#define IntegerPrint 7
+#define UnicodePrint 8
+
+// Search status codes: why the search last stopped; stats.SearchStatus
+#define SearchRunning 0  // Not stopped yet, or stopped at a solution
+#define SearchExhausted 1  // Out of states: there are no more solutions
+#define SearchLimitReached 2
+#define SearchOutOfMemory 3
+#define SearchCancelled 4
+#define SearchTimedOut 5
+#define SearchIncomplete 6  // Out of states, but the approximate dedup filter may have pruned some wrongly
+
+#define PrintInteger 0  // Kinds of stdout entries, see solution_stdout_lowlevel
+#define PrintCharacter 1
 
 
 typedef struct CNode {
@@ -22,24 +37,56 @@ typedef struct CNode {
     uint64_t node_i;
     int64_t lhs;  // Index of the lhs operand
     uint8_t rhs_is_constant;  // (bool) Whether rhs is a constant or an index
-    int64_t rhs;  // Index/value of the rhs operand
-    uint8_t num_neighbors;  // Number of neighbors of this node
-    struct CNode * neighbor_arr[MAX_DEGREE];  // (Yes, a POINTER ARRAY)
+    int64_t rhs;  // Index/value of the rhs operand; for prints, of the printed value
+    uint64_t num_neighbors;  // Number of neighbors of this node
+    uint64_t first_edge;  // Its neighbor ii is the workspace's neighbor_arr[first_edge + ii], reached by step first_edge + ii
 } CNode;
 
 
+// Called back with (context, iterations, depth, frontier); returns nonzero to cancel the search
+typedef int (*ProgressCallback)(void *, uint64_t, uint64_t, uint64_t);
+
+// Called back with (context, layer, iterations, layer size) when the search starts popping a BFS layer
+typedef void (*LayerCallback)(void *, uint64_t, uint64_t, uint64_t);
+
+
 typedef struct CSearchState {
+    // Just the links, which every state keeps for path reconstruction; its values are in the value
+    // arena (see state_values), in a file in spill mode
     CNode * node;
-    int64_t * values;
     struct CSearchState * parent_search_state;
 } CSearchState;
 
 
+typedef struct CVisitedSet {
+    uint64_t * keys;  // uint64_t[capacity][key_words], open addressing
+    uint8_t * occupied;  // uint8_t[capacity]
+    uint64_t key_words;
+    uint64_t capacity;  // Power of two
+    uint64_t count;
+} CVisitedSet;
+
+
+#define BLOOM_NUM_HASHES 4
+
+typedef struct CBloomFilter {
+    uint64_t * bits;  // uint64_t[num_bits / 64]
+    uint64_t num_bits;  // Power of two
+    uint8_t num_hashes;
+    uint64_t num_set;  // Bits set so far
+    uint64_t count;  // Keys inserted
+} CBloomFilter;
+
+
 typedef struct CSearchWorkspace {
-    CSearchState search_queue[MAX_QUEUE_LENGTH];
+    CSearchState * search_queue;  // search_queue[queue_capacity], mmap'd; pages are only backed once touched
+    uint64_t queue_capacity;
     CSearchState * search_queue_next_free;  // Add things via: *search_queue_next_free = thing; search_queue_next_free++
     CSearchState * search_queue_next_to_pop;  // Add things via: thing = *search_queue_next_to_pop; search_queue_next_to_pop++
     CNode * node_arr;  // CNode[num_nodes]
+    CNode ** neighbor_arr;  // CNode *[num_edges]; the neighbors of every node, see CNode.first_edge
+    uint64_t max_degree;  // The queue keeps room for this many children of the last state popped
+    uint64_t num_nodes;
     uint64_t num_values;  // Number of values of the graph
     uint64_t num_free_values;  // Number of free values of the graph
     uint64_t num_fixed_values;  // Number of fixed values of the graph
@@ -47,7 +94,51 @@ typedef struct CSearchWorkspace {
     CNode * terminal_node;  // CNode *
     uint64_t iterations;
     uint64_t limit;
+    uint8_t status;  // A Search* status code
+    ProgressCallback progress_callback;  // NULL for none; see set_progress_callback_lowlevel
+    void * progress_context;
+    uint64_t progress_every;  // Iterations between calls, or 0
+    uint64_t progress_every_ns;  // Nanoseconds between calls, or 0
+    uint64_t next_progress_iterations;
+    uint64_t next_progress_ns;
+    uint64_t deadline_ns;  // On the monotonic clock, or 0 for none; see set_search_budget_lowlevel
+    uint64_t max_bytes;  // Cap on the bytes counted by get_search_stats_lowlevel, or 0 for none
+    uint64_t overflowed_states;  // Set aside because a value left the int64 range; see get_overflowed_state_lowlevel
+    int64_t * overflowed;  // overflowed[overflowed_capacity * (1 + num_values)]: [state_i values...] of each
+    uint64_t overflowed_capacity;
+    uint64_t pruned_by_bounds;  // States and steps given up on their bounds; see get_search_stats_lowlevel
+    uint64_t pruned_by_backtracking;
+    uint64_t pruned_by_filter;  // States the approximate dedup filter took for duplicates, rightly or not
+    uint64_t queue_high_water;
+    uint64_t * node_expansions;  // node_expansions[num_nodes]: states expanded at each node
+    uint64_t * edge_steps;  // edge_steps[num_edges]: states queued by each step
     int64_t * lower_bounds;
     int64_t * upper_bounds;
+    uint64_t num_edges;  // Steps from a node to one of its neighbors
+    uint64_t * edge_bound_offsets;  // edge_bound_offsets[num_edges + 1]; see init_search_workspace_lowlevel
+    uint64_t * edge_bound_vars;  // edge_bound_vars[num_edge_bounds]: the value each step bound is on
+    int64_t * edge_bound_lower;  // edge_bound_lower[num_edge_bounds]
+    int64_t * edge_bound_upper;
+    CSearchState * layer_end;  // One past the last state of the BFS layer being popped
+    uint64_t layer;  // Number of that layer, which is the depth of its states
+    uint64_t paused_layer;  // The layer search_next_solution last paused before, while states are set aside
+    LayerCallback layer_callback;  // NULL for none; see set_layer_callback_lowlevel
+    void * layer_context;
+    uint8_t * value_arena;  // One slot per queue position, mmap'd anonymously or (spill mode) from a file
+    uint64_t value_arena_bytes;
+    uint64_t spill_file_bytes;  // The part of the arena the spill file covers so far; see grow_spill_file
+    uint64_t value_stride;  // Bytes per slot
+    uint64_t value_offset;  // Bytes before the values in a slot (the spill record header)
+    uint8_t value_width;  // Bytes per stored value: 1, 2, 4 or 8. Widened when a value does not fit
+    int spill_fd;  // -1 unless spilling
+    uint8_t dedup_layers;  // (bool) Spill mode: sort each new layer and drop duplicate states
+    uint8_t key_packed;  // (bool) Whether state keys are bit-packed; see init_state_keys
+    uint64_t key_words;  // Words per state key
+    uint8_t key_node_bits;
+    uint8_t * key_value_bits;  // key_value_bits[num_values]
+    CVisitedSet * visited;  // Keys of every state enqueued, or NULL when not deduplicating
+    CBloomFilter * bloom;  // Approximate `visited` in fixed memory, or NULL
+    CSearchState * pending_solution;  // Found but not yet returned by get_next_solutions_lowlevel, or NULL
+    int64_t * pending_values;  // pending_values[num_values]
 } CSearchWorkspace;
 
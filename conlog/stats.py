@@ -0,0 +1,207 @@
+"""Counters and timings collected by the search strategies.
+
+Every strategy fills in a `SearchStats`: strategies g and p take one as
+their `stats` argument, and the strategy c search objects build one from the
+engine's counters on each access of their `stats` property. Its `status`
+says why the search stopped.
+
+While a search runs, a `ProgressHook` reports its progress every so many
+iterations or milliseconds, and can cancel it. A `SearchBudget` stops it
+at a deadline or once it allocated too much memory.
+"""
+
+from dataclasses import dataclass, field
+from enum import IntEnum
+from time import perf_counter
+from typing import Callable, Iterator
+
+
+class SearchStatus(IntEnum):
+    """Why a search stopped; the Search* status codes of the C engine."""
+
+    RUNNING = 0  # Not stopped yet, or stopped at a solution
+    EXHAUSTED = 1  # Out of states: no more solutions, so unsatisfiable if none were found
+    LIMIT_REACHED = 2  # Raising the limit may find more
+    OUT_OF_MEMORY = 3
+    CANCELLED = 4
+    TIMED_OUT = 5
+    INCOMPLETE = 6  # Out of states, but approximate dedup may have pruned some wrongly: not a proof of unsat
+
+    def describe(self) -> str:
+        return self.name.lower().replace("_", " ")
+
+
+@dataclass
+class SearchStats:
+    states_expanded: int = 0  # States popped from the queue
+    pruned_by_bounds: int = 0  # States (or steps) given up because a value left its bounds
+    pruned_by_backtracking: int = 0  # Steps not taken because they go back where the state came from
+    queue_high_water: int = 0  # Most states waiting in the queue at once
+    bytes_allocated: int = 0  # By the search itself; estimated for strategies g and p
+    node_expansions: dict[str, int] = field(default_factory=dict)  # Node name -> states expanded there
+    edge_steps: dict[tuple[str, str], int] = field(default_factory=dict)  # Sorted node names -> states queued by a step along the edge
+    preprocessing_time: float = 0.0  # Seconds
+    search_time: float = 0.0
+    verification_time: float = 0.0
+    status: SearchStatus = SearchStatus.RUNNING
+
+    def report(self, top: int = 5) -> str:
+        """The stats as aligned lines, with the `top` most expanded nodes."""
+        busiest = sorted(self.node_expansions.items(), key=lambda item: item[1], reverse=True)[:top]
+        busiest_edges = sorted(self.edge_steps.items(), key=lambda item: item[1], reverse=True)[:top]
+        lines = [
+            f"status                  {self.status.describe()}",
+            f"states expanded         {self.states_expanded:,}",
+            f"pruned by bounds        {self.pruned_by_bounds:,}",
+            f"pruned by backtracking  {self.pruned_by_backtracking:,}",
+            f"queue high-water        {self.queue_high_water:,}",
+            f"bytes allocated         {self.bytes_allocated:,}",
+            f"preprocessing           {self.preprocessing_time:.3f}s",
+            f"search                  {self.search_time:.3f}s",
+            f"verification            {self.verification_time:.3f}s",
+        ]
+        if busiest:
+            lines.append("busiest nodes           " + ", ".join(f"{name} ({count:,})" for name, count in busiest))
+        if busiest_edges:
+            lines.append("busiest edges           " + ", ".join(f"{u}--{v} ({count:,})" for (u, v), count in busiest_edges))
+        return "\n".join(lines)
+
+
+@dataclass(frozen=True)
+class SearchProgress:
+    iterations: int
+    depth: int  # Steps from the Terminal to the state just expanded
+    frontier: int  # States waiting in the queue
+
+
+class ProgressHook:
+    """Calls `callback` with a `SearchProgress` every `every` iterations
+    and/or every `every_ms` milliseconds of a search. The callback returns
+    True to cancel the search; an exception it raises also cancels the
+    search, and is then raised from it.
+
+    Strategies g and p take a hook as their `progress` argument; the
+    strategy c search objects take one with `set_progress`.
+    """
+
+    def __init__(
+        self,
+        callback: Callable[[SearchProgress], bool | None],
+        every: int | None = None,
+        every_ms: float | None = None,
+    ) -> None:
+        self.callback = callback
+        self.every = every
+        self.every_ms = every_ms
+        self.next_iterations = every if every else None
+        self.next_time = perf_counter() + every_ms / 1000 if every_ms else None
+
+    def due(self, iterations: int) -> bool:
+        if self.next_iterations is not None and iterations >= self.next_iterations:
+            return True
+        return self.next_time is not None and perf_counter() >= self.next_time
+
+    def report(self, iterations: int, depth: int, frontier: int) -> bool:
+        """Call back now and schedule the next call; True to cancel the search."""
+        if self.every:
+            self.next_iterations = iterations + self.every
+        if self.every_ms:
+            self.next_time = perf_counter() + self.every_ms / 1000
+        return bool(self.callback(SearchProgress(iterations, depth, frontier)))
+
+
+class SearchBudget:
+    """A deadline `timeout` seconds after the budget is made, and a cap of
+    `max_memory` bytes on the search's `bytes_allocated`; None for no limit.
+
+    Strategies g and p take a budget as their `budget` argument; the
+    strategy c search objects take one with `set_budget`, or from
+    `make_search_c`. Every strategy checks it between states, and stops with
+    status TIMED_OUT or OUT_OF_MEMORY, so the stats of a search over budget
+    are still complete. Preprocessing checks the deadline with `check`.
+    """
+
+    def __init__(self, timeout: float | None = None, max_memory: int | None = None) -> None:
+        self.timeout = timeout
+        self.max_memory = max_memory
+        self.deadline = perf_counter() + timeout if timeout is not None else None
+
+    def remaining(self) -> float | None:
+        """Seconds left until the deadline (at least 0), or None without one."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - perf_counter())
+
+    def exceeded(self, bytes_allocated: int) -> SearchStatus | None:
+        """The status to stop with, or None while within budget."""
+        if self.max_memory is not None and bytes_allocated > self.max_memory:
+            return SearchStatus.OUT_OF_MEMORY
+        if self.deadline is not None and perf_counter() >= self.deadline:
+            return SearchStatus.TIMED_OUT
+        return None
+
+    def check(self) -> None:
+        """Raise `BudgetExceeded` past the deadline; for preprocessing, which has no states to stop between."""
+        if self.deadline is not None and perf_counter() >= self.deadline:
+            raise BudgetExceeded(SearchStatus.TIMED_OUT)
+
+
+# Loop iterations of preprocessing between checks of its budget
+BUDGET_CHECK_INTERVAL = 1024
+
+
+class BudgetExceeded(Exception):
+    """Preprocessing ran out of its `SearchBudget`; `status` says how."""
+
+    def __init__(self, status: SearchStatus) -> None:
+        super().__init__(status.describe())
+        self.status = status
+
+
+def node_histogram(nodes, counts) -> dict[str, int]:
+    """Map the names of `nodes` to their nonzero `counts`."""
+    return {node.name: int(count) for node, count in zip(nodes, counts) if count}
+
+
+def edge_histogram(edges, counts) -> dict[tuple[str, str], int]:
+    """Sum the nonzero `counts` of steps by the `edges` they take, both directions together."""
+    histogram = {}
+    for edge, count in zip(edges, counts):
+        if count:
+            histogram[edge] = histogram.get(edge, 0) + int(count)
+    return histogram
+
+
+def count_step(stats: SearchStats, u: str, v: str) -> None:
+    """Count a state queued by a step between the nodes named `u` and `v`."""
+    edge = (u, v) if u <= v else (v, u)
+    stats.edge_steps[edge] = stats.edge_steps.get(edge, 0) + 1
+
+
+def timed_search(solutions: Iterator, stats: SearchStats) -> Iterator:
+    """Yield from `solutions`, adding the time spent producing each to
+    `stats.search_time`, less the preprocessing and verification time
+    recorded meanwhile. `solutions` sets `stats.status` when it runs out;
+    running out of memory or budget ends the search, and an exception
+    cancels it."""
+    while True:
+        start = perf_counter()
+        recorded = stats.preprocessing_time + stats.verification_time
+        stats.status = SearchStatus.RUNNING
+        try:
+            solution = next(solutions)
+        except StopIteration:
+            return
+        except MemoryError:
+            stats.status = SearchStatus.OUT_OF_MEMORY
+            return
+        except BudgetExceeded as e:
+            stats.status = e.status
+            return
+        except BaseException:
+            stats.status = SearchStatus.CANCELLED  # Interrupted, or a progress hook raised
+            raise
+        finally:
+            elapsed = perf_counter() - start
+            stats.search_time += elapsed - (stats.preprocessing_time + stats.verification_time - recorded)
+        yield solution
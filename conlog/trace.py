@@ -0,0 +1,130 @@
+"""Profiles of the solve pipeline in Chrome trace-event format.
+
+While a `Trace` is active (see `start_trace`), the phases marked with
+`traced` or `trace_span` are recorded as complete events on the pipeline
+track, and the BFS layers of the search, reported with `trace_layer`, as
+begin/end events on a track of their own. Outside a trace they cost one
+global lookup. `Trace.write` saves the events as JSON, which Perfetto and
+chrome://tracing open.
+"""
+
+import json
+import os
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter_ns
+
+PIPELINE_TRACK = 1
+LAYER_TRACK = 2
+
+
+class Trace:
+    def __init__(self) -> None:
+        self.origin = perf_counter_ns()
+        self.pid = os.getpid()
+        self.events = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": PIPELINE_TRACK, "args": {"name": "pipeline"}},
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": LAYER_TRACK, "args": {"name": "search layers"}},
+        ]
+        self.layer = None  # (name, args) of the layer being searched, or None
+        self.layer_open = False  # Whether its begin event is the last one on the layer track
+
+    def now(self) -> float:
+        """Microseconds since the trace started, the unit of the `ts` fields."""
+        return (perf_counter_ns() - self.origin) / 1000
+
+    def complete(self, name: str, start: float, args: dict) -> None:
+        self.events.append({
+            "name": name, "ph": "X", "pid": self.pid, "tid": PIPELINE_TRACK,
+            "ts": start, "dur": self.now() - start, "args": args,
+        })
+
+    def begin_layer(self, name: str, args: dict) -> None:
+        self.end_layer()
+        self.layer = (name, args)
+        self.resume_layer()
+
+    def end_layer(self) -> None:
+        """Close the layer event while the search is not running; `resume_layer` reopens it."""
+        if self.layer_open:
+            self.events.append({"name": self.layer[0], "ph": "E", "pid": self.pid, "tid": LAYER_TRACK, "ts": self.now()})
+            self.layer_open = False
+
+    def resume_layer(self) -> None:
+        if self.layer is not None and not self.layer_open:
+            name, args = self.layer
+            self.events.append({"name": name, "ph": "B", "pid": self.pid, "tid": LAYER_TRACK, "ts": self.now(), "args": args})
+            self.layer_open = True
+
+    def write(self, path: str) -> None:
+        self.end_layer()
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+
+_active: Trace | None = None
+
+
+def start_trace() -> Trace:
+    """Record the pipeline into a new trace, until `stop_trace`."""
+    global _active
+    _active = Trace()
+    return _active
+
+
+def stop_trace() -> Trace | None:
+    global _active
+    trace, _active = _active, None
+    return trace
+
+
+def current_trace() -> Trace | None:
+    return _active
+
+
+@contextmanager
+def trace_span(name: str, **args):
+    """Record the body as a phase `name` of the pipeline, with `args`."""
+    trace = _active
+    if trace is None:
+        yield
+        return
+    start = trace.now()
+    try:
+        yield
+    finally:
+        trace.complete(name, start, args)
+
+
+def traced(function):
+    """Record every call of `function` as a phase of the pipeline."""
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        trace = _active
+        if trace is None:
+            return function(*args, **kwargs)
+        start = trace.now()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            trace.complete(function.__qualname__, start, {})
+
+    return wrapper
+
+
+def trace_layer(depth: int, iterations: int, states: int) -> None:
+    """Mark the start of BFS layer `depth`: `states` states, the first popped at `iterations`."""
+    if _active is not None:
+        _active.begin_layer(f"layer {depth}", {"iterations": iterations, "states": states})
+
+
+def pause_layers() -> None:
+    """The search stopped mid-layer; its layer event ends here until `resume_layers`."""
+    if _active is not None:
+        _active.end_layer()
+
+
+def resume_layers() -> None:
+    if _active is not None:
+        _active.resume_layer()
@@ -39,12 +39,15 @@ if __name__ == '__main__':
         ),
     )
 
-    ans, final_path = solve_graph_bfs(either_trisum_graph)
+    solution = next(solve_graph_bfs(either_trisum_graph), None)
+    if solution is None:
+        print('unsatisfiable')
+        exit()
     print()
-    print(ans)
+    print(solution.assignment)
     print()
-    for n in final_path:
+    for n in solution.path:
         print(n)
     print()
 
-    print(evaluate([n.node for n in final_path], ans.values))
+    print(evaluate(solution.path, solution.assignment))
@@ -1,4 +1,3 @@
-from conlog.evaluator import evaluate
 from conlog.frontends import GridError, convert_to_grid, make_grid_program
 from conlog.solver    import solve_graph_bfs
 
@@ -40,14 +39,12 @@ for test in [test1, test2]:
     program.show('vars')
 
     graph = program.graph()
-    solve_result = solve_graph_bfs(graph)
-    if solve_result is None:
+    solution = next(solve_graph_bfs(graph), None)
+    if solution is None:
         print('unsatisfiable')
         exit()
 
     print('\x1B[1mSolution\x1B[22m')
-    answer, path = solve_result
-    solution = evaluate([x.node for x in path], answer.values)
     for (name, value) in solution.assignment.items():
         if program.variables[name] in ('free', None):
             print(f"\x1B[95m{name}\x1B[39m = \x1B[95m{value}\x1B[39m")
@@ -0,0 +1,44 @@
+import json
+
+from conlog.bench import compare, example_workloads, family_workloads, main, run_all, scaling
+
+
+def test_bench_runs_and_compares(tmp_path) -> None:
+    workloads = [w for w in example_workloads() if w.name in ("multiplication.cla", "triangle_sum.clt")]
+    results = run_all(workloads, "cgp", limit=200000, timeout=30)
+    assert len(results) == 6
+    for result in results:
+        assert result["error"] is None and result["status"] == "RUNNING"
+        assert result["states_expanded"] > 0 and result["solution_length"] > 0
+        assert result["peak_rss"] > 0
+    assert compare(results, results) == []
+
+    # More states, a worse solution, and a failure all regress; a small slowdown does not
+    baseline = [dict(result) for result in results]
+    baseline[0]["states_expanded"] //= 2
+    baseline[1]["solution_length"] += 1
+    baseline[2]["wall_time"] /= 1.1
+    results[3] = dict(results[3], error="RuntimeError: broken")
+    regressions = compare(results, baseline, threshold=0.2)
+    assert len(regressions) == 3
+    assert "states_expanded" in regressions[0] and "length" in regressions[1] and "now fails" in regressions[2]
+
+    out = tmp_path / "bench.json"
+    with open(tmp_path / "baseline.json", "w") as f:
+        json.dump({"runs": baseline}, f)
+    assert main(["-o", str(out), "-k", "multiplication", "--no-generated", "-s", "c", "-b", str(tmp_path / "baseline.json")]) == 1
+    with open(out) as f:
+        assert [run["strategy"] for run in json.load(f)["runs"]] == ["c"]
+
+
+def test_bench_fits_scaling() -> None:
+    workloads = [w for w in family_workloads() if w.family in ("diode_chain", "hub")][:5]
+    results = run_all(workloads, "g", timeout=30)
+    exponents = scaling(results)
+    assert 0.9 < exponents["diode_chain", "g", "states_expanded"] < 1.1  # One state per node
+    assert exponents["hub", "g", "states_expanded"] > 2  # Three spokes deep
+
+    # The same states, but in time that grows quadratically
+    slower = [dict(result, wall_time=result["size"] ** 2 / 1000) for result in results]
+    regressions = compare(slower, [dict(result, wall_time=result["size"] / 1000) for result in results])
+    assert any(line.startswith("diode_chain (g): wall_time scales as size^1.00 -> size^2.00") for line in regressions)
@@ -1,4 +1,7 @@
-from conlog.elegant import AtLeast, AtMost, Unknown
+import networkx as nx
+
+from conlog.datatypes import Addition, Initial, Node, Subtraction, Terminal
+from conlog.elegant import AtLeast, AtMost, Unknown, determine_edge_bounds
 
 
 def test_bounds():
@@ -41,3 +44,26 @@ def test_bounds():
     assert AtLeast(2) - AtLeast(1) == Unknown()
     assert AtMost(2) - AtLeast(1) == AtMost(1)
     assert 2 - AtLeast(1) == AtMost(1)
+
+
+def test_edge_bounds():
+    initial = Node("initial", Initial(free=("T",), fixed=(("n", 3),)))
+    sub = Node("sub_t_n", Subtraction("T", "n"))
+    none = Node("none", None)
+    dead_end = Node("incr_n", Addition("n", 1))
+    terminal = Node("terminal", Terminal())
+
+    g = nx.Graph()
+    g.add_edges_from(
+        [(initial, sub), (sub, none), (none, terminal), (none, dead_end)]
+    )
+
+    edge_bounds = determine_edge_bounds(g, {})
+
+    # Nothing left to change n on the way to the Initial
+    assert edge_bounds[(none, sub)]["n"] == (3, 3)
+    assert "T" not in edge_bounds[(none, sub)]
+
+    # No way back to the Initial
+    lower, upper = edge_bounds[(none, dead_end)]["n"]
+    assert lower > upper
@@ -1,7 +1,7 @@
 import networkx as nx
 
 from conlog.brute import interpret
-from conlog.datatypes import Initial, Node, Subtraction, Terminal
+from conlog.datatypes import ConditionalDecrement, Initial, Node, Subtraction, Terminal
 
 
 def test_triangle_sum() -> None:
@@ -34,3 +34,32 @@ def test_triangle_sum() -> None:
 
     # One solution has T == 21, another has T == 15
     assert {sol_1.assignment["T"], sol_2.assignment["T"]} == {15, 21}
+
+
+def test_conditional_decrement() -> None:
+    # n counts T down to zero: T is decremented while n > 0
+    nodes = {
+        x.name: x
+        for x in [
+            Node("initial", Initial(free=("T",), fixed=(("n", 3),))),
+            Node("decr_t", ConditionalDecrement("T", "n")),
+            Node("decr_n", Subtraction("n", 1)),
+            Node("none", None),
+            Node("terminal", Terminal()),
+        ]
+    }
+
+    g = nx.Graph()
+    g.add_edges_from(
+        [
+            (nodes["initial"], nodes["decr_t"]),
+            (nodes["decr_t"], nodes["decr_n"]),
+            (nodes["decr_n"], nodes["none"]),
+            (nodes["none"], nodes["initial"]),
+            (nodes["none"], nodes["terminal"]),
+        ]
+    )
+
+    sol = next(interpret(g))
+
+    assert sol.assignment == {"n": 3, "T": 3}
@@ -0,0 +1,218 @@
+import os
+import signal
+
+import pytest
+from triangle_sum import make_triangle_sum_graph
+
+from conlog.checkpoint import CheckpointError, solve_with_checkpoints
+from conlog.datatypes import Addition, Initial, Node, Subtraction, Terminal, make_graph
+from conlog.solver_c import (
+    PythonSearch,
+    decode_state_key_python,
+    decode_state_nodes_python,
+    encode_state_key_python,
+    init_state_keys_python,
+    make_search_c,
+    unpack_solutions,
+)
+from conlog.stats import ProgressHook, SearchBudget, SearchStatus
+from conlog.trace import start_trace, stop_trace
+
+
+def test_checkpoint_round_trip(tmp_path) -> None:
+    path = str(tmp_path / "search.ckpt")
+
+    uninterrupted = make_search_c(make_triangle_sum_graph(6), limit=10000)
+    expected = next(uninterrupted.solutions())
+
+    interrupted = make_search_c(make_triangle_sum_graph(6), limit=20)
+    assert list(interrupted.solutions()) == []
+    interrupted.save(path)
+
+    restored = make_search_c(make_triangle_sum_graph(6), limit=10000)
+    restored.load(path)
+    assert restored.iterations == 20
+
+    solution = next(restored.solutions())
+    assert solution.assignment == expected.assignment
+    assert [node.name for node in solution.path] == [
+        node.name for node in expected.path
+    ]
+    assert restored.iterations == uninterrupted.iterations
+
+
+def test_spilled_layers_resume_mid_layer(tmp_path) -> None:
+    path = str(tmp_path / "search.ckpt")
+
+    def make(limit):
+        return make_search_c(make_triangle_sum_graph(6), limit=limit, spill_dir=str(tmp_path), dedup_layers=True)
+
+    def layers(search):
+        # The iteration each layer starts at, and its number of states
+        trace = start_trace()
+        try:
+            solution = next(search.solutions())
+        finally:
+            stop_trace()
+        return solution, [(e["args"]["iterations"], e["args"]["states"]) for e in trace.events if e["ph"] == "B"]
+
+    uninterrupted = make(10000)
+    expected, expected_layers = layers(uninterrupted)
+
+    # Stopping inside a layer keeps its boundary, so the next dedup pass only sorts the next layer,
+    # and the layers after the checkpoint start where they did without one
+    for limit in (7, 20, 33):
+        interrupted = make(limit)
+        assert list(interrupted.solutions()) == []
+        interrupted.save(path)
+
+        restored = make(10000)
+        restored.load(path)
+        solution, restored_layers = layers(restored)
+        assert solution.assignment == expected.assignment
+        assert restored.iterations == uninterrupted.iterations
+        assert restored_layers == [layer for layer in expected_layers if layer[0] >= limit]
+
+
+def test_checkpoint_rejects_other_program(tmp_path) -> None:
+    path = str(tmp_path / "search.ckpt")
+
+    search = make_search_c(make_triangle_sum_graph(6), limit=20)
+    list(search.solutions())
+    search.save(path)
+
+    other = make_search_c(make_triangle_sum_graph(5), limit=20)
+    with pytest.raises(CheckpointError):
+        other.load(path)
+
+
+def test_state_keys_pack_bounded_values() -> None:
+    workspace = PythonSearch(make_triangle_sum_graph(6)).the_workspace
+    workspace.lower_bounds = [-3, 0]
+    workspace.upper_bounds = [6, 100]
+    init_state_keys_python(workspace)
+    assert workspace.key_packed and workspace.key_words == 1
+
+    for values in ([-3, 0], [0, 0], [6, 100], [2, 57]):
+        for nodes in ((4, -1), (0, 3)):
+            key = encode_state_key_python(workspace, *nodes, values)
+            assert decode_state_key_python(workspace, key) == values
+            assert decode_state_nodes_python(workspace, key) == nodes
+
+
+def test_dedup_finds_same_first_solution() -> None:
+    expected = next(make_search_c(make_triangle_sum_graph(6), limit=10000).solutions())
+    solution = next(make_search_c(make_triangle_sum_graph(6), limit=10000, dedup=True).solutions())
+    assert solution.assignment == expected.assignment
+    assert [node.name for node in solution.path] == [node.name for node in expected.path]
+
+
+def test_approximate_dedup_finds_same_first_solution() -> None:
+    expected = next(make_search_c(make_triangle_sum_graph(6), limit=10000).solutions())
+    search = make_search_c(make_triangle_sum_graph(6), limit=10000, dedup_mem=1 << 20)
+    solution = next(search.solutions())
+    assert solution.assignment == expected.assignment
+    assert 0.0 <= search.false_positive_rate < 0.01
+
+    if isinstance(search, PythonSearch):
+        assert search.dedup_filter() is None  # The fallback dedups exactly
+    else:
+        capacity, num_hashes = search.dedup_filter()
+        assert num_hashes > 0 and 0 < capacity < 8 << 20
+        assert search.dedup_filter(rate=0.1)[0] > capacity
+
+
+def make_parity_graph():
+    # Unsatisfiable: n stays even around the loop, and the loop revisits its states
+    a, d = Node("a", None), Node("d", None)
+    return make_graph([
+        (Node("terminal", Terminal()), a),
+        (a, Node("add", Addition("n", 2))),
+        (Node("add", Addition("n", 2)), d),
+        (d, Node("sub", Subtraction("n", 2))),
+        (Node("sub", Subtraction("n", 2)), a),
+        (d, Node("initial", Initial(free=(), fixed=(("n", 1),)))),
+    ])
+
+
+def test_approximate_dedup_does_not_prove_unsat() -> None:
+    exact = make_search_c(make_parity_graph(), limit=10000, dedup=True)
+    assert list(exact.solutions()) == [] and exact.status == SearchStatus.EXHAUSTED
+
+    approximate = make_search_c(make_parity_graph(), limit=10000, dedup_mem=1 << 20)
+    assert list(approximate.solutions()) == []
+    if isinstance(approximate, PythonSearch):
+        assert approximate.status == SearchStatus.EXHAUSTED  # The fallback dedups exactly
+    else:
+        assert approximate.status == SearchStatus.INCOMPLETE
+
+
+@pytest.mark.parametrize("dedup", [dict(dedup=True), dict(dedup_mem=1 << 20)])
+def test_checkpoint_keeps_dedup_state(tmp_path, dedup) -> None:
+    path = str(tmp_path / "search.ckpt")
+
+    uninterrupted = make_search_c(make_parity_graph(), limit=10000, **dedup)
+    assert list(uninterrupted.solutions()) == []
+
+    # The states popped before the checkpoint are not enqueued again
+    for limit in (5, 9):
+        interrupted = make_search_c(make_parity_graph(), limit=limit, **dedup)
+        assert list(interrupted.solutions()) == []
+        interrupted.save(path)
+
+        restored = make_search_c(make_parity_graph(), limit=10000, **dedup)
+        restored.load(path)
+        assert list(restored.solutions()) == []
+        assert (restored.iterations, restored.status) == (uninterrupted.iterations, uninterrupted.status)
+
+    # Nor is a solution returned before it
+    expected = [s.assignment for s in make_search_c(make_triangle_sum_graph(4), limit=3000, **dedup).solutions()]
+    interrupted = make_search_c(make_triangle_sum_graph(4), limit=33, **dedup)
+    before = [s.assignment for s in interrupted.solutions()]
+    interrupted.save(path)
+    restored = make_search_c(make_triangle_sum_graph(4), limit=3000, **dedup)
+    restored.load(path)
+    assert len(before) == 1 and before + [s.assignment for s in restored.solutions()] == expected
+
+
+def test_checkpoint_when_out_of_time(tmp_path) -> None:
+    path = str(tmp_path / "search.ckpt")
+
+    # Without dedup, the search goes around the loop forever
+    search = make_search_c(make_parity_graph())
+    search.set_budget(SearchBudget(timeout=0))
+    assert list(solve_with_checkpoints(search, path)) == []
+    assert search.status == SearchStatus.TIMED_OUT
+
+    restored = make_search_c(make_parity_graph())
+    restored.load(path)
+    assert restored.iterations == search.iterations > 0
+
+
+def test_sigterm_cancels_the_running_chunk(tmp_path) -> None:
+    path = str(tmp_path / "search.ckpt")
+
+    search = make_search_c(make_parity_graph())
+    search.set_progress(ProgressHook(lambda progress: os.kill(os.getpid(), signal.SIGTERM), every=10))
+    with pytest.raises(SystemExit):
+        list(solve_with_checkpoints(search, path))
+    assert search.status == SearchStatus.CANCELLED and search.iterations < 100
+
+    restored = make_search_c(make_parity_graph())
+    restored.load(path)
+    assert restored.iterations == search.iterations
+
+
+def test_batched_solutions_match_single() -> None:
+    def summary(solutions):
+        return [(s.assignment, [node.name for node in s.path]) for s in solutions]
+
+    single = summary(make_search_c(make_triangle_sum_graph(4), limit=3000).solutions())
+    assert len(single) == 2
+
+    batched = make_search_c(make_triangle_sum_graph(4), limit=3000)
+    packed = batched.next_solutions(1)
+    [(values, path)] = unpack_solutions(packed, len(batched.var_names))
+    assert dict(zip(batched.var_names, values)) == single[0][0]
+    assert [batched.nodes[i].name for i in path] == single[0][1]
+    assert summary(batched.solutions(batch_size=3)) == single[1:]
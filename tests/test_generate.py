@@ -0,0 +1,57 @@
+from conlog.frontends import TextProgram, TokenStream
+from conlog.generate import (
+    diode,
+    diode_chain,
+    generated_workloads,
+    hub,
+    junction_grid,
+    lcm_machine,
+    main,
+    multiplication,
+    program_text,
+)
+from conlog.solver import solve_graph_bfs
+from conlog.solver_c import make_search_c
+
+
+def parse(text):
+    stream, program = TokenStream(text, None), TextProgram()
+    while (seq := stream.readline()) is not None:
+        if len(seq) > 0:
+            assert program.add_statement(seq, allow_reinit=True) is None
+    return program
+
+
+def test_generated_programs_compute() -> None:
+    for a, b in ((8, 7), (3, 20)):
+        graph = multiplication(a, b).graph()
+        assert next(make_search_c(graph).solutions(1)).assignment["c"] == a * b
+        assert next(solve_graph_bfs(graph)).assignment["c"] == a * b
+
+    assert next(make_search_c(lcm_machine().graph(), limit=10**6).solutions(1)).assignment["x"] == 84
+    assert next(make_search_c(lcm_machine((4, 6), 13).graph()).solutions(1)).assignment["x"] == 24
+
+    # Through the diodes, forwards only
+    assert len(next(solve_graph_bfs(diode_chain(5, distinct=True).graph())).path) == 4 * 5 + 1
+    program = TextProgram()
+    diode(program, "backwards", "final", "initial")
+    program.variables.update(e=0, d=0)
+    assert next(solve_graph_bfs(program.graph(), limit=10000), None) is None
+
+    # The spokes are worth at most `degree` each, so it takes three
+    assert len(next(solve_graph_bfs(hub(6).graph())).path) == 9
+    for seed in range(5):
+        assert next(solve_graph_bfs(junction_grid(5, 5, seed=seed).graph(), limit=10**6), None) is not None
+
+
+def test_program_text_round_trips(tmp_path) -> None:
+    for _, name, size, program in generated_workloads():
+        if size > 100:
+            continue
+        copy = parse(program_text(program))
+        assert (copy.nodes, copy.edges, copy.variables) == (program.nodes, program.edges, program.variables), name
+
+    out = tmp_path / "grid.clt"
+    assert main(["junction_grid", "4", "5", "--seed", "2", "-o", str(out)]) == 0
+    with open(out) as f:
+        assert f.read() == program_text(junction_grid(4, 5, seed=2))
@@ -0,0 +1,42 @@
+import re
+
+from conlog.elegant import interpret
+from conlog.frontends import convert_to_grid, make_grid_program
+from conlog.heat import grid_labels, heat_report, render_heat
+from conlog.solver import solve_graph_bfs
+from conlog.solver_c import PythonSearch, make_search_c
+from conlog.stats import SearchStats
+
+
+def searched(make, program):
+    if make in (solve_graph_bfs, interpret):
+        stats = SearchStats()
+        next(make(program.graph(), limit=200000, stats=stats))
+        return stats
+    search = make(program.graph(), limit=200000)
+    next(search.solutions())
+    return search.stats
+
+
+def test_heat_overlays_the_diagram() -> None:
+    with open("examples/multiplication.cla") as f:
+        grid = convert_to_grid(f.read())
+    program = make_grid_program(grid)
+    labels = grid_labels(program)
+    assert {"Start", "End", "c-=a", "b-=1", "a-=1"} <= set(labels.values())
+
+    for make in (make_search_c, PythonSearch, solve_graph_bfs):
+        stats = searched(make, program)
+        assert set(stats.edge_steps) <= program.edges
+        assert stats.edge_steps[("node.7", "node.8")] > 0  # c-=a -- b-=1, the multiplication loop
+
+        # The diagram is unchanged under the colors, with counts beside it
+        lines = re.sub(r"\x1B\[[0-9;]*m", "", render_heat(program, stats)).split("\n")
+        assert [line[:len(row)] for line, row in zip(lines, grid)] == grid
+        assert f"c-=a {stats.node_expansions['node.7']:,}" in lines[5]
+
+        report = heat_report(stats, top=3, labels=labels)
+        assert report.startswith("hottest nodes") and "hottest edges" in report
+
+    # Strategy p counts the steps of its own (elided) search graph
+    assert searched(interpret, program).node_expansions["node.7"] > 0
@@ -0,0 +1,24 @@
+from triangle_sum import make_triangle_sum_graph
+
+from conlog.solver_c import PythonSearch, make_search_c
+
+
+def test_raising_limit_resumes_search() -> None:
+    for make_search in (make_search_c, PythonSearch):
+        uninterrupted = make_search(make_triangle_sum_graph(6), limit=10000)
+        expected = next(uninterrupted.solutions())
+
+        search = make_search(make_triangle_sum_graph(6), limit=3)
+        assert list(search.solutions()) == []
+        assert search.limit_reached and search.iterations == 3
+
+        search.set_limit(10000)
+        sol = next(search.solutions())
+
+        # Resuming did the same work as never stopping, no more
+        assert sol.assignment == expected.assignment
+        assert search.iterations == uninterrupted.iterations
+        assert search.stats.states_expanded == uninterrupted.stats.states_expanded
+
+        # The search starts from the terminal once; re-seeding would expand it again
+        assert search.stats.node_expansions["terminal"] == 1
@@ -0,0 +1,155 @@
+import networkx as nx
+
+from conlog.datatypes import (
+    Addition,
+    Initial,
+    IntegerPrint,
+    Node,
+    Subtraction,
+    Terminal,
+    UnicodePrint,
+    make_graph,
+)
+from conlog.evaluator import evaluate
+from conlog.frontends import convert_to_grid, make_grid_program
+from conlog.solver import solve_graph_bfs
+from conlog.solver_c import PythonSearch, make_search_c
+from conlog.stats import SearchStatus
+
+
+def make_printing_graph() -> nx.Graph:
+    # The triangle sum loop, printing as it goes
+    loop = [
+        Node("initial", Initial(free=("T",), fixed=(("n", 5),))),
+        Node("print_t", IntegerPrint("T")),
+        Node("print_n", IntegerPrint("n")),
+        Node("decr_x", Subtraction("n", 1)),
+        Node("sub_t_x", Subtraction("T", "n")),
+        Node("print_a", UnicodePrint(65)),
+        Node("none", None),
+    ]
+    return make_graph([*zip(loop, loop[1:]), (loop[-1], loop[0]), (loop[-1], Node("terminal", Terminal()))])
+
+
+def test_engine_stdout_matches_evaluator() -> None:
+    for verify in (True, False):
+        search = make_search_c(make_printing_graph(), limit=100000, verify=verify)
+        solutions = list(search.solutions(batch_size=5))
+        assert len(solutions) == 2
+        for solution in solutions:
+            expected = evaluate(solution.path, solution.assignment)
+            assert expected is not None
+            assert list(solution.stdout) == expected.stdout
+
+
+def test_numpy_fallback_matches_engine() -> None:
+    def summary(search):
+        return [(s.assignment, [node.name for node in s.path]) for s in search.solutions(batch_size=3)]
+
+    engine = make_search_c(make_printing_graph(), limit=100000)
+    fallback = PythonSearch(make_printing_graph(), limit=100000)
+    assert summary(fallback) == summary(engine)
+    assert fallback.iterations == engine.iterations
+
+
+def test_high_degree_hub() -> None:
+    initial = Node("initial", Initial(free=("T",), fixed=(("n", 0),)))
+    hub = Node("hub", None)
+    spoke_ends = Node("spoke_ends", None)
+    terminal = Node("terminal", Terminal())
+
+    g = nx.Graph()
+    g.add_edges_from([(initial, spoke_ends), (hub, terminal)])
+    for i in range(40):
+        spoke = Node(f"add_{i}", Addition("T", i))
+        g.add_edges_from([(spoke_ends, spoke), (spoke, hub)])
+
+    search = make_search_c(g, limit=100000)
+    solutions = list(search.solutions(batch_size=8))
+    assert sorted(s.assignment["T"] for s in solutions) == sorted(-i for i in range(40))
+    for solution in solutions:
+        assert evaluate(solution.path, solution.assignment) is not None
+
+
+def make_adder_chain(adds: int, loop: bool = False) -> nx.Graph:
+    chain = [Node("initial", Initial(free=("T", "m"), fixed=(("n", 2**62),)))]
+    chain += [Node(f"add_{i}", Addition("T", "n")) for i in range(adds)]
+    chain += [Node("clear_n", Subtraction("n", 2**62)), Node("terminal", Terminal())]
+    edges = list(zip(chain, chain[1:]))
+    if loop:
+        # A loop by the Terminal that the search can go around forever
+        j, inc_m, dec_m = Node("j", None), Node("inc_m", Addition("m", 1)), Node("dec_m", Subtraction("m", 1))
+        edges = edges[:-1] + [(chain[-2], j), (j, chain[-1]), (j, inc_m), (inc_m, dec_m), (dec_m, j)]
+
+    return make_graph(edges)
+
+
+def test_int64_overflow_continues_in_python_ints() -> None:
+    for make_search in (make_search_c, PythonSearch):
+        search = make_search(make_adder_chain(2), limit=1000)
+        assert [s.assignment["T"] for s in search.solutions()] == [-2**63]
+        assert search.overflowed == 0
+
+        search = make_search(make_adder_chain(3), limit=1000)
+        assert [s.assignment["T"] for s in search.solutions()] == [-3 * 2**62]
+        assert search.overflowed == 1
+        assert search.status == SearchStatus.EXHAUSTED
+
+        # Past the int64 range, raising the limit resumes the search too
+        search = make_search(make_adder_chain(3), limit=5)
+        assert list(search.solutions()) == [] and search.limit_reached
+        search.set_limit(1000)
+        assert [s.assignment["T"] for s in search.solutions()] == [-3 * 2**62]
+
+
+def test_overflowed_states_are_searched_in_bfs_order() -> None:
+    # Without the loop the search space is finite; with it, the states set
+    # aside must be searched along with the rest, not after it
+    expected = next(solve_graph_bfs(make_adder_chain(3, loop=True), limit=1000))
+    for make_search in (make_search_c, PythonSearch):
+        search = make_search(make_adder_chain(3, loop=True), limit=1000)
+        solution = next(search.solutions())
+        assert solution.assignment == expected.assignment
+        assert [node.name for node in solution.path] == [node.name for node in expected.path]
+        assert search.iterations < 100
+
+        # The limit counts the iterations of both
+        search = make_search(make_adder_chain(3, loop=True), limit=10)
+        assert list(search.solutions()) == [] and search.limit_reached
+        assert search.iterations == 10
+        search.set_limit(1000)
+        assert next(search.solutions()).assignment == expected.assignment
+
+
+def test_overflowed_states_survive_a_checkpoint(tmp_path) -> None:
+    path = str(tmp_path / "search.ckpt")
+    for make_search in (make_search_c, PythonSearch):
+        search = make_search(make_adder_chain(3), limit=5)
+        assert list(search.solutions()) == [] and search.overflowed == 1
+        search.save(path)
+
+        restored = make_search(make_adder_chain(3), limit=1000)
+        restored.load(path)
+        assert restored.overflowed == 1
+        assert [s.assignment["T"] for s in restored.solutions()] == [-3 * 2**62]
+
+        # Saved with a state queued past the int64 range, and resumed from there
+        uninterrupted = make_search(make_adder_chain(3, loop=True), limit=1000)
+        expected = next(uninterrupted.solutions())
+        search = make_search(make_adder_chain(3, loop=True), limit=18)
+        assert list(search.solutions()) == [] and search.wide.bfs.queue
+        search.save(path)
+
+        restored = make_search(make_adder_chain(3, loop=True), limit=1000)
+        restored.load(path)
+        assert restored.iterations == 18
+        assert next(restored.solutions()).assignment == expected.assignment
+        assert restored.iterations == uninterrupted.iterations
+
+
+def test_program_without_variables() -> None:
+    with open("examples/hello_world.cla") as f:
+        graph = make_grid_program(convert_to_grid(f.read())).graph()
+    for make_search in (make_search_c, PythonSearch):
+        [solution] = make_search(graph, limit=1000).solutions()
+        assert "".join(map(str, solution.stdout)) == "Hello, world!"
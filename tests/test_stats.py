@@ -0,0 +1,117 @@
+from dataclasses import fields
+
+import networkx as nx
+import pytest
+
+from conlog.datatypes import Initial, Node, Terminal
+from conlog.elegant import interpret
+from conlog.frontends import convert_to_grid, make_grid_program
+from conlog.solver import solve_graph_bfs
+from conlog.solver_c import PythonSearch, make_search_c
+from conlog.stats import BudgetExceeded, ProgressHook, SearchBudget, SearchStats, SearchStatus
+
+
+def example_graph(name):
+    with open(f"examples/{name}.cla") as f:
+        return make_grid_program(convert_to_grid(f.read())).graph()
+
+
+def test_numpy_fallback_counts_like_engine() -> None:
+    engine = make_search_c(example_graph("squares"), limit=20000)
+    fallback = PythonSearch(example_graph("squares"), limit=20000)
+    for search in (engine, fallback):
+        next(search.solutions(), None)
+
+    counted = ("states_expanded", "pruned_by_bounds", "pruned_by_backtracking", "queue_high_water", "node_expansions", "edge_steps")
+    engine_stats, fallback_stats = engine.stats, fallback.stats
+    for name in counted:
+        assert getattr(fallback_stats, name) == getattr(engine_stats, name), name
+    assert engine_stats.states_expanded == engine.iterations
+    assert sum(engine_stats.node_expansions.values()) == engine.iterations
+
+
+def test_python_strategies_fill_stats() -> None:
+    for solve in (solve_graph_bfs, interpret):
+        stats = SearchStats()
+        solution = next(solve(example_graph("multiplication"), limit=200000, stats=stats))
+        assert solution.assignment["c"] == 56
+        assert stats.states_expanded == sum(stats.node_expansions.values()) > 0
+        assert stats.queue_high_water > 0 and stats.bytes_allocated > 0
+        assert all(getattr(stats, f.name) >= 0 for f in fields(stats) if f.name not in ("node_expansions", "edge_steps"))
+
+
+def test_status_separates_unsat_from_limit() -> None:
+    initial = Node("initial", Initial(free=(), fixed=(("n", 1),)))
+    unsat = nx.Graph([(initial, Node("none", None)), (Node("none", None), Node("terminal", Terminal()))])
+
+    def status_of(make, graph, limit):
+        if make in (solve_graph_bfs, interpret):
+            stats = SearchStats()
+            solutions = list(make(graph, limit=limit, stats=stats))
+            return solutions, stats.status
+        search = make(graph, limit=limit)
+        return list(search.solutions()), search.status
+
+    for make in (make_search_c, PythonSearch, solve_graph_bfs, interpret):
+        assert status_of(make, unsat, 1000) == ([], SearchStatus.EXHAUSTED)
+        assert status_of(make, example_graph("multiplication"), 3) == ([], SearchStatus.LIMIT_REACHED)
+
+
+def test_progress_hook_reports_and_cancels() -> None:
+    for make in (make_search_c, PythonSearch, solve_graph_bfs, interpret):
+        reports = []
+        progress = ProgressHook(lambda p: reports.append(p) or len(reports) == 3, every=100)
+        if make in (solve_graph_bfs, interpret):
+            stats = SearchStats()
+            assert list(make(example_graph("multiplication"), limit=200000, stats=stats, progress=progress)) == []
+            status = stats.status
+        else:
+            search = make(example_graph("multiplication"), limit=200000)
+            search.set_progress(progress)
+            assert list(search.solutions()) == []
+            status = search.status
+        assert status == SearchStatus.CANCELLED, make
+        assert len(reports) == 3
+        assert [p.iterations for p in reports] == sorted(p.iterations for p in reports)
+        assert all(p.iterations >= 100 and p.frontier > 0 and p.depth > 0 for p in reports)
+
+        if make in (make_search_c, PythonSearch):
+            # A cancelled search resumes where it stopped
+            search.set_progress(None)
+            assert next(search.solutions()).assignment["c"] == 56
+
+
+def test_budget_stops_every_strategy() -> None:
+    def run(make, budget):
+        if make in (solve_graph_bfs, interpret):
+            stats = SearchStats()
+            assert list(make(example_graph("squares"), limit=10**8, stats=stats, budget=budget)) == []
+            return stats, None
+        search = make(example_graph("squares"), limit=10**8)
+        search.set_budget(budget)
+        assert list(search.solutions()) == []
+        return search.stats, search
+
+    for make in (make_search_c, PythonSearch, solve_graph_bfs, interpret):
+        stats, search = run(make, SearchBudget(timeout=0))
+        assert stats.status == SearchStatus.TIMED_OUT, make
+        assert stats.states_expanded < 117671
+
+        stats, _ = run(make, SearchBudget(max_memory=2**20))
+        assert stats.status == SearchStatus.OUT_OF_MEMORY, make
+        assert stats.bytes_allocated > 2**20
+
+        if search is not None:
+            # A search that timed out resumes under a new budget
+            search.set_budget(SearchBudget(timeout=60))
+            assert next(search.solutions()) is not None
+
+
+def test_budget_covers_preprocessing() -> None:
+    for make in (make_search_c, PythonSearch):
+        with pytest.raises(BudgetExceeded):
+            make(example_graph("squares"), budget=SearchBudget(timeout=0))
+
+    stats = SearchStats()
+    assert list(solve_graph_bfs(example_graph("squares"), stats=stats, budget=SearchBudget(timeout=0))) == []
+    assert stats.status == SearchStatus.TIMED_OUT and stats.states_expanded == 0
@@ -0,0 +1,46 @@
+import json
+
+from conlog.elegant import interpret
+from conlog.frontends import convert_to_grid, make_grid_program
+from conlog.solver import solve_graph_bfs
+from conlog.solver_c import PythonSearch, make_search_c
+from conlog.trace import start_trace, stop_trace
+
+
+def traced_run(make, tmp_path):
+    trace = start_trace()
+    try:
+        with open("examples/multiplication.cla") as f:
+            graph = make_grid_program(convert_to_grid(f.read())).graph()
+        if make in (solve_graph_bfs, interpret):
+            next(make(graph, limit=200000))
+        else:
+            next(make(graph, limit=200000).solutions())
+    finally:
+        stop_trace()
+    path = tmp_path / "trace.json"
+    trace.write(str(path))
+    with open(path) as f:
+        return json.load(f)["traceEvents"]
+
+
+def test_trace_covers_the_pipeline(tmp_path) -> None:
+    layers = {}
+    for make in (make_search_c, PythonSearch, solve_graph_bfs, interpret):
+        events = traced_run(make, tmp_path)
+        phases = {e["name"] for e in events if e["ph"] == "X"}
+        assert {"convert_to_grid", "scan_regions", "scan_junctions", "scan_paths", "Program.graph", "verify"} <= phases
+        if make in (make_search_c, PythonSearch):
+            assert {"workspace_arrays", "determine_variable_bounds_multipass", "determine_edge_bounds", "search"} <= phases
+
+        # Layer events pair up, in order
+        begins = [e for e in events if e["ph"] == "B"]
+        ends = [e for e in events if e["ph"] == "E"]
+        assert len(begins) == len(ends) > 0
+        assert all(b["name"] == e["name"] and b["ts"] <= e["ts"] for b, e in zip(begins, ends))
+        layers[make] = [(b["name"], b["args"]) for b in begins]
+
+    # The engine and the fallback cut the same layers; strategy g prunes less, but reaches the same depth
+    assert layers[make_search_c] == layers[PythonSearch]
+    assert len(layers[solve_graph_bfs]) == len(layers[make_search_c])
+
@@ -19,21 +19,28 @@ depending on the first path taken. (no one-way gadget used)
        '--DecrX----SubFbyX--'
 
 """
-either_trisum_nodes = [
-    Node("initial", Initial(free=("T",), fixed=(("n", 6),))),
-    Node("decr_x", Subtraction("n", 1)),
-    Node("sub_t_x", Subtraction("T", "n")),
-    Node("none", None),
-    Node("terminal", Terminal()),
-]
-either_trisum_d = {n.name: n for n in either_trisum_nodes}
-
-either_trisum_graph = make_graph(
-    edges=[
-        (either_trisum_d["initial"], either_trisum_d["decr_x"]),
-        (either_trisum_d["decr_x"], either_trisum_d["sub_t_x"]),
-        (either_trisum_d["sub_t_x"], either_trisum_d["none"]),
-        (either_trisum_d["none"], either_trisum_d["initial"]),
-        (either_trisum_d["none"], either_trisum_d["terminal"]),
-    ],
-)
+
+
+def make_triangle_sum_graph(n: int) -> nx.Graph:
+    nodes = [
+        Node("initial", Initial(free=("T",), fixed=(("n", n),))),
+        Node("decr_x", Subtraction("n", 1)),
+        Node("sub_t_x", Subtraction("T", "n")),
+        Node("none", None),
+        Node("terminal", Terminal()),
+    ]
+    d = {node.name: node for node in nodes}
+    return make_graph(
+        edges=[
+            (d["initial"], d["decr_x"]),
+            (d["decr_x"], d["sub_t_x"]),
+            (d["sub_t_x"], d["none"]),
+            (d["none"], d["initial"]),
+            (d["none"], d["terminal"]),
+        ],
+    )
+
+
+either_trisum_graph = make_triangle_sum_graph(6)
+either_trisum_d = {n.name: n for n in either_trisum_graph.nodes}
+either_trisum_nodes = list(either_trisum_d.values())